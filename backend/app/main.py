@@ -1,55 +1,47 @@
 from __future__ import annotations
 
+import asyncio
+import functools
 import io
 import json
 import logging
 import os
-import random
+import sqlite3
+import sys
+import threading
 import time
 import uuid
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from dataclasses import dataclass, field
-from datetime import date, datetime, timezone
-from typing import Any, AsyncIterator, Literal, Optional
+from itertools import repeat
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Literal, NamedTuple, Optional, overload
 
 import boto3
 import httpx
 from botocore.exceptions import BotoCoreError, ClientError
 from dotenv import load_dotenv
-from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi import FastAPI, File, HTTPException, Query, UploadFile
 from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from openai import AsyncOpenAI
+from fastapi.responses import Response, StreamingResponse
+from openai import APIConnectionError, APIError, APITimeoutError, AsyncOpenAI
 from pydantic import BaseModel, Field
 
-from .services import scheduling
-
-
-MessageOrigin = Literal["user", "bot"]
-
-import io
-import json
-import logging
-import os
-import random
-import time
-import uuid
-from dataclasses import dataclass, field
-from datetime import date, datetime, timezone
-from typing import Any, AsyncIterator, Literal, Optional
-
-import boto3
-import httpx
-from botocore.exceptions import BotoCoreError, ClientError
-from dotenv import load_dotenv
-from fastapi import FastAPI, File, HTTPException, UploadFile
-from fastapi.concurrency import run_in_threadpool
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from openai import AsyncOpenAI
-from pydantic import BaseModel, Field
-
-from .services import scheduling
+from .services import metrics, scheduling
+from .services.key_pool import KeyPool, mask_key
+from .services.prompt_window import (
+    CHARS_PER_TOKEN,
+    PromptWindow,
+    Summary,
+    estimate_message_tokens,
+    extractive_summary,
+)
 
 
 MessageOrigin = Literal["user", "bot"]
@@ -70,15 +62,17 @@ SYSTEM_PROMPT = (
     "Apos o agendamento, ofereca ajuda adicional ou encerre a conversa educadamente."
 
 )
-DEFAULT_GREETING = (
-    "Olá! Sou Aurora, atendente virtual inclusiva. Posso ajudar com informações hospitalares acessíveis, "
-    "explicar recursos como tradução em Libras ou orientar sobre atendimento para pessoas com deficiência auditiva, "
-    "visual ou motora. Como posso apoiar você hoje?"
+SUMMARY_PROMPT = (
+    "Voce resume conversas de atendimento hospitalar para dar contexto a Aurora. "
+    "Atualize o resumo anterior com as novas mensagens em no maximo alguns paragrafos curtos. "
+    "Preserve dados do paciente, necessidades de acessibilidade, especialidade, datas e horarios combinados, "
+    "agendamentos feitos ou cancelados e pendencias. Responda apenas com o resumo."
 )
-
-
-class Message(BaseModel):
-    id: int
+TOOL_BUDGET_PROMPT = (
+    "O limite de consultas deste turno foi atingido. Responda agora ao paciente com as informacoes que ja tem, "
+    "sem chamar ferramentas; se faltar algo, diga o que falta e peca para ele tentar de novo."
+)
+TOOL_ROUND_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20)
 DEFAULT_GREETING = (
     "Olá! Sou Aurora, atendente virtual inclusiva. Posso ajudar com informações hospitalares acessíveis, "
     "explicar recursos como tradução em Libras ou orientar sobre atendimento para pessoas com deficiência auditiva, "
@@ -93,6 +87,10 @@ class Message(BaseModel):
     created_at: datetime
 
 
+DEFAULT_SESSION = "default"
+SESSION_ID_PATTERN = r"^[A-Za-z0-9_-]{1,64}$"
+
+
 class ProfileData(BaseModel):
     full_name: str
     patient_id: str | None = None
@@ -107,6 +105,7 @@ class ProfileData(BaseModel):
 class MessagePayload(BaseModel):
     content: str
     profile: ProfileData | None = None
+    session_id: str = Field(default=DEFAULT_SESSION, pattern=SESSION_ID_PATTERN)
 
 
 def profile_to_prompt(profile: dict[str, Any]) -> str:
@@ -175,9 +174,19 @@ class ResourceStatusPayload(BaseModel):
     slot: str
 
 
+# Alias para anotar campos chamados "date" sem que o nome do campo esconda o tipo.
+IsoDate = date
+
+
 class BookingFilterPayload(BaseModel):
-    date: Optional[date] = None
+    date: Optional[IsoDate] = None
     slot: Optional[str] = None
+    date_from: Optional[IsoDate] = None
+    date_to: Optional[IsoDate] = None
+    after_id: Optional[int] = Field(default=None, ge=1)
+    after_date: Optional[IsoDate] = None
+    limit: int = Field(default=scheduling.BOOKINGS_PAGE_SIZE, ge=1, le=scheduling.BOOKINGS_MAX_PAGE_SIZE)
+    stream: bool = False
 
 
 class CancelBookingPayload(BaseModel):
@@ -201,44 +210,416 @@ class LLMServiceError(Exception):
     """Erro interno ao chamar o provedor de LLM."""
 
 
-def _load_openrouter_api_key() -> str | None:
-    direct = os.getenv("OPENROUTER_API_KEY")
-    if direct and direct.strip():
-        return direct.strip()
+# Falhas que dizem respeito a chave ou ao provedor (auth, cota, limite, indisponibilidade) e valem nova tentativa.
+_KEY_FAILURE_STATUS = frozenset({401, 402, 403, 408, 409, 429})
+# Erros vindos do provedor ou do nosso prazo; qualquer outro (TypeError, KeyError...) e bug e deve subir.
+_PROVIDER_ERRORS = (APIError, httpx.HTTPError, asyncio.TimeoutError)
 
-    raw = os.getenv("OPENROUTER_API_KEYS")
-    if not raw:
-        return None
 
-    cleaned = raw.replace("\n", ",").replace(";", ",").split(",")
-    keys = [value.strip() for value in cleaned if value.strip()]
-    if not keys:
+def _is_key_failure(exc: BaseException) -> bool:
+    if isinstance(exc, asyncio.TimeoutError):
+        return False  # estourou o nosso prazo (asyncio.wait_for), nao diz nada sobre a chave
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        # Sem status HTTP, so falha de transporte (conexao, timeout do cliente) conta contra a chave.
+        return isinstance(exc, (httpx.TransportError, APIConnectionError, APITimeoutError))
+    return status in _KEY_FAILURE_STATUS or status >= 500
+
+
+def _retry_after(exc: BaseException) -> float | None:
+    response = getattr(exc, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value else None
+    except ValueError:
         return None
-    return random.choice(keys)
+
+
+_ORIGINS: tuple[MessageOrigin, ...] = ("user", "bot")
+_ORIGIN_CODES = {origin: code for code, origin in enumerate(_ORIGINS)}
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class StoredMessage(NamedTuple):
+    """Mensagem interna dos stores; o modelo pydantic `Message` so e montado na borda da API."""
+
+    id: int
+    origin: MessageOrigin
+    content: str
+    created_at: int  # epoch UTC em microssegundos
+
+
+def _epoch_us(moment: datetime) -> int:
+    return (moment - _EPOCH) // timedelta(microseconds=1)
+
+
+def _to_api(messages: Iterable[StoredMessage]) -> list[Message]:
+    return [
+        Message(
+            id=message.id,
+            origin=message.origin,
+            content=message.content,
+            created_at=_EPOCH + timedelta(microseconds=message.created_at),
+        )
+        for message in messages
+    ]
+
+
+class _Session:
+    """Colunas append-only de uma sessao: ids/horarios em array('q'), origem em array('b')."""
+
+    __slots__ = ("ids", "origins", "contents", "created_at", "last_seen", "content_bytes")
+
+    def __init__(self) -> None:
+        self.ids = array("q")
+        self.origins = array("b")
+        self.contents: list[str] = []
+        self.created_at = array("q")
+        self.last_seen = 0.0
+        self.content_bytes = 0
+
+    def message(self, index: int) -> StoredMessage:
+        return StoredMessage(
+            self.ids[index], _ORIGINS[self.origins[index]], self.contents[index], self.created_at[index]
+        )
+
+
+class HistoryView(Sequence[StoredMessage]):
+    """Janela [start, stop) sobre uma sessao; nao copia nada e ignora mensagens gravadas depois."""
+
+    __slots__ = ("_session", "_start", "_stop")
+
+    def __init__(self, session: _Session, start: int, stop: int) -> None:
+        self._session = session
+        self._start = start
+        self._stop = stop
+
+    def __len__(self) -> int:
+        return self._stop - self._start
+
+    @overload
+    def __getitem__(self, index: int) -> StoredMessage: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> Sequence[StoredMessage]: ...
+
+    def __getitem__(self, index: int | slice) -> StoredMessage | Sequence[StoredMessage]:
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            return HistoryView(self._session, self._start + start, self._start + max(start, stop))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("indice fora do historico")
+        return self._session.message(self._start + index)
+
+    def __iter__(self) -> Iterator[StoredMessage]:
+        # Percorre as colunas em C e monta o NamedTuple via tuple.__new__ (sem o __new__ em Python).
+        session, start, stop = self._session, self._start, self._stop
+        rows = zip(
+            session.ids[start:stop],
+            map(_ORIGINS.__getitem__, session.origins[start:stop]),
+            session.contents[start:stop],
+            session.created_at[start:stop],
+        )
+        return map(tuple.__new__, repeat(StoredMessage), rows)
 
 
 @dataclass
 class InMemoryMessageStore:
-    _messages: list[Message] = field(default_factory=list)
+    """Historico por sessao em memoria, limitado por LRU (max_sessions) e TTL de inatividade."""
+
+    max_sessions: int = 1000
+    ttl_seconds: float = 3600.0
+    _sessions: OrderedDict[str, _Session] = field(default_factory=OrderedDict)
     _counter: int = 1
+    _messages: int = 0
+    _content_bytes: int = 0
+    _evicted: dict[str, int] = field(default_factory=lambda: {"ttl": 0, "lru": 0})
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
 
-    def add(self, origin: MessageOrigin, content: str) -> Message:
-        message = Message(
-            id=self._counter,
-            origin=origin,
-            content=content,
-            created_at=datetime.now(timezone.utc),
-        )
+    def _append(self, session: _Session, origin: MessageOrigin, content: str) -> StoredMessage:
+        message = StoredMessage(self._counter, origin, content, _epoch_us(datetime.now(timezone.utc)))
         self._counter += 1
-        self._messages.append(message)
+        size = sys.getsizeof(content)
+        session.ids.append(message.id)
+        session.origins.append(_ORIGIN_CODES[origin])
+        session.contents.append(message.content)
+        session.created_at.append(message.created_at)
+        session.content_bytes += size
+        self._messages += 1
+        self._content_bytes += size
         return message
 
-    def history(self) -> list[Message]:
-        return list(self._messages)
+    def _drop(self, session_id: str, reason: str) -> None:
+        session = self._sessions.pop(session_id)
+        self._messages -= len(session.ids)
+        self._content_bytes -= session.content_bytes
+        self._evicted[reason] += 1
+
+    def _evict(self, now: float, room: int = 0) -> None:
+        # OrderedDict em ordem de acesso: as sessoes ociosas ha mais tempo ficam no inicio.
+        while self._sessions:
+            session_id, oldest = next(iter(self._sessions.items()))
+            if now - oldest.last_seen < self.ttl_seconds:
+                break
+            self._drop(session_id, "ttl")
+        while self._sessions and len(self._sessions) + room > self.max_sessions:
+            self._drop(next(iter(self._sessions)), "lru")
+
+    def _session(self, session_id: str) -> _Session:
+        now = time.monotonic()
+        session = self._sessions.get(session_id)
+        if session is not None and now - session.last_seen >= self.ttl_seconds:
+            self._drop(session_id, "ttl")
+            session = None
+        if session is None:
+            self._evict(now, room=1)
+            session = self._sessions[session_id] = _Session()
+            if DEFAULT_GREETING:
+                self._append(session, "bot", DEFAULT_GREETING)
+        else:
+            self._sessions.move_to_end(session_id)
+        session.last_seen = now
+        return session
+
+    def add(self, session_id: str, origin: MessageOrigin, content: str) -> StoredMessage:
+        with self._lock:
+            return self._append(self._session(session_id), origin, content)
+
+    def history(self, session_id: str, since_id: int | None = None) -> HistoryView:
+        with self._lock:
+            session = self._session(session_id)
+            # ids sao crescentes dentro da sessao: busca binaria direto no array.
+            start = 0 if since_id is None else bisect_right(session.ids, since_id)
+            return HistoryView(session, start, len(session.ids))
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            self._evict(time.monotonic())
+            return {
+                "backend": "memory",
+                "sessions": len(self._sessions),
+                "messages": self._messages,
+                "content_bytes": self._content_bytes,
+                "max_sessions": self.max_sessions,
+                "ttl_seconds": self.ttl_seconds,
+                "evicted_ttl": self._evicted["ttl"],
+                "evicted_lru": self._evicted["lru"],
+            }
+
+    def close(self) -> None:
+        pass
+
+
+DEFAULT_MESSAGE_DB = os.path.join(scheduling.ROOT_DIR, "messages.db")
+
+
+class SQLiteMessageStore:
+    """Historico por sessao em SQLite (WAL), compartilhado entre os workers do uvicorn."""
+
+    # Leituras so regravam last_seen depois deste intervalo, para nao transformar todo GET em escrita.
+    TOUCH_INTERVAL_SECONDS = 30.0
+
+    def __init__(self, path: str, max_sessions: int = 1000, ttl_seconds: float = 3600.0) -> None:
+        self.path = path
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+        self._conns: list[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._ready = False
+        self._evicted = {"ttl": 0, "lru": 0}
+
+    def _conn(self) -> sqlite3.Connection:
+        # Uma conexao por thread de `run_store`, cujo pool tem tamanho fixo; todas fecham em close().
+        con = getattr(self._local, "con", None)
+        if con is not None:
+            return con
+        con = sqlite3.connect(self.path, check_same_thread=False)
+        con.execute(f"PRAGMA busy_timeout = {scheduling.DB_BUSY_TIMEOUT_MS}")
+        con.execute("PRAGMA journal_mode = WAL")
+        con.execute("PRAGMA synchronous = NORMAL")
+        with self._lock:
+            self._conns.append(con)
+            if not self._ready:
+                self._init_schema(con)
+                self._ready = True
+        self._local.con = con
+        return con
+
+    def _init_schema(self, con: sqlite3.Connection) -> None:
+        has_sessions = con.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sessions'"
+        ).fetchone()
+        con.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                conversation_id TEXT NOT NULL,
+                origin TEXT NOT NULL,
+                content TEXT NOT NULL,
+                created_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages (conversation_id, id);
+            CREATE TABLE IF NOT EXISTS sessions (
+                conversation_id TEXT PRIMARY KEY,
+                last_seen REAL NOT NULL
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_sessions_last_seen ON sessions (last_seen);
+            """
+        )
+        if not has_sessions:
+            with con:
+                con.execute(
+                    """
+                    INSERT OR IGNORE INTO sessions (conversation_id, last_seen)
+                    SELECT conversation_id, CAST(strftime('%s', MAX(created_at)) AS REAL)
+                    FROM messages GROUP BY conversation_id
+                    """
+                )
+
+    def _insert(self, con: sqlite3.Connection, session_id: str, origin: MessageOrigin, content: str) -> StoredMessage:
+        created_at = datetime.now(timezone.utc)
+        cur = con.execute(
+            "INSERT INTO messages (conversation_id, origin, content, created_at) VALUES (?,?,?,?)",
+            (session_id, origin, content, created_at.isoformat()),
+        )
+        return StoredMessage(cur.lastrowid, origin, content, _epoch_us(created_at))
+
+    def _delete_session(self, con: sqlite3.Connection, session_id: str, reason: str) -> None:
+        con.execute("DELETE FROM messages WHERE conversation_id = ?", (session_id,))
+        con.execute("DELETE FROM sessions WHERE conversation_id = ?", (session_id,))
+        self._evicted[reason] += 1
+
+    def _evict(self, con: sqlite3.Connection, now: float) -> None:
+        expired = con.execute(
+            "SELECT conversation_id FROM sessions WHERE last_seen < ?", (now - self.ttl_seconds,)
+        ).fetchall()
+        for (session_id,) in expired:
+            self._delete_session(con, session_id, "ttl")
+        excess = con.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] - self.max_sessions + 1
+        if excess > 0:
+            oldest = con.execute(
+                "SELECT conversation_id FROM sessions ORDER BY last_seen LIMIT ?", (excess,)
+            ).fetchall()
+            for (session_id,) in oldest:
+                self._delete_session(con, session_id, "lru")
+
+    def _open_session(self, con: sqlite3.Connection, session_id: str, write: bool) -> None:
+        now = time.time()
+        row = con.execute("SELECT last_seen FROM sessions WHERE conversation_id = ?", (session_id,)).fetchone()
+        if row is not None and now - row[0] < self.ttl_seconds and (write or now - row[0] < self.TOUCH_INTERVAL_SECONDS):
+            if write:
+                con.execute("UPDATE sessions SET last_seen = ? WHERE conversation_id = ?", (now, session_id))
+            return
+        # BEGIN IMMEDIATE: dois workers abrindo a mesma sessao nao duplicam a saudacao.
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            row = con.execute(
+                "SELECT last_seen FROM sessions WHERE conversation_id = ?", (session_id,)
+            ).fetchone()
+            if row is not None and now - row[0] < self.ttl_seconds:
+                con.execute("UPDATE sessions SET last_seen = ? WHERE conversation_id = ?", (now, session_id))
+            else:
+                self._evict(con, now)
+                con.execute("INSERT INTO sessions (conversation_id, last_seen) VALUES (?, ?)", (session_id, now))
+                if DEFAULT_GREETING:
+                    self._insert(con, session_id, "bot", DEFAULT_GREETING)
+            if not write:
+                con.commit()
+        except BaseException:
+            con.rollback()
+            raise
+
+    def add(self, session_id: str, origin: MessageOrigin, content: str) -> StoredMessage:
+        con = self._conn()
+        with con:
+            self._open_session(con, session_id, write=True)
+            return self._insert(con, session_id, origin, content)
+
+    def history(self, session_id: str, since_id: int | None = None) -> list[StoredMessage]:
+        con = self._conn()
+        self._open_session(con, session_id, write=False)
+        rows = con.execute(
+            "SELECT id, origin, content, created_at FROM messages WHERE conversation_id = ? AND id > ? ORDER BY id",
+            (session_id, since_id or 0),
+        ).fetchall()
+        return [
+            StoredMessage(row[0], row[1], row[2], _epoch_us(datetime.fromisoformat(row[3]))) for row in rows
+        ]
+
+    def stats(self) -> dict[str, Any]:
+        con = self._conn()
+        page_count = con.execute("PRAGMA page_count").fetchone()[0]
+        page_size = con.execute("PRAGMA page_size").fetchone()[0]
+        return {
+            "backend": "sqlite",
+            "sessions": con.execute("SELECT COUNT(*) FROM sessions").fetchone()[0],
+            "messages": con.execute("SELECT COUNT(*) FROM messages").fetchone()[0],
+            "db_bytes": page_count * page_size,
+            "max_sessions": self.max_sessions,
+            "ttl_seconds": self.ttl_seconds,
+            "evicted_ttl": self._evicted["ttl"],
+            "evicted_lru": self._evicted["lru"],
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            conns, self._conns = self._conns, []
+            self._local = threading.local()
+        for con in conns:
+            con.close()
+
 
-    def __post_init__(self) -> None:
-        if DEFAULT_GREETING and not self._messages:
-            self.add("bot", DEFAULT_GREETING)
+MESSAGE_STORE_WORKERS = int(os.getenv("MESSAGE_STORE_WORKERS", "4"))
+_store_executor: ThreadPoolExecutor | None = None
+_store_executor_lock = threading.Lock()
+
+
+def _get_store_executor() -> ThreadPoolExecutor:
+    global _store_executor
+    if _store_executor is None:
+        with _store_executor_lock:
+            if _store_executor is None:
+                _store_executor = ThreadPoolExecutor(
+                    max_workers=MESSAGE_STORE_WORKERS, thread_name_prefix="message-store"
+                )
+    return _store_executor
+
+
+async def run_store(func: Callable[..., Any], *args: Any) -> Any:
+    """Executa uma operacao do historico no pool dedicado; assim o SQLite abre no maximo uma conexao por worker."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_store_executor(), functools.partial(func, *args))
+
+
+def shutdown_store_executor() -> None:
+    global _store_executor
+    with _store_executor_lock:
+        executor, _store_executor = _store_executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+def _build_message_store() -> InMemoryMessageStore | SQLiteMessageStore:
+    max_sessions = int(os.getenv("CHAT_MAX_SESSIONS", "1000"))
+    ttl_seconds = float(os.getenv("CHAT_SESSION_TTL_SECONDS", "3600"))
+    backend = (os.getenv("MESSAGE_STORE") or "memory").strip().lower()
+    # BACKEND_WORKERS vem do setup-services.sh; WEB_CONCURRENCY e o padrao de --workers do uvicorn.
+    workers = int(os.getenv("BACKEND_WORKERS") or os.getenv("WEB_CONCURRENCY") or "1")
+    if backend == "memory" and workers > 1:
+        raise RuntimeError(
+            f"MESSAGE_STORE=memory com {workers} workers: cada worker teria seu proprio historico. "
+            "Use MESSAGE_STORE=sqlite."
+        )
+    if backend == "sqlite":
+        return SQLiteMessageStore(
+            os.getenv("MESSAGE_DB_PATH") or DEFAULT_MESSAGE_DB, max_sessions=max_sessions, ttl_seconds=ttl_seconds
+        )
+    return InMemoryMessageStore(max_sessions=max_sessions, ttl_seconds=ttl_seconds)
 
 
 def _tool_list_available_slots(**kwargs):
@@ -288,6 +669,9 @@ TOOL_FUNCTIONS: dict[str, Any] = {
     "cancel_booking": _tool_cancel_booking,
 }
 
+# Ferramentas que gravam no banco: nunca rodam em paralelo com outras chamadas do mesmo turno.
+WRITE_TOOLS = frozenset({"book_appointment", "cancel_booking"})
+
 TOOL_DEFINITIONS = [
     {
         "type": "function",
@@ -518,254 +902,467 @@ class LLMOrchestrator:
 
     def __init__(
         self,
-        api_key: str | None,
+        keys: KeyPool,
         model: str,
         site_url: str,
         app_name: str,
+        window: PromptWindow | None = None,
+        http_client: httpx.AsyncClient | None = None,
+        base_url: str = "https://openrouter.ai/api/v1",
+        max_retries: int = 2,
+        request_deadline: float = 60.0,
+        max_backoff_wait: float = 2.0,
+        max_tool_rounds: int = 6,
+        turn_deadline: float = 90.0,
     ) -> None:
         self.model = model
         self.site_url = site_url
         self.app_name = app_name
-        self._api_keys: list[str] = []
-        if api_key:
-            self._api_keys = [api_key]
-        self._client = self._build_client(api_key)
+        self.keys = keys
+        self.max_retries = max_retries  # tentativas extras por chamada ao modelo
+        self.request_deadline = request_deadline  # prazo total de uma chamada, somando as tentativas
+        self.max_backoff_wait = max_backoff_wait  # espera maxima por uma chave antes de falhar rapido
+        self.max_tool_rounds = max_tool_rounds  # rodadas de ferramentas por turno antes da resposta final
+        self.turn_deadline = turn_deadline  # prazo do turno para as rodadas com ferramentas
+        # Um unico pool HTTP (keep-alive) para todas as chaves: trocar de chave nao reabre conexoes.
+        self._http = http_client or httpx.AsyncClient()
+        self._clients: list[AsyncOpenAI] = []
+        if keys.keys:
+            # Sem retries internos do SDK: a politica de repeticao (e o backoff por chave) e nossa.
+            base = AsyncOpenAI(base_url=base_url, api_key=keys.keys[0], http_client=self._http, max_retries=0)
+            self._clients = [base] + [base.with_options(api_key=key) for key in keys.keys[1:]]
         self.tools = TOOL_DEFINITIONS
+        self.window = window or PromptWindow(budget_tokens=8000, summary_tokens=512)
+        self._tools_tokens = estimate_message_tokens({"content": json.dumps(self.tools, ensure_ascii=False)})
 
-    def _build_client(self, api_key: str | None) -> AsyncOpenAI | None:
-        if not api_key:
-            return None
-        return AsyncOpenAI(base_url="https://openrouter.ai/api/v1", api_key=api_key)
-
-    def _pick_new_key(self) -> bool:
-        raw = os.getenv("OPENROUTER_API_KEYS")
-        entries: list[str] = []
-        if raw:
-            entries = [item.strip() for item in raw.replace("\n", ",").replace(";", ",").split(",") if item.strip()]
-        direct = os.getenv("OPENROUTER_API_KEY")
-        if direct and direct.strip():
-            entries.append(direct.strip())
-        unique = [key for idx, key in enumerate(entries) if key and key not in entries[:idx]]
-        if not unique:
-            return False
-        choice = random.choice(unique)
-        self._client = self._build_client(choice)
-        return self._client is not None
+    async def aclose(self) -> None:
+        await self._http.aclose()
 
-    def _build_messages(self, history: list[Message], profile: dict[str, Any] | None = None) -> list[dict[str, Any]]:
+    def _build_messages(
+        self,
+        history: Sequence[StoredMessage],
+        profile: dict[str, Any] | None = None,
+        summary: Summary | None = None,
+    ) -> list[dict[str, Any]]:
         messages: list[dict[str, Any]] = [{"role": "system", "content": SYSTEM_PROMPT}]
         today = datetime.now(timezone.utc).astimezone().strftime("%Y-%m-%d")
         messages.append({"role": "system", "content": f"Data atual: {today}. Use esta data como referencia."})
         if profile:
             messages.append({"role": "system", "content": profile_to_prompt(profile)})
+        if summary:
+            messages.append({"role": "system", "content": f"Resumo da conversa ate aqui: {summary.text}"})
         for message in history:
             role = "assistant" if message.origin == "bot" else "user"
             messages.append({"role": role, "content": message.content})
         return messages
 
+    async def _summarize(self, previous: Summary | None, pending: Sequence[StoredMessage]) -> Summary:
+        """Incorpora `pending` ao resumo anterior; sem LLM (ou se a chamada falhar) usa o resumo extrativo."""
+        previous_text = previous.text if previous else None
+        covered_id = pending[-1].id
+        with self.keys.lease() as idx:
+            if idx is not None:
+                transcript = "\n".join(
+                    f"{'Aurora' if message.origin == 'bot' else 'Paciente'}: {message.content}" for message in pending
+                )
+                try:
+                    response = await self._clients[idx].chat.completions.create(
+                        model=self.model,
+                        messages=[
+                            {"role": "system", "content": SUMMARY_PROMPT},
+                            {
+                                "role": "user",
+                                "content": f"Resumo anterior:\n{previous_text or '(vazio)'}\n\nNovas mensagens:\n{transcript}",
+                            },
+                        ],
+                        max_tokens=self.window.summary_tokens,
+                        extra_headers={
+                            "HTTP-Referer": self.site_url,
+                            "X-Title": self.app_name,
+                        },
+                    )
+                    self.keys.report_success(idx)
+                    text = (response.choices[0].message.content or "").strip() if response.choices else ""
+                    if text:
+                        return Summary(covered_id, text[: self.window.summary_tokens * CHARS_PER_TOKEN])
+                except _PROVIDER_ERRORS as exc:  # pragma: no cover
+                    if _is_key_failure(exc):
+                        self.keys.report_failure(idx, type(exc).__name__, _retry_after(exc))
+                    logger.warning("Falha ao resumir o historico, usando resumo extrativo: %s", exc)
+        return Summary(covered_id, extractive_summary(previous_text, pending, self.window.summary_tokens))
+
+    async def _prepare_messages(
+        self,
+        history: Sequence[StoredMessage],
+        profile: dict[str, Any] | None,
+        session_id: str | None,
+    ) -> list[dict[str, Any]]:
+        fixed = sum(estimate_message_tokens(message) for message in self._build_messages((), profile))
+        plan = self.window.plan(session_id, history, fixed + self._tools_tokens)
+        summary = plan.summary
+        if plan.pending:
+            summary = await self._summarize(summary, plan.pending)
+            self.window.remember(session_id, summary)
+        return self._build_messages(history[plan.start :], profile, summary)
+
     async def _execute_tool(self, name: str, args: dict[str, Any]) -> dict[str, Any]:
         func = TOOL_FUNCTIONS.get(name)
         if not func:
             return {"error": f"Ferramenta {name} nao disponivel."}
-        return await run_in_threadpool(func, **args)
+        return await scheduling.run_async(func, **args)
 
-    async def _call_model(self, messages: list[dict[str, Any]]):
-        client = self._client
-        if not client:
-            raise LLMServiceError("LLM nao configurado.")
-        try:
-            return await client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                tools=self.tools,
-                tool_choice="auto",
-                extra_headers={
-                    "HTTP-Referer": self.site_url,
-                    "X-Title": self.app_name,
-                },
-            )
-        except Exception as exc:  # pragma: no cover
-            raise LLMServiceError("Falha ao chamar o provedor de LLM") from exc
+    async def _execute_tool_calls(self, calls: list[tuple[str, str | None]]) -> list[dict[str, Any]]:
+        """Executa as ferramentas pedidas num turno, com resultados na ordem das chamadas.
 
-    async def _run_with_tools(self, messages: list[dict[str, Any]]) -> str:
+        Leituras consecutivas rodam em paralelo no pool do agendamento; escritas (WRITE_TOOLS)
+        funcionam como barreira e rodam sozinhas, na ordem em que o modelo pediu.
+        """
+        results: list[dict[str, Any]] = []
+        batch: list[tuple[str, dict[str, Any]]] = []
+
+        async def flush() -> None:
+            results.extend(await asyncio.gather(*(self._execute_tool(name, args) for name, args in batch)))
+            batch.clear()
+
+        for name, arguments in calls:
+            try:
+                args = json.loads(arguments or "{}")
+            except json.JSONDecodeError:
+                args = {}
+            if name in WRITE_TOOLS:
+                await flush()
+                results.append(await self._execute_tool(name, args))
+            else:
+                batch.append((name, args))
+        await flush()
+        return results
+
+    async def _acquire_key(self, deadline: float) -> int:
+        """Chave saudavel para a proxima tentativa; espera um backoff curto ou falha rapido (circuito aberto)."""
+        while True:
+            idx = self.keys.acquire()
+            if idx is not None:
+                return idx
+            wait = self.keys.retry_in()
+            if wait is None:
+                raise LLMServiceError("LLM nao configurado.")
+            if wait > min(self.max_backoff_wait, deadline - time.monotonic()):
+                metrics.registry.counter("llm.circuit_open").inc()
+                raise LLMServiceError(f"Todas as chaves estao em backoff (proxima em {wait:.1f}s).")
+            await asyncio.sleep(wait)
+
+    def _can_retry(self, exc: Exception, attempt: int, deadline: float) -> bool:
+        if time.monotonic() >= deadline:
+            metrics.registry.counter("llm.deadline_exceeded").inc()
+            return False
+        if not _is_key_failure(exc):
+            return False  # erro do pedido (400, 404, 422): outra chave nao resolve
+        if attempt >= self.max_retries:
+            metrics.registry.counter("llm.retry_budget_exhausted").inc()
+            return False
+        metrics.registry.counter("llm.retries").inc()
+        return True
+
+    def _tool_args(self, use_tools: bool) -> dict[str, Any]:
+        # Com o orcamento esgotado as ferramentas continuam declaradas (o historico tem chamadas), mas desligadas.
+        return {"tools": self.tools, "tool_choice": "auto" if use_tools else "none"}
+
+    def _observe_turn(self, rounds: int, started: float) -> None:
+        metrics.registry.histogram("chat.tool_rounds", TOOL_ROUND_BUCKETS).observe(rounds)
+        metrics.registry.histogram("chat.turn_ms").observe((time.monotonic() - started) * 1000)
+
+    async def _call_model(
+        self,
+        messages: list[dict[str, Any]],
+        use_tools: bool = True,
+        deadline: float | None = None,
+    ):
+        deadline = min(time.monotonic() + self.request_deadline, deadline or float("inf"))
+        attempt = 0
         while True:
+            idx = await self._acquire_key(deadline)
             try:
-                response = await self._call_model(messages)
-            except LLMServiceError as exc:
-                logger.warning("LLM indisponivel: %s", exc)
-                if self._pick_new_key():
-                    logger.info("Trocando chave OpenRouter e tentando novamente.")
+                response = await asyncio.wait_for(
+                    self._clients[idx].chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        **self._tool_args(use_tools),
+                        extra_headers={
+                            "HTTP-Referer": self.site_url,
+                            "X-Title": self.app_name,
+                        },
+                    ),
+                    timeout=max(deadline - time.monotonic(), 0.0),
+                )
+            except _PROVIDER_ERRORS as exc:  # pragma: no cover
+                logger.warning("Falha no OpenRouter (chave %s): %r", mask_key(self.keys.keys[idx]), exc)
+                if _is_key_failure(exc):
+                    self.keys.report_failure(idx, type(exc).__name__, _retry_after(exc))
+                if not self._can_retry(exc, attempt, deadline):
+                    raise LLMServiceError("Falha ao chamar o provedor de LLM") from exc
+                attempt += 1
+                continue
+            else:
+                self.keys.report_success(idx)
+                return response
+            finally:
+                self.keys.release(idx)
+
+    def _end_tool_rounds(self, messages: list[dict[str, Any]], rounds: int, started: float) -> None:
+        metrics.registry.counter("chat.tool_budget_exhausted").inc()
+        logger.info(
+            "Orcamento de ferramentas esgotado (%d rodadas, %.1fs); pedindo resposta final.",
+            rounds,
+            time.monotonic() - started,
+        )
+        messages.append({"role": "system", "content": TOOL_BUDGET_PROMPT})
+
+    async def _run_with_tools(self, messages: list[dict[str, Any]]) -> str:
+        started = time.monotonic()
+        turn_deadline = started + self.turn_deadline
+        rounds = 0
+        use_tools = True
+        try:
+            while True:
+                if use_tools and (rounds >= self.max_tool_rounds or time.monotonic() >= turn_deadline):
+                    use_tools = False
+                    self._end_tool_rounds(messages, rounds, started)
+                try:
+                    response = await self._call_model(messages, use_tools, turn_deadline if use_tools else None)
+                except LLMServiceError as exc:
+                    if use_tools and time.monotonic() >= turn_deadline:
+                        continue  # o prazo do turno venceu durante a chamada: segue para a resposta final
+                    logger.warning("LLM indisponivel: %s", exc)
+                    return "Desculpe, o provedor de respostas esta indisponivel agora. Tente novamente em instantes."
+                if not response.choices:
+                    return "Desculpe, nao consegui gerar uma resposta agora."
+                choice = response.choices[0]
+                message = choice.message
+                if use_tools and getattr(message, "tool_calls", None):
+                    rounds += 1
+                    assistant_message = {
+                        "role": "assistant",
+                        "content": message.content or "",
+                        "tool_calls": [
+                            {
+                                "id": call.id,
+                                "type": call.type,
+                                "function": {
+                                    "name": call.function.name,
+                                    "arguments": call.function.arguments,
+                                },
+                            }
+                            for call in message.tool_calls
+                        ],
+                    }
+                    messages.append(assistant_message)
+                    results = await self._execute_tool_calls(
+                        [(call.function.name, call.function.arguments) for call in message.tool_calls]
+                    )
+                    for call, result in zip(message.tool_calls, results):
+                        messages.append(
+                            {
+                                "role": "tool",
+                                "tool_call_id": call.id,
+                                "name": call.function.name,
+                                "content": json.dumps(result, ensure_ascii=False),
+                            }
+                        )
                     continue
-                return "Desculpe, o provedor de respostas esta indisponivel agora. Tente novamente em instantes."
-            if not response.choices:
+                if message.content:
+                    reply = message.content.strip()
+                    if reply:
+                        messages.append({"role": "assistant", "content": reply})
+                        return reply
                 return "Desculpe, nao consegui gerar uma resposta agora."
-            choice = response.choices[0]
-            message = choice.message
-            if getattr(message, "tool_calls", None):
-                assistant_message = {
-                    "role": "assistant",
-                    "content": message.content or "",
-                    "tool_calls": [
-                        {
-                            "id": call.id,
-                            "type": call.type,
-                            "function": {
-                                "name": call.function.name,
-                                "arguments": call.function.arguments,
-                            },
-                        }
-                        for call in message.tool_calls
-                    ],
-                }
-                messages.append(assistant_message)
-                for call in message.tool_calls:
-                    try:
-                        args = json.loads(call.function.arguments or "{}")
-                    except json.JSONDecodeError:
-                        args = {}
-                    result = await self._execute_tool(call.function.name, args)
-                    messages.append(
-                        {
-                            "role": "tool",
-                            "tool_call_id": call.id,
-                            "name": call.function.name,
-                            "content": json.dumps(result, ensure_ascii=False),
-                        }
-                    )
-                continue
-            if message.content:
-                reply = message.content.strip()
-                if reply:
-                    messages.append({"role": "assistant", "content": reply})
-                    return reply
-            return "Desculpe, nao consegui gerar uma resposta agora."
+        finally:
+            self._observe_turn(rounds, started)
 
     async def _stream_with_tools(self, messages: list[dict[str, Any]]) -> AsyncIterator[str]:
-        try:
-            client = self._client
-            if not client:
-                raise LLMServiceError("LLM nao configurado.")
-            stream = await client.chat.completions.create(
-                model=self.model,
-                stream=True,
-                messages=messages,
-                tools=self.tools,
-                tool_choice="auto",
-                extra_headers={
-                    "HTTP-Referer": self.site_url,
-                    "X-Title": self.app_name,
-                },
-            )
+        """Repassa os tokens do provedor assim que chegam, em todas as rodadas de ferramentas."""
+        started = time.monotonic()
+        turn_deadline = started + self.turn_deadline
+        rounds = 0
+        use_tools = True
+        attempt = 0
+        while True:
+            if attempt == 0:
+                if use_tools and (rounds >= self.max_tool_rounds or time.monotonic() >= turn_deadline):
+                    use_tools = False
+                    self._end_tool_rounds(messages, rounds, started)
+                # Cada rodada e uma nova chamada, com prazo e tentativas proprios.
+                deadline = time.monotonic() + self.request_deadline
+                if use_tools:
+                    deadline = min(deadline, turn_deadline)
             assistant_text = ""
-            tool_calls: dict[str, dict[str, Any]] = {}
-            finish_reason = None
-
-            async for chunk in stream:
-                if not chunk.choices:
-                    continue
-                choice = chunk.choices[0]
-                finish_reason = choice.finish_reason
-                delta = choice.delta
-                content = delta.content
-                if isinstance(content, list):
-                    for piece in content:
-                        text = None
-                        if isinstance(piece, str):
-                            text = piece
-                        elif isinstance(piece, dict) and piece.get("type") == "text":
-                            text = piece.get("text")
-                        if text:
-                            assistant_text += text
-                            yield text
-                elif isinstance(content, str):
-                    assistant_text += content
-                    yield content
-
-                if delta.tool_calls:
-                    for call in delta.tool_calls:
-                        entry = tool_calls.setdefault(
-                            call.id,
-                            {"id": call.id, "type": call.type, "function": {"name": "", "arguments": ""}},
+            # Nos deltas de streaming o id so vem no primeiro pedaco de cada chamada; o indice e estavel.
+            tool_calls: dict[int, dict[str, Any]] = {}
+            try:
+                idx = await self._acquire_key(deadline)
+            except LLMServiceError as exc:
+                logger.warning("LLM indisponivel: %s", exc)
+                self._observe_turn(rounds, started)
+                yield "Desculpe, o provedor de respostas esta indisponivel agora. Tente novamente em instantes."
+                return
+            try:
+                try:
+                    # O prazo vale para a rodada inteira (abrir o stream e ler todos os pedacos). Um unico
+                    # asyncio.timeout em volta do laco nao serve: o gerador cede tokens ao cliente, e o
+                    # cancelamento cairia no consumidor; por isso cada espera usa o mesmo instante limite.
+                    expires = asyncio.get_running_loop().time() + max(deadline - time.monotonic(), 0.0)
+                    async with asyncio.timeout_at(expires):
+                        stream = await self._clients[idx].chat.completions.create(
+                            model=self.model,
+                            stream=True,
+                            messages=messages,
+                            **self._tool_args(use_tools),
+                            extra_headers={
+                                "HTTP-Referer": self.site_url,
+                                "X-Title": self.app_name,
+                            },
                         )
-                        if call.function and call.function.name:
-                            entry["function"]["name"] = call.function.name
-                        if call.function and call.function.arguments:
-                            entry["function"]["arguments"] += call.function.arguments
-
-            if tool_calls and finish_reason == "tool_calls":
-                assistant_message = {
-                    "role": "assistant",
-                    "content": assistant_text,
-                    "tool_calls": [
-                        {
-                            "id": call_id,
-                            "type": data["type"],
-                            "function": data["function"],
-                        }
-                        for call_id, data in tool_calls.items()
-                    ],
-                }
-                messages.append(assistant_message)
-                for call_id, data in tool_calls.items():
-                    func_name = data["function"].get("name") or ""
-                    args_json = data["function"].get("arguments") or "{}"
-                    try:
-                        args = json.loads(args_json)
-                    except json.JSONDecodeError:
-                        args = {}
-                    result = await self._execute_tool(func_name, args)
+                    async with stream:
+                        chunks = aiter(stream)
+                        while True:
+                            try:
+                                async with asyncio.timeout_at(expires):
+                                    chunk = await anext(chunks)
+                            except StopAsyncIteration:
+                                break
+                            if not chunk.choices:
+                                continue
+                            delta = chunk.choices[0].delta
+                            content = delta.content
+                            if isinstance(content, list):
+                                for piece in content:
+                                    text = None
+                                    if isinstance(piece, str):
+                                        text = piece
+                                    elif isinstance(piece, dict) and piece.get("type") == "text":
+                                        text = piece.get("text")
+                                    if text:
+                                        assistant_text += text
+                                        yield text
+                            elif isinstance(content, str) and content:
+                                assistant_text += content
+                                yield content
+
+                            for call in delta.tool_calls or ():
+                                entry = tool_calls.setdefault(
+                                    call.index if call.index is not None else len(tool_calls),
+                                    {"id": "", "type": "function", "function": {"name": "", "arguments": ""}},
+                                )
+                                if call.id:
+                                    entry["id"] = call.id
+                                if call.type:
+                                    entry["type"] = call.type
+                                if call.function and call.function.name:
+                                    entry["function"]["name"] = call.function.name
+                                if call.function and call.function.arguments:
+                                    entry["function"]["arguments"] += call.function.arguments
+                except _PROVIDER_ERRORS as exc:  # pragma: no cover
+                    logger.warning("Falha no stream do OpenRouter (chave %s): %r", mask_key(self.keys.keys[idx]), exc)
+                    if _is_key_failure(exc):
+                        self.keys.report_failure(idx, type(exc).__name__, _retry_after(exc))
+                    # So da para repetir a rodada se nada dela chegou ao cliente.
+                    if not assistant_text:
+                        if self._can_retry(exc, attempt, deadline):
+                            attempt += 1
+                            continue
+                        if use_tools and time.monotonic() >= turn_deadline:
+                            attempt = 0  # o prazo do turno venceu durante a chamada: segue para a resposta final
+                            continue
+                    self._observe_turn(rounds, started)
+                    yield "Desculpe, nao consegui falar com o modelo agora. Tente novamente."
+                    return
+                self.keys.report_success(idx)
+            finally:
+                self.keys.release(idx)
+            attempt = 0
+
+            if use_tools and tool_calls:
+                rounds += 1
+                calls = [tool_calls[idx] for idx in sorted(tool_calls)]
+                messages.append({"role": "assistant", "content": assistant_text, "tool_calls": calls})
+                results = await self._execute_tool_calls(
+                    [(call["function"]["name"], call["function"]["arguments"]) for call in calls]
+                )
+                for call, result in zip(calls, results):
                     messages.append(
                         {
                             "role": "tool",
-                            "tool_call_id": call_id,
-                            "name": func_name,
+                            "tool_call_id": call["id"],
+                            "name": call["function"]["name"],
                             "content": json.dumps(result, ensure_ascii=False),
                         }
                     )
-                final_reply = await self._run_with_tools(messages)
-                if assistant_text and final_reply.startswith(assistant_text):
-                    tail = final_reply[len(assistant_text):]
-                else:
-                    tail = final_reply
-                if tail:
-                    yield tail
-                elif final_reply:
-                    yield final_reply
-                return
-        except Exception as exc:  # pragma: no cover
-            logger.exception("Falha no stream do OpenRouter: %s", exc)
-            yield "Desculpe, nao consegui falar com o modelo agora. Tente novamente."
+                continue
+            self._observe_turn(rounds, started)
+            if assistant_text.strip():
+                messages.append({"role": "assistant", "content": assistant_text})
+            else:
+                yield "Desculpe, nao consegui gerar uma resposta agora."
+            return
 
-    async def generate_reply(self, history: list[Message], profile: dict[str, Any] | None = None) -> str:
-        if not self._client:
+    async def generate_reply(
+        self,
+        history: Sequence[StoredMessage],
+        profile: dict[str, Any] | None = None,
+        session_id: str | None = None,
+    ) -> str:
+        if not self.keys:
             return "Echo acessivel: configure OPENROUTER_API_KEY para usar respostas reais."
-        messages = self._build_messages(history, profile)
+        messages = await self._prepare_messages(history, profile, session_id)
         return await self._run_with_tools(messages)
 
-    async def stream_reply(self, history: list[Message], profile: dict[str, Any] | None = None) -> AsyncIterator[str]:
-        if not self._client:
+    async def stream_reply(
+        self,
+        history: Sequence[StoredMessage],
+        profile: dict[str, Any] | None = None,
+        session_id: str | None = None,
+    ) -> AsyncIterator[str]:
+        if not self.keys:
             fallback = "Echo acessivel: configure OPENROUTER_API_KEY para usar respostas reais."
             for char in fallback:
                 yield char
             return
 
-        messages = self._build_messages(history, profile)
-        reply = await self._run_with_tools(messages)
-        step = 12
-        for idx in range(0, len(reply), step):
-            yield reply[idx : idx + step]
+        messages = await self._prepare_messages(history, profile, session_id)
+        async for token in self._stream_with_tools(messages):
+            yield token
 
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("chatbot-inclusivo")
 
-store = InMemoryMessageStore()
+store = _build_message_store()
+# Compatibilidade: clientes antigos esperam o historico completo na resposta de POST /messages.
+MESSAGES_FULL_HISTORY = os.getenv("MESSAGES_FULL_HISTORY", "").strip().lower() in {"1", "true", "yes"}
 orchestrator = LLMOrchestrator(
-    api_key=_load_openrouter_api_key(),
+    keys=KeyPool.from_env(),
     model=os.getenv("OPENROUTER_MODEL", "qwen/qwen3-235b-a22b:free"),
     site_url=os.getenv("OPENROUTER_SITE_URL", "http://localhost:5173"),
     app_name=os.getenv("OPENROUTER_APP_NAME", "Chatbot Inclusivo"),
+    window=PromptWindow(
+        budget_tokens=int(os.getenv("PROMPT_TOKEN_BUDGET", "8000")),
+        summary_tokens=int(os.getenv("PROMPT_SUMMARY_TOKENS", "512")),
+        max_sessions=int(os.getenv("CHAT_MAX_SESSIONS", "1000")),
+    ),
+    http_client=httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20")),
+            keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY_SECONDS", "60")),
+        ),
+        timeout=httpx.Timeout(float(os.getenv("LLM_TIMEOUT_SECONDS", "120")), connect=10.0),
+    ),
+    base_url=os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1"),
+    max_retries=int(os.getenv("LLM_MAX_RETRIES", "2")),
+    request_deadline=float(os.getenv("LLM_REQUEST_DEADLINE_SECONDS", "60")),
+    max_backoff_wait=float(os.getenv("LLM_MAX_BACKOFF_WAIT_SECONDS", "2")),
+    max_tool_rounds=int(os.getenv("LLM_MAX_TOOL_ROUNDS", "6")),
+    turn_deadline=float(os.getenv("LLM_TURN_DEADLINE_SECONDS", "90")),
 )
 stt_service: STTService | None = None
 
@@ -796,7 +1393,18 @@ def _build_stt_service() -> STTService | None:
 
 stt_service = _build_stt_service()
 
-app = FastAPI(title="Chatbot Inclusivo API", version="0.1.0")
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    await scheduling.run_async(scheduling.ensure_schema)
+    yield
+    scheduling.shutdown_executor()
+    scheduling.close_all_conns()
+    shutdown_store_executor()
+    store.close()
+    await orchestrator.aclose()
+
+
+app = FastAPI(title="Chatbot Inclusivo API", version="0.1.0", lifespan=lifespan)
 
 allowed_origins_env = os.getenv("ALLOW_ORIGINS")
 if allowed_origins_env:
@@ -817,30 +1425,54 @@ app.add_middleware(
 
 
 @app.get("/history", response_model=list[Message])
-async def get_history() -> list[Message]:
-    return store.history()
+async def get_history(
+    session_id: str = Query(DEFAULT_SESSION, pattern=SESSION_ID_PATTERN),
+    since_id: Optional[int] = Query(None, ge=0),
+) -> list[Message]:
+    return _to_api(await run_store(store.history, session_id, since_id))
+
+
+@app.get("/metrics")
+async def get_metrics():
+    return {**metrics.registry.snapshot(), "llm_keys": orchestrator.keys.stats()}
+
+
+@app.get("/sessions/stats")
+async def get_session_stats():
+    return await run_store(store.stats)
 
 
 @app.post("/messages", response_model=list[Message])
-async def post_message(payload: MessagePayload) -> list[Message]:
-    store.add("user", payload.content)
+async def post_message(payload: MessagePayload, full_history: Optional[bool] = None) -> list[Message]:
+    """Retorna apenas as mensagens criadas no turno; full_history=true devolve o historico completo."""
+    session_id = payload.session_id
+    user_message = await run_store(store.add, session_id, "user", payload.content)
     profile_data = payload.profile.model_dump() if payload.profile else None
-    reply = await orchestrator.generate_reply(store.history(), profile_data)
-    store.add("bot", reply)
-    return store.history()
+    history = await run_store(store.history, session_id)
+    reply = await orchestrator.generate_reply(history, profile_data, session_id)
+    bot_message = await run_store(store.add, session_id, "bot", reply)
+    if MESSAGES_FULL_HISTORY if full_history is None else full_history:
+        return _to_api(await run_store(store.history, session_id))
+    return _to_api([user_message, bot_message])
 
 
 @app.post("/messages/stream")
 async def post_message_stream(payload: MessagePayload):
-    store.add("user", payload.content)
+    started = time.perf_counter()
+    session_id = payload.session_id
+    await run_store(store.add, session_id, "user", payload.content)
 
     async def token_stream():
         bot_content = ""
         profile_data = payload.profile.model_dump() if payload.profile else None
-        async for token in orchestrator.stream_reply(store.history(), profile_data):
+        history = await run_store(store.history, session_id)
+        async for token in orchestrator.stream_reply(history, profile_data, session_id):
+            if not bot_content and token:
+                metrics.registry.histogram("stream.ttfb_ms").observe((time.perf_counter() - started) * 1000)
             bot_content += token
             yield token
-        store.add("bot", bot_content)
+        metrics.registry.histogram("stream.duration_ms").observe((time.perf_counter() - started) * 1000)
+        await run_store(store.add, session_id, "bot", bot_content)
 
     return StreamingResponse(token_stream(), media_type="text/plain")
 
@@ -886,13 +1518,14 @@ async def create_transcription(file: UploadFile = File(...)):
 async def list_slots(payload: SlotAvailabilityPayload):
     data = payload.model_dump()
     data["start_date"] = _date_to_iso(payload.start_date)
-    return scheduling.list_available_slots_tool(data)
+    return await scheduling.run_async(scheduling.list_available_slots_tool, data)
 
 
 @app.post("/tools/book")
 async def create_booking(payload: BookAppointmentPayload):
     try:
-        result = scheduling.book_appointment(
+        result = await scheduling.run_async(
+            scheduling.book_appointment,
             specialty=payload.specialty,
             slot_date=payload.slot_date.isoformat(),
             slot=payload.slot,
@@ -902,25 +1535,29 @@ async def create_booking(payload: BookAppointmentPayload):
             doctor_name=payload.doctor_name,
             triage=payload.triage,
         )
-        return result
     except Exception as exc:  # pragma: no cover
         logger.exception("Falha ao criar agendamento: %s", exc)
         raise HTTPException(status_code=500, detail="Nao foi possivel registrar o agendamento.") from exc
+    if not result.get("booked"):
+        raise HTTPException(status_code=409, detail=result.get("reason", "Horario indisponivel."))
+    return result
 
 
 @app.post("/tools/capacity")
 async def check_capacity(payload: CapacityPayload):
-    return scheduling.check_capacity_tool(payload.date.isoformat(), payload.slot)
+    return await scheduling.run_async(scheduling.check_capacity_tool, payload.date.isoformat(), payload.slot)
 
 
 @app.post("/tools/doctor-status")
 async def doctor_status(payload: DoctorStatusPayload):
-    return scheduling.doctor_status_tool(payload.doctor_name, payload.date.isoformat(), payload.slot)
+    return await scheduling.run_async(
+        scheduling.doctor_status_tool, payload.doctor_name, payload.date.isoformat(), payload.slot
+    )
 
 
 @app.post("/tools/resources")
 async def resources_status(payload: ResourceStatusPayload):
-    return scheduling.resources_status_tool(payload.date.isoformat(), payload.slot)
+    return await scheduling.run_async(scheduling.resources_status_tool, payload.date.isoformat(), payload.slot)
 
 
 @app.post("/tools/triage-score")
@@ -930,15 +1567,34 @@ async def calc_triage(payload: dict[str, Any]):
 
 @app.post("/tools/bookings")
 async def list_bookings_endpoint(payload: BookingFilterPayload):
-    return scheduling.list_bookings_tool(
-        date_str=_date_to_iso(payload.date),
-        faixa=payload.slot,
-    )
+    filters = {
+        "date_str": _date_to_iso(payload.date),
+        "faixa": payload.slot,
+        "after_id": payload.after_id,
+        "after_date": _date_to_iso(payload.after_date),
+        "date_from": _date_to_iso(payload.date_from),
+        "date_to": _date_to_iso(payload.date_to),
+    }
+    if payload.stream:
+        return StreamingResponse(_bookings_ndjson(filters), media_type="application/x-ndjson")
+    return await scheduling.run_async(scheduling.list_bookings_tool, limit=payload.limit, **filters)
+
+
+async def _bookings_ndjson(filters: dict[str, Any]) -> AsyncIterator[bytes]:
+    batches = scheduling.iter_bookings(**filters)
+    try:
+        while True:
+            batch = await scheduling.run_async(next, batches, None)
+            if batch is None:
+                break
+            yield "".join(json.dumps(item, ensure_ascii=False) + "\n" for item in batch).encode("utf-8")
+    finally:
+        await scheduling.run_async(batches.close)
 
 
 @app.get("/tools/patients/{patient_id}")
 async def get_patient_requirements(patient_id: int):
-    data = scheduling.patient_requirements_tool(patient_id)
+    data = await scheduling.run_async(scheduling.patient_requirements_tool, patient_id)
     if not data:
         raise HTTPException(status_code=404, detail="Paciente nao encontrado.")
     return data
@@ -946,7 +1602,7 @@ async def get_patient_requirements(patient_id: int):
 
 @app.post("/tools/cancel-booking")
 async def cancel_booking_endpoint(payload: CancelBookingPayload):
-    result = scheduling.cancel_booking_tool(payload.booking_id)
+    result = await scheduling.run_async(scheduling.cancel_booking_tool, payload.booking_id)
     if not result.get("cancelled"):
         raise HTTPException(status_code=404, detail=result.get("reason", "Agendamento nao encontrado."))
     return result
@@ -956,10 +1612,19 @@ async def cancel_booking_endpoint(payload: CancelBookingPayload):
 async def suggest_slot(payload: SuggestSlotPayload):
     data = payload.model_dump()
     data["start_date"] = _date_to_iso(payload.start_date)
-    return scheduling.suggest_alternative_slot_tool(data)
+    return await scheduling.run_async(scheduling.suggest_alternative_slot_tool, data)
 
 
 @app.get("/availability")
 async def get_availability(days: int = 7):
     safe_days = max(1, min(days, 30))
-    return scheduling.availability_snapshot(safe_days)
+    # Serializa no pool de agendamento: o jsonable_encoder no event loop custaria mais que a consulta.
+    body = await scheduling.run_async(
+        lambda: json.dumps(scheduling.availability_snapshot(safe_days), ensure_ascii=False, separators=(",", ":"))
+    )
+    return Response(content=body, media_type="application/json")
+
+
+@app.get("/availability/cache")
+async def get_availability_cache_stats():
+    return scheduling.availability_cache.stats()
@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .scheduling import (
+    HILL_BATCH_SIZE,
+    PESO_DISP,
+    PESO_ESP,
+    PESO_ONLINE,
+    PESO_OVER,
+    PESO_PERIODO,
+    PESO_RECURSO,
+    PESO_URGENCIA,
+    _HillProblem,
+)
+
+
+@dataclass(frozen=True)
+class BatchTables:
+    """`_HillProblem` em arrays: cada penalidade de um lote de K movimentos sai de uma indexacao vetorizada."""
+
+    slot_options: np.ndarray  # (P, S) faixas sorteaveis de cada paciente, completadas com a primeira
+    slot_option_count: np.ndarray  # (P,)
+    esp: np.ndarray  # (P,) indice da especialidade do paciente
+    period: np.ndarray  # (P,) indice do periodo do paciente
+    online: np.ndarray  # (P,) bool
+    acc: np.ndarray  # (P, R) quantidade de cada recurso pedido
+    urg: np.ndarray  # (P,)
+    candidates: np.ndarray  # (E, S, Dmax) medicos da especialidade disponiveis na faixa, completados com 0
+    candidate_count: np.ndarray  # (E, S)
+    candidate_mask: np.ndarray  # (E, S, D) bool
+    fallback: np.ndarray  # (E, D) medicos da especialidade (ou todos), completados com 0
+    fallback_count: np.ndarray  # (E,)
+    esp_ok: np.ndarray  # (E, D) bool
+    doctor_online: np.ndarray  # (D,) bool
+    doctor_slots: np.ndarray  # (D, S) bool
+    doctor_key: np.ndarray  # (D,)
+    period_ok: np.ndarray  # (Pe, S) bool
+    capacity: np.ndarray  # (S,)
+    resource_caps: np.ndarray  # (S, R)
+
+    @classmethod
+    def build(cls, problem: _HillProblem) -> "BatchTables":
+        patients = problem.patients
+        slot_count = len(problem.slots)
+        doctor_count = len(problem.doctors)
+        esp_ids: Dict[str, int] = {}
+        period_ids: Dict[frozenset, int] = {}
+        resources: Dict[str, int] = {}
+        for idx, patient in enumerate(patients):
+            esp_ids.setdefault(patient["esp"], len(esp_ids))
+            period_ids.setdefault(problem.patient_period_ok[idx], len(period_ids))
+            for req, _ in problem.patient_acc[idx]:
+                resources.setdefault(req, len(resources))
+        for caps in problem.resource_caps:
+            for name in caps:
+                resources.setdefault(name, len(resources))
+
+        slot_options = np.zeros((len(patients), slot_count), dtype=np.int64)
+        slot_option_count = np.zeros(len(patients), dtype=np.int64)
+        acc = np.zeros((len(patients), max(1, len(resources))), dtype=np.int64)
+        for idx, options in enumerate(problem.patient_slots):
+            slot_options[idx, : len(options)] = options
+            slot_options[idx, len(options) :] = options[0]
+            slot_option_count[idx] = len(options)
+            for req, count in problem.patient_acc[idx]:
+                acc[idx, resources[req]] = count
+
+        first_of_esp = {esp: next(i for i, p in enumerate(patients) if p["esp"] == esp) for esp in esp_ids}
+        max_candidates = max(1, doctor_count)
+        candidates = np.zeros((len(esp_ids), slot_count, max_candidates), dtype=np.int64)
+        candidate_count = np.zeros((len(esp_ids), slot_count), dtype=np.int64)
+        candidate_mask = np.zeros((len(esp_ids), slot_count, doctor_count), dtype=bool)
+        fallback = np.zeros((len(esp_ids), max_candidates), dtype=np.int64)
+        fallback_count = np.zeros(len(esp_ids), dtype=np.int64)
+        esp_ok = np.zeros((len(esp_ids), doctor_count), dtype=bool)
+        for esp, eid in esp_ids.items():
+            pidx = first_of_esp[esp]
+            for slot_idx, options in enumerate(problem.patient_candidates[pidx]):
+                candidates[eid, slot_idx, : len(options)] = options
+                candidate_count[eid, slot_idx] = len(options)
+                candidate_mask[eid, slot_idx, list(options)] = True
+            options = problem.patient_fallback[pidx]
+            fallback[eid, : len(options)] = options
+            fallback_count[eid] = len(options)
+            esp_ok[eid, list(problem.patient_esp_ok[pidx])] = True
+
+        doctor_slots = np.zeros((doctor_count, slot_count), dtype=bool)
+        for doctor_idx, slots in enumerate(problem.doctor_slots):
+            doctor_slots[doctor_idx, list(slots)] = True
+        period_ok = np.zeros((len(period_ids), slot_count), dtype=bool)
+        for slots, pid in period_ids.items():
+            period_ok[pid, list(slots)] = True
+        resource_caps = np.zeros((slot_count, acc.shape[1]), dtype=np.int64)
+        for slot_idx, caps in enumerate(problem.resource_caps):
+            for name, qty in caps.items():
+                resource_caps[slot_idx, resources[name]] = qty
+
+        return cls(
+            slot_options=slot_options,
+            slot_option_count=slot_option_count,
+            esp=np.array([esp_ids[p["esp"]] for p in patients], dtype=np.int64),
+            period=np.array([period_ids[ok] for ok in problem.patient_period_ok], dtype=np.int64),
+            online=np.array(problem.patient_online, dtype=bool),
+            acc=acc,
+            urg=np.array([p.get("urg", 1) for p in patients], dtype=np.int64),
+            candidates=candidates,
+            candidate_count=candidate_count,
+            candidate_mask=candidate_mask,
+            fallback=fallback,
+            fallback_count=fallback_count,
+            esp_ok=esp_ok,
+            doctor_online=np.array(problem.doctor_online, dtype=bool),
+            doctor_slots=doctor_slots,
+            doctor_key=np.array(problem.doctor_key, dtype=np.int64),
+            period_ok=period_ok,
+            capacity=np.array(problem.capacity, dtype=np.int64),
+            resource_caps=resource_caps,
+        )
+
+
+def _patient_cost(tables: BatchTables, p: np.ndarray, slot: np.ndarray, doctor: np.ndarray) -> np.ndarray:
+    return (
+        PESO_ESP * ~tables.esp_ok[tables.esp[p], doctor]
+        + PESO_ONLINE * (tables.online[p] & ~tables.doctor_online[doctor])
+        + PESO_DISP * ~tables.doctor_slots[doctor, slot]
+        + PESO_PERIODO * ~tables.period_ok[tables.period[p], slot]
+    )
+
+
+def _pick(rng: np.random.Generator, options: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Um elemento uniforme de cada linha de `options`, considerando so os `counts` primeiros."""
+    positions = (rng.random(len(counts)) * counts).astype(np.int64)
+    return np.take_along_axis(options, np.minimum(positions, options.shape[-1] - 1)[:, None], axis=1)[:, 0]
+
+
+def batch_restart(
+    tables: BatchTables,
+    max_iter: int,
+    seed: Optional[int],
+    batch_size: int = HILL_BATCH_SIZE,
+) -> Tuple[float, List[int]]:
+    """Um reinicio: a cada iteracao sorteia K movimentos, pontua todos de uma vez e aplica os que melhoram.
+
+    Entre os que melhoram, aplica em ordem de ganho os que nao dividem paciente nem balde (faixa ou
+    agenda de medico) com um ja aceito, para que o delta de cada um continue exato.
+    """
+    rng = np.random.default_rng(seed)
+    patient_count = len(tables.esp)
+    slot_count = tables.slot_options.shape[1]
+    everyone = np.arange(patient_count)
+    slot = _pick(rng, tables.slot_options, tables.slot_option_count)
+    has_candidate = tables.candidate_count[tables.esp, slot] > 0
+    doctor = np.where(
+        has_candidate,
+        _pick(rng, tables.candidates[tables.esp, slot], tables.candidate_count[tables.esp, slot]),
+        _pick(rng, tables.fallback[tables.esp], tables.fallback_count[tables.esp]),
+    )
+
+    slot_usage = np.bincount(slot, minlength=slot_count)
+    resource_usage = np.zeros_like(tables.resource_caps)
+    np.add.at(resource_usage, slot, tables.acc)
+    doctor_usage = np.bincount(tables.doctor_key[doctor] * slot_count + slot, minlength=len(tables.doctor_key) * slot_count)
+    cost = int(
+        _patient_cost(tables, everyone, slot, doctor).sum()
+        + PESO_OVER * np.maximum(slot_usage - tables.capacity, 0).sum()
+        + PESO_RECURSO * np.maximum(resource_usage - tables.resource_caps, 0).sum()
+        + PESO_OVER * np.maximum(doctor_usage - 1, 0).sum()
+    ) - float((tables.urg * (PESO_URGENCIA / 5)).sum())
+
+    for _ in range(max(1, max_iter)):
+        p = rng.integers(patient_count, size=batch_size)
+        slot_move = rng.random(batch_size) < 0.5
+        esp = tables.esp[p]
+        s0 = slot[p]
+        d0 = doctor[p]
+        s1 = np.where(slot_move, _pick(rng, tables.slot_options[p], tables.slot_option_count[p]), s0)
+        counts = tables.candidate_count[esp, s1]
+        picked = _pick(rng, tables.candidates[esp, s1], counts)
+        keep = (counts == 0) | (slot_move & tables.candidate_mask[esp, s1, d0])
+        d1 = np.where(keep, d0, picked)
+
+        delta = _patient_cost(tables, p, s1, d1) - _patient_cost(tables, p, s0, d0)
+        moved = s0 != s1
+        delta += PESO_OVER * moved * (
+            (slot_usage[s1] >= tables.capacity[s1]).astype(np.int64)
+            - (slot_usage[s0] - 1 >= tables.capacity[s0])
+        )
+        acc = tables.acc[p]
+        before0 = resource_usage[s0]
+        caps0 = tables.resource_caps[s0]
+        before1 = resource_usage[s1]
+        caps1 = tables.resource_caps[s1]
+        freed = np.maximum(before0 - caps0, 0) - np.maximum(before0 - acc - caps0, 0)
+        added = np.maximum(before1 + acc - caps1, 0) - np.maximum(before1 - caps1, 0)
+        delta += PESO_RECURSO * moved * (added - freed).sum(axis=1)
+        k0 = tables.doctor_key[d0] * slot_count + s0
+        k1 = tables.doctor_key[d1] * slot_count + s1
+        delta += PESO_OVER * (k0 != k1) * (
+            (doctor_usage[k1] >= 1).astype(np.int64) - (doctor_usage[k0] - 1 >= 1)
+        )
+
+        improving = np.flatnonzero(delta < 0)
+        if not len(improving):
+            continue
+        seen_patients = set()
+        seen_slots = set()
+        seen_keys = set()
+        for m in improving[np.argsort(delta[improving], kind="stable")].tolist():
+            patient = int(p[m])
+            slots_touched = {int(s0[m]), int(s1[m])} if moved[m] else set()
+            keys_touched = {int(k0[m]), int(k1[m])} if k0[m] != k1[m] else set()
+            if patient in seen_patients or slots_touched & seen_slots or keys_touched & seen_keys:
+                continue
+            seen_patients.add(patient)
+            seen_slots |= slots_touched
+            seen_keys |= keys_touched
+            if moved[m]:
+                slot_usage[s0[m]] -= 1
+                slot_usage[s1[m]] += 1
+                resource_usage[s0[m]] -= acc[m]
+                resource_usage[s1[m]] += acc[m]
+            doctor_usage[k0[m]] -= 1
+            doctor_usage[k1[m]] += 1
+            slot[patient] = s1[m]
+            doctor[patient] = d1[m]
+            cost += int(delta[m])
+
+    solution = np.empty(2 * patient_count, dtype=np.int64)
+    solution[0::2] = slot
+    solution[1::2] = doctor
+    return float(cost), solution.tolist()
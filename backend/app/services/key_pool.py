@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Collection, Dict, Iterable, Iterator, List, Mapping, Optional
+
+
+def _split_keys(raw: str) -> List[str]:
+    return [item.strip() for item in raw.replace("\n", ",").replace(";", ",").split(",") if item.strip()]
+
+
+def mask_key(key: str) -> str:
+    return f"...{key[-4:]}" if len(key) > 8 else "***"
+
+
+@dataclass
+class _KeyHealth:
+    successes: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    open_until: float = 0.0  # time.monotonic() ate quando a chave fica fora do rodizio
+    last_error: Optional[str] = None
+
+
+class KeyPool:
+    """Chaves de API lidas uma unica vez; cada chamada leva a chave com menos requisicoes em voo.
+
+    Empates sao resolvidos em rodizio a partir da chave seguinte a ultima usada. Cada falha abre o
+    circuito da chave por um backoff exponencial com jitter; vencido o prazo, uma unica requisicao
+    de teste (meio-aberto) decide se ela volta ao rodizio.
+    """
+
+    def __init__(
+        self,
+        keys: Iterable[str],
+        backoff_base: float = 1.0,
+        backoff_max: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.keys = tuple(dict.fromkeys(key.strip() for key in keys if key and key.strip()))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._clock = clock
+        self._in_flight = [0] * len(self.keys)
+        self._requests = [0] * len(self.keys)
+        self._health = [_KeyHealth() for _ in self.keys]
+        self._next = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, environ: Optional[Mapping[str, str]] = None) -> "KeyPool":
+        environ = os.environ if environ is None else environ
+        keys = _split_keys(environ.get("OPENROUTER_API_KEY") or "")
+        keys += _split_keys(environ.get("OPENROUTER_API_KEYS") or "")
+        return cls(
+            keys,
+            backoff_base=float(environ.get("LLM_BACKOFF_BASE_SECONDS") or 1.0),
+            backoff_max=float(environ.get("LLM_BACKOFF_MAX_SECONDS") or 60.0),
+        )
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def _available(self, idx: int, now: float) -> bool:
+        health = self._health[idx]
+        if health.consecutive_failures == 0:
+            return True
+        # Meio-aberto: passado o backoff, so uma requisicao de teste por vez.
+        return now >= health.open_until and self._in_flight[idx] == 0
+
+    def acquire(self, exclude: Collection[int] = ()) -> Optional[int]:
+        """Indice da chave saudavel menos ocupada, ou None se todas estiverem excluidas ou abertas."""
+        with self._lock:
+            now = self._clock()
+            best: Optional[int] = None
+            count = len(self.keys)
+            for offset in range(count):
+                idx = (self._next + offset) % count
+                if idx in exclude or not self._available(idx, now):
+                    continue
+                if best is None or self._in_flight[idx] < self._in_flight[best]:
+                    best = idx
+            if best is None:
+                return None
+            self._in_flight[best] += 1
+            self._requests[best] += 1
+            self._next = (best + 1) % count
+            return best
+
+    def release(self, idx: int) -> None:
+        with self._lock:
+            self._in_flight[idx] -= 1
+
+    def report_success(self, idx: int) -> None:
+        with self._lock:
+            health = self._health[idx]
+            health.successes += 1
+            health.consecutive_failures = 0
+            health.open_until = 0.0
+
+    def report_failure(self, idx: int, error: Optional[str] = None, retry_after: Optional[float] = None) -> float:
+        """Abre o circuito da chave; devolve o tempo de espera sorteado (segundos)."""
+        with self._lock:
+            health = self._health[idx]
+            health.failures += 1
+            health.consecutive_failures += 1
+            health.last_error = error
+            ceiling = min(self.backoff_max, self.backoff_base * 2 ** (health.consecutive_failures - 1))
+            delay = random.uniform(ceiling / 2, ceiling)
+            if retry_after is not None:
+                delay = max(delay, min(retry_after, self.backoff_max))
+            health.open_until = self._clock() + delay
+            return delay
+
+    def retry_in(self) -> Optional[float]:
+        """Segundos ate a proxima chave poder ser usada (0 se ha alguma livre; None sem chaves)."""
+        with self._lock:
+            if not self.keys:
+                return None
+            now = self._clock()
+            waits = []
+            for idx, health in enumerate(self._health):
+                if self._available(idx, now):
+                    return 0.0
+                # Chave em teste (meio-aberta e ocupada) nao tem prazo definido; conta como o backoff base.
+                waits.append(max(health.open_until - now, self.backoff_base if now >= health.open_until else 0.0))
+            return min(waits)
+
+    @contextmanager
+    def lease(self, exclude: Collection[int] = ()) -> Iterator[Optional[int]]:
+        idx = self.acquire(exclude)
+        try:
+            yield idx
+        finally:
+            if idx is not None:
+                self.release(idx)
+
+    def _state(self, idx: int, now: float) -> str:
+        health = self._health[idx]
+        if health.consecutive_failures == 0:
+            return "closed"
+        return "open" if now < health.open_until else "half_open"
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            now = self._clock()
+            return [
+                {
+                    "key": mask_key(key),
+                    "state": self._state(idx, now),
+                    "in_flight": self._in_flight[idx],
+                    "requests": self._requests[idx],
+                    "successes": health.successes,
+                    "failures": health.failures,
+                    "consecutive_failures": health.consecutive_failures,
+                    "retry_in": round(max(health.open_until - now, 0.0), 3),
+                    "last_error": health.last_error,
+                }
+                for idx, (key, health) in enumerate(zip(self.keys, self._health))
+            ]
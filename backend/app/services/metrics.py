@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import threading
+from bisect import bisect_left
+from typing import Any, Dict, Optional, Sequence
+
+
+DEFAULT_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+
+class Counter:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self) -> None:
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: int = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self) -> int:
+        return self.value
+
+
+class Histogram:
+    """Histograma de buckets fixos; quantis sao aproximados pelo limite superior do bucket."""
+
+    __slots__ = ("buckets", "counts", "count", "total", "min", "max", "_lock")
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS_MS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.total += value
+            self.min = value if self.min is None else min(self.min, value)
+            self.max = value if self.max is None else max(self.max, value)
+
+    def _quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for idx, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return self.buckets[idx] if idx < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            buckets = {f"le_{bound:g}": count for bound, count in zip(self.buckets, self.counts)}
+            buckets["le_inf"] = self.counts[-1]
+            return {
+                "count": self.count,
+                "sum": round(self.total, 3),
+                "avg": round(self.total / self.count, 3) if self.count else None,
+                "min": self.min,
+                "max": self.max,
+                "p50": self._quantile(0.50),
+                "p95": self._quantile(0.95),
+                "p99": self._quantile(0.99),
+                "buckets": buckets,
+            }
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._counters: Dict[str, Counter] = {}
+        self._histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str) -> Counter:
+        metric = self._counters.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._counters.setdefault(name, Counter())
+        return metric
+
+    def histogram(self, name: str, buckets: Sequence[float] = DEFAULT_BUCKETS_MS) -> Histogram:
+        metric = self._histograms.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._histograms.setdefault(name, Histogram(buckets))
+        return metric
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = dict(self._histograms)
+        return {
+            "counters": {name: metric.snapshot() for name, metric in sorted(counters.items())},
+            "histograms": {name: metric.snapshot() for name, metric in sorted(histograms.items())},
+        }
+
+
+registry = MetricsRegistry()
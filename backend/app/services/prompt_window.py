@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from dataclasses import dataclass
+from operator import attrgetter
+from typing import Any, Dict, Hashable, Iterable, Optional, Protocol, Sequence
+
+
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class ChatMessage(Protocol):
+    id: int
+    origin: str
+    content: str
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa local (~4 caracteres por token), sem depender do tokenizer do provedor."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def estimate_message_tokens(message: Dict[str, Any]) -> int:
+    total = MESSAGE_OVERHEAD_TOKENS + estimate_tokens(message.get("content") or "")
+    for call in message.get("tool_calls") or ():
+        function = call.get("function") or {}
+        total += estimate_tokens(function.get("name") or "") + estimate_tokens(function.get("arguments") or "")
+    return total
+
+
+@dataclass(frozen=True)
+class Summary:
+    covered_id: int  # id da ultima mensagem incorporada ao resumo
+    text: str
+
+
+@dataclass
+class WindowPlan:
+    start: int  # indice da primeira mensagem enviada literalmente
+    summary: Optional[Summary]  # resumo que cobre as mensagens antes de `start` (a menos de `pending`)
+    pending: Sequence[ChatMessage]  # mensagens que saem da janela e precisam entrar no resumo
+
+
+def extractive_summary(previous: Optional[str], messages: Iterable[ChatMessage], max_tokens: int) -> str:
+    """Resumo sem LLM: uma linha curta por mensagem, mantendo o trecho mais recente que couber."""
+    lines = [previous] if previous else []
+    for message in messages:
+        speaker = "Aurora" if message.origin == "bot" else "Paciente"
+        text = " ".join(message.content.split())
+        if len(text) > 200:
+            text = text[:197] + "..."
+        lines.append(f"{speaker}: {text}")
+    summary = "\n".join(lines)
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(summary) > max_chars:
+        summary = "..." + summary[-(max_chars - 3) :]
+    return summary
+
+
+class PromptWindow:
+    """Orcamento de tokens do prompt: mensagens recentes literais, antigas num resumo acumulado por sessao.
+
+    O resumo so e recalculado quando a janela desliza; ao deslizar, corta ate `low_watermark`
+    do orcamento para que os turnos seguintes voltem a reaproveitar o resumo em cache.
+    """
+
+    def __init__(
+        self,
+        budget_tokens: int,
+        summary_tokens: int,
+        max_sessions: int = 1000,
+        low_watermark: float = 0.75,
+    ) -> None:
+        self.budget_tokens = budget_tokens
+        self.summary_tokens = summary_tokens
+        self.max_sessions = max_sessions
+        self.low_watermark = low_watermark
+        self._summaries: "OrderedDict[Hashable, Summary]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._slides = 0
+        self._reuses = 0
+
+    def _cached(self, key: Optional[Hashable]) -> Optional[Summary]:
+        if key is None:
+            return None
+        with self._lock:
+            summary = self._summaries.get(key)
+            if summary is not None:
+                self._summaries.move_to_end(key)
+            return summary
+
+    def plan(self, key: Optional[Hashable], history: Sequence[ChatMessage], fixed_tokens: int) -> WindowPlan:
+        available = max(self.budget_tokens - fixed_tokens - self.summary_tokens, 0)
+        summary = self._cached(key)
+        start = 0
+        if summary is not None:
+            start = bisect_right(history, summary.covered_id, key=attrgetter("id"))
+            if start == 0:
+                # Sessao recriada (ids novos): o resumo em cache nao pertence a este historico.
+                summary = None
+        costs = [estimate_tokens(message.content) + MESSAGE_OVERHEAD_TOKENS for message in history[start:]]
+        if sum(costs) <= available:
+            if summary is not None:
+                self._reuses += 1
+            return WindowPlan(start, summary, ())
+        target = available * self.low_watermark
+        cut = len(costs) - 1  # a ultima mensagem (a do usuario) vai sempre literal
+        used = costs[cut]
+        while cut > 0 and used + costs[cut - 1] <= target:
+            cut -= 1
+            used += costs[cut]
+        self._slides += 1
+        return WindowPlan(start + cut, summary, history[start : start + cut])
+
+    def remember(self, key: Optional[Hashable], summary: Summary) -> None:
+        if key is None:
+            return
+        with self._lock:
+            current = self._summaries.get(key)
+            if current is not None and current.covered_id >= summary.covered_id:
+                return
+            self._summaries[key] = summary
+            self._summaries.move_to_end(key)
+            while len(self._summaries) > self.max_sessions:
+                self._summaries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "budget_tokens": self.budget_tokens,
+                "summary_tokens": self.summary_tokens,
+                "cached_summaries": len(self._summaries),
+                "slides": self._slides,
+                "reuses": self._reuses,
+            }
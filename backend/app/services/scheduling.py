@@ -1,12 +1,24 @@
 from __future__ import annotations
 
+import argparse
+import asyncio
+import functools
+import importlib.util
 import json
+import math
+import multiprocessing
 import os
 import random
 import sqlite3
-from collections import defaultdict
+import sys
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import date, datetime, timedelta
-from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from itertools import islice
+from typing import Any, Callable, Deque, Dict, FrozenSet, Generator, Iterable, List, NamedTuple, Optional, Sequence, Tuple, TypeVar
 
 
 especialidades = [
@@ -64,6 +76,8 @@ recursos_qtd = {
     "19-21": {"libras": 1, "braille": 1, "locomocao": 1, "cognitiva": 1},
 }
 
+ACC_BITS = {acc: 1 << idx for idx, acc in enumerate(acessibilidades)}
+
 capacidade = {"07-09": 5, "09-11": 8, "11-13": 6, "13-15": 7, "15-17": 6, "17-19": 5, "19-21": 5}
 
 PESO_PERIODO = 100
@@ -76,23 +90,123 @@ PESO_DISP = 200
 PESO_URGENCIA = 50
 MAX_ITER = 200
 RESTARTS = 10
+HILL_BATCH_SIZE = 64
+# Teto do lote do motor numpy: cada iteracao aloca arrays (K, recursos) e o laco de aceitacao e O(K).
+HILL_MAX_BATCH_SIZE = 4096
+COOLING_SCHEDULES = ("geometric", "linear")
+ANNEAL_DEFAULTS: Dict[str, Any] = {"temperature": 100.0, "min_temperature": 0.5, "cooling": "geometric"}
+TABU_DEFAULTS: Dict[str, Any] = {"tabu_tenure": 20, "neighborhood": 32}
 SEED = 42
 
 ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
 DEFAULT_DB = os.path.join(ROOT_DIR, "scheduling.db")
 DB_PATH = os.getenv("SCHEDULING_DB_PATH", DEFAULT_DB)
 
+DB_BUSY_TIMEOUT_MS = int(os.getenv("SCHEDULING_DB_BUSY_TIMEOUT_MS", "5000"))
+DB_CACHE_SIZE_KB = int(os.getenv("SCHEDULING_DB_CACHE_SIZE_KB", "8192"))
+DB_MMAP_SIZE = int(os.getenv("SCHEDULING_DB_MMAP_SIZE", str(64 * 1024 * 1024)))
+DB_STATEMENT_CACHE = 256
+AVAILABILITY_CACHE_SIZE = int(os.getenv("SCHEDULING_CACHE_SIZE", "4096"))
+DB_EXECUTOR_WORKERS = int(os.getenv("SCHEDULING_DB_WORKERS", "4"))
+OPTIMIZER_MAX_WORKERS = int(os.getenv("OPTIMIZER_MAX_WORKERS") or os.cpu_count() or 1)
+
+T = TypeVar("T")
+
+_local = threading.local()
+_open_conns: List[sqlite3.Connection] = []
+_open_conns_lock = threading.Lock()
+_conn_generation = 0
+
+
+def _open_conn(path: str) -> sqlite3.Connection:
+    con = sqlite3.connect(path, check_same_thread=False, cached_statements=DB_STATEMENT_CACHE)
+    con.execute(f"PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}")
+    con.execute("PRAGMA journal_mode = WAL")
+    con.execute("PRAGMA synchronous = NORMAL")
+    con.execute(f"PRAGMA cache_size = {-DB_CACHE_SIZE_KB}")
+    con.execute(f"PRAGMA mmap_size = {DB_MMAP_SIZE}")
+    con.execute("PRAGMA temp_store = MEMORY")
+    con.execute("PRAGMA foreign_keys = ON")
+    return con
+
+
+def get_conn() -> sqlite3.Connection:
+    """Conexao persistente da thread atual (WAL + cache de statements preparados)."""
+    con = getattr(_local, "con", None)
+    if con is not None and _local.path == DB_PATH and _local.generation == _conn_generation:
+        return con
+    con = _open_conn(DB_PATH)
+    if _schema_ready_path != DB_PATH:
+        _ensure_schema(con)
+    with _open_conns_lock:
+        _open_conns.append(con)
+        _local.generation = _conn_generation
+    _local.con = con
+    _local.path = DB_PATH
+    return con
+
+
+def close_all_conns() -> None:
+    global _conn_generation
+    with _open_conns_lock:
+        conns = list(_open_conns)
+        _open_conns.clear()
+        _conn_generation += 1
+    for con in conns:
+        try:
+            con.close()
+        except sqlite3.Error:
+            pass
 
-def get_conn():
-    return sqlite3.connect(DB_PATH, check_same_thread=False)
 
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
 
-def init_db() -> None:
-    with get_conn() as con:
-        cur = con.cursor()
-        cur.executescript(
-            """
-        PRAGMA foreign_keys = ON;
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="scheduling-db")
+    return _executor
+
+
+async def run_async(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Executa uma funcao sincrona de agendamento no pool dedicado, sem bloquear o event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(func, *args, **kwargs))
+
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    """Pool de processos do otimizador, unico e com OPTIMIZER_MAX_WORKERS processos."""
+    global _process_pool
+    if _process_pool is None:
+        with _executor_lock:
+            if _process_pool is None:
+                # spawn: o processo da API tem threads (uvicorn, pools), e fork copiaria locks no meio do uso.
+                _process_pool = ProcessPoolExecutor(
+                    max_workers=OPTIMIZER_MAX_WORKERS, mp_context=multiprocessing.get_context("spawn")
+                )
+    return _process_pool
+
+
+def shutdown_executor() -> None:
+    global _executor, _process_pool
+    with _executor_lock:
+        executor, _executor = _executor, None
+        pool, _process_pool = _process_pool, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+_SCHEMA_MIGRATIONS: List[str] = [
+    """
         CREATE TABLE IF NOT EXISTS patients (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             data TEXT NOT NULL,
@@ -147,85 +261,242 @@ def init_db() -> None:
             notes TEXT,
             FOREIGN KEY (patient_id) REFERENCES patients(id) ON DELETE CASCADE
         );
+        """,
+    """
+        CREATE INDEX IF NOT EXISTS idx_bookings_slot
+            ON bookings (data, faixa, doctor_name, patient_id);
+        CREATE INDEX IF NOT EXISTS idx_bookings_patient
+            ON bookings (patient_id);
+        CREATE INDEX IF NOT EXISTS idx_patient_access_patient
+            ON patient_access (patient_id, acc);
+        """,
+    """
+        CREATE TABLE IF NOT EXISTS slot_usage (
+            data TEXT NOT NULL,
+            faixa TEXT NOT NULL,
+            used INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (data, faixa)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS slot_resource_usage (
+            data TEXT NOT NULL,
+            faixa TEXT NOT NULL,
+            recurso TEXT NOT NULL,
+            used INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (data, faixa, recurso)
+        ) WITHOUT ROWID;
+        DELETE FROM slot_usage;
+        DELETE FROM slot_resource_usage;
+        INSERT INTO slot_usage (data, faixa, used)
+            SELECT data, faixa, COUNT(*) FROM bookings GROUP BY data, faixa;
+        INSERT INTO slot_resource_usage (data, faixa, recurso, used)
+            SELECT b.data, b.faixa, pa.acc, COUNT(*)
+              FROM bookings b
+              JOIN patient_access pa ON pa.patient_id = b.patient_id
+             GROUP BY b.data, b.faixa, pa.acc;
+        """,
+    """
+        ALTER TABLE patients ADD COLUMN acc_mask INTEGER NOT NULL DEFAULT 0;
+        ALTER TABLE bookings ADD COLUMN acc_mask INTEGER NOT NULL DEFAULT 0;
+        UPDATE patients SET acc_mask = COALESCE((
+            SELECT SUM(DISTINCT CASE pa.acc
+                WHEN 'libras' THEN 1
+                WHEN 'braille' THEN 2
+                WHEN 'locomocao' THEN 4
+                WHEN 'cognitiva' THEN 8
+                ELSE 0 END)
+              FROM patient_access pa
+             WHERE pa.patient_id = patients.id
+        ), 0);
+        UPDATE bookings SET acc_mask = COALESCE((SELECT p.acc_mask FROM patients p WHERE p.id = bookings.patient_id), 0);
+        DELETE FROM slot_resource_usage;
+        INSERT INTO slot_resource_usage (data, faixa, recurso, used)
+            SELECT data, faixa, 'libras', SUM((acc_mask & 1) != 0) FROM bookings GROUP BY data, faixa
+            UNION ALL
+            SELECT data, faixa, 'braille', SUM((acc_mask & 2) != 0) FROM bookings GROUP BY data, faixa
+            UNION ALL
+            SELECT data, faixa, 'locomocao', SUM((acc_mask & 4) != 0) FROM bookings GROUP BY data, faixa
+            UNION ALL
+            SELECT data, faixa, 'cognitiva', SUM((acc_mask & 8) != 0) FROM bookings GROUP BY data, faixa;
+        DELETE FROM slot_resource_usage WHERE used = 0;
+        """,
+    """
+        CREATE INDEX IF NOT EXISTS idx_bookings_data_id
+            ON bookings (data, id);
+        """,
+    # acc_mask (migracao 4) substituiu patient_access; nada mais le nem escreve a tabela.
+    """
+        DROP INDEX IF EXISTS idx_patient_access_patient;
+        DROP TABLE IF EXISTS patient_access;
+        """,
+]
+SCHEMA_VERSION = len(_SCHEMA_MIGRATIONS)
+
+
+_schema_ready_path: Optional[str] = None
+_schema_lock = threading.Lock()
+
+
+def _sql_statements(script: str) -> Iterable[str]:
+    stmt = ""
+    for piece in script.split(";"):
+        stmt += piece + ";"
+        if sqlite3.complete_statement(stmt):
+            if stmt.strip(" \n;"):
+                yield stmt.strip()
+            stmt = ""
+
+
+def init_db(con: Optional[sqlite3.Connection] = None) -> None:
+    """Aplica as migracoes pendentes e o seed estatico numa unica transacao."""
+    con = con or get_conn()
+    if con.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        return
+    cur = con.cursor()
+    try:
+        # BEGIN IMMEDIATE serializa workers que sobem juntos; a versao e relida ja com o lock.
+        cur.execute("BEGIN IMMEDIATE")
+        current = cur.execute("PRAGMA user_version").fetchone()[0]
+        for version in range(current + 1, SCHEMA_VERSION + 1):
+            for stmt in _sql_statements(_SCHEMA_MIGRATIONS[version - 1]):
+                cur.execute(stmt)
+            cur.execute(f"PRAGMA user_version = {version}")
+        seed_static_if_empty(cur)
+        con.commit()
+    except BaseException:
+        con.rollback()
+        raise
+
+
+def _ensure_schema(con: sqlite3.Connection) -> None:
+    global _schema_ready_path
+    with _schema_lock:
+        if _schema_ready_path == DB_PATH:
+            return
+        init_db(con)
+        _schema_ready_path = DB_PATH
+
+
+def ensure_schema() -> None:
+    """Garante o schema uma vez por processo; chamado no lifespan da API e pela CLI."""
+    if _schema_ready_path != DB_PATH:
+        _ensure_schema(get_conn())
+
+
+_SQL_CAPACITY_BASE = "SELECT capacidade FROM capacity WHERE faixa = ?"
+_SQL_CAPACITY_USED = "SELECT used FROM slot_usage WHERE data = ? AND faixa = ?"
+_SQL_DOCTOR_USED = "SELECT COUNT(*) FROM bookings WHERE doctor_name = ? AND data = ? AND faixa = ?"
+_SQL_RESOURCES_BASE = "SELECT recurso, qtd FROM resources WHERE faixa = ?"
+_SQL_RESOURCES_USED = "SELECT recurso, used FROM slot_resource_usage WHERE data = ? AND faixa = ?"
+_SQL_SLOT_USAGE_ADD = """
+        INSERT INTO slot_usage (data, faixa, used) VALUES (?, ?, ?)
+        ON CONFLICT (data, faixa) DO UPDATE SET used = used + excluded.used
         """
+_SQL_SLOT_RESOURCE_USAGE_ADD = """
+        INSERT INTO slot_resource_usage (data, faixa, recurso, used) VALUES (?, ?, ?, ?)
+        ON CONFLICT (data, faixa, recurso) DO UPDATE SET used = used + excluded.used
+        """
+_SQL_CAPACITY_USED_RANGE = "SELECT data, faixa, used FROM slot_usage WHERE data BETWEEN ? AND ?"
+_SQL_RESOURCES_USED_RANGE = "SELECT data, faixa, recurso, used FROM slot_resource_usage WHERE data BETWEEN ? AND ?"
+_SQL_DOCTORS_BUSY_RANGE = "SELECT DISTINCT data, faixa, doctor_name FROM bookings WHERE data BETWEEN ? AND ?"
+_SQL_SLOT_USAGE_FROM_BOOKINGS = "SELECT data, faixa, COUNT(*) FROM bookings GROUP BY data, faixa"
+_SQL_SLOT_RESOURCE_USAGE_FROM_BOOKINGS = "SELECT data, faixa, %s FROM bookings GROUP BY data, faixa" % ", ".join(
+    f"SUM((acc_mask & {bit}) != 0)" for bit in ACC_BITS.values()
+)
+
+def seed_static_if_empty(cur: sqlite3.Cursor) -> None:
+    cur.execute("SELECT COUNT(*) FROM capacity")
+    if cur.fetchone()[0] == 0:
+        cur.executemany(
+            "INSERT INTO capacity (faixa, capacidade) VALUES (?,?)",
+            [(f, capacidade[f]) for f in capacidade],
         )
-        con.commit()
+    cur.execute("SELECT COUNT(*) FROM resources")
+    if cur.fetchone()[0] == 0:
+        rows = []
+        for faixa, recursos in recursos_qtd.items():
+            for recurso, qtd in recursos.items():
+                rows.append((faixa, recurso, qtd))
+        cur.executemany("INSERT INTO resources (faixa, recurso, qtd) VALUES (?,?,?)", rows)
 
 
-def seed_static_if_empty() -> None:
-    with get_conn() as con:
-        cur = con.cursor()
-        cur.execute("SELECT COUNT(*) FROM capacity")
-        if cur.fetchone()[0] == 0:
-            cur.executemany(
-                "INSERT INTO capacity (faixa, capacidade) VALUES (?,?)",
-                [(f, capacidade[f]) for f in capacidade],
-            )
-        cur.execute("SELECT COUNT(*) FROM resources")
-        if cur.fetchone()[0] == 0:
-            rows = []
-            for faixa, recursos in recursos_qtd.items():
-                for recurso, qtd in recursos.items():
-                    rows.append((faixa, recurso, qtd))
-            cur.executemany("INSERT INTO resources (faixa, recurso, qtd) VALUES (?,?,?)", rows)
-        con.commit()
+def acc_to_mask(accessibility: Iterable[str]) -> int:
+    mask = 0
+    for acc in accessibility:
+        mask |= ACC_BITS.get(acc, 0)
+    return mask
 
 
-def add_patient(p: Dict[str, Any], tri: Optional[Dict[str, Any]] = None) -> int:
-    with get_conn() as con:
-        cur = con.cursor()
+def mask_to_acc(mask: int) -> List[str]:
+    return [acc for acc, bit in ACC_BITS.items() if mask & bit]
+
+
+def _insert_patient(cur: sqlite3.Cursor, p: Dict[str, Any], tri: Optional[Dict[str, Any]] = None) -> int:
+    cur.execute(
+        "INSERT INTO patients (data, esp, periodo, tipo, urg, acc_mask) VALUES (?,?,?,?,?,?)",
+        (p["data"], p["esp"], p["periodo"], p["tipo"], int(p["urg"]), acc_to_mask(p.get("acc") or [])),
+    )
+    pid = cur.lastrowid
+    if tri:
         cur.execute(
-            "INSERT INTO patients (data, esp, periodo, tipo, urg) VALUES (?,?,?,?,?)",
-            (p["data"], p["esp"], p["periodo"], p["tipo"], int(p["urg"])),
+            """
+        INSERT INTO triage (patient_id, age, sex, pain, temp, hr, rr, spo2, sbp, bleeding, consciousness,
+                            chest_pain, dyspnea, dehydration, comorb, pregnancy_wks, onset_hours, notes)
+        VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
+        """,
+            (
+                pid,
+                tri.get("age"),
+                tri.get("sex"),
+                tri.get("pain"),
+                tri.get("temp"),
+                tri.get("hr"),
+                tri.get("rr"),
+                tri.get("spo2"),
+                tri.get("sbp"),
+                tri.get("bleeding"),
+                tri.get("consciousness"),
+                int(tri.get("chest_pain", 0)),
+                int(tri.get("dyspnea", 0)),
+                int(tri.get("dehydration", 0)),
+                tri.get("comorb"),
+                tri.get("pregnancy_wks"),
+                tri.get("onset_hours"),
+                tri.get("notes"),
+            ),
         )
-        pid = cur.lastrowid
-        if p.get("acc"):
-            cur.executemany(
-                "INSERT INTO patient_access (patient_id, acc) VALUES (?,?)",
-                [(pid, a) for a in p["acc"]],
-            )
-        if tri:
-            cur.execute(
-                """
-            INSERT INTO triage (patient_id, age, sex, pain, temp, hr, rr, spo2, sbp, bleeding, consciousness,
-                                chest_pain, dyspnea, dehydration, comorb, pregnancy_wks, onset_hours, notes)
-            VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
-            """,
-                (
-                    pid,
-                    tri.get("age"),
-                    tri.get("sex"),
-                    tri.get("pain"),
-                    tri.get("temp"),
-                    tri.get("hr"),
-                    tri.get("rr"),
-                    tri.get("spo2"),
-                    tri.get("sbp"),
-                    tri.get("bleeding"),
-                    tri.get("consciousness"),
-                    int(tri.get("chest_pain", 0)),
-                    int(tri.get("dyspnea", 0)),
-                    int(tri.get("dehydration", 0)),
-                    tri.get("comorb"),
-                    tri.get("pregnancy_wks"),
-                    tri.get("onset_hours"),
-                    tri.get("notes"),
-                ),
-            )
+    return pid
+
+
+def add_patient(p: Dict[str, Any], tri: Optional[Dict[str, Any]] = None) -> int:
+    with get_conn() as con:
+        pid = _insert_patient(con.cursor(), p, tri)
         con.commit()
     return pid
 
 
-def list_bookings(date_str: Optional[str] = None, faixa: Optional[str] = None) -> List[Dict[str, Any]]:
-    query = """
+BOOKINGS_PAGE_SIZE = 100
+BOOKINGS_MAX_PAGE_SIZE = 500
+
+_SQL_BOOKINGS_SELECT = """
         SELECT b.id, b.patient_id, b.data, b.faixa, b.doctor_name, b.warnings, b.created_at,
                p.esp, p.periodo, p.tipo, p.urg,
-               COALESCE(GROUP_CONCAT(pa.acc, ','), '') AS acc_csv
+               b.acc_mask
           FROM bookings b
           JOIN patients p ON p.id = b.patient_id
-          LEFT JOIN patient_access pa ON pa.patient_id = p.id
          WHERE 1=1
     """
+
+
+def _bookings_query(
+    date_str: Optional[str] = None,
+    faixa: Optional[str] = None,
+    after_id: Optional[int] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    limit: Optional[int] = None,
+    after_date: Optional[str] = None,
+) -> Tuple[str, Tuple[Any, ...]]:
+    query = _SQL_BOOKINGS_SELECT
     params: List[Any] = []
     if date_str:
         query += " AND b.data = ?"
@@ -233,31 +504,167 @@ def list_bookings(date_str: Optional[str] = None, faixa: Optional[str] = None) -
     if faixa:
         query += " AND b.faixa = ?"
         params.append(faixa)
-    query += " GROUP BY b.id ORDER BY b.created_at DESC"
+    if date_from:
+        query += " AND b.data >= ?"
+        params.append(date_from)
+    if date_to:
+        query += " AND b.data <= ?"
+        params.append(date_to)
+    if after_id is not None:
+        # Cursor (data, id); sem after_date, a data sai do proprio agendamento (vazio se ele ja foi cancelado).
+        if after_date:
+            query += " AND (b.data, b.id) < (?, ?)"
+            params.extend((after_date, after_id))
+        else:
+            query += " AND (b.data, b.id) < ((SELECT data FROM bookings WHERE id = ?), ?)"
+            params.extend((after_id, after_id))
+    # idx_bookings_data_id entrega as linhas ja nesta ordem, com ou sem filtro de datas: nada de sort temporario.
+    query += " ORDER BY b.data DESC, b.id DESC"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    return query, tuple(params)
+
+
+HOT_QUERIES: Dict[str, Tuple[str, Tuple[Any, ...]]] = {
+    "capacity_base": (_SQL_CAPACITY_BASE, ("07-09",)),
+    "capacity_used": (_SQL_CAPACITY_USED, ("2000-01-01", "07-09")),
+    "doctor_used": (_SQL_DOCTOR_USED, ("", "2000-01-01", "07-09")),
+    "resources_base": (_SQL_RESOURCES_BASE, ("07-09",)),
+    "resources_used": (_SQL_RESOURCES_USED, ("2000-01-01", "07-09")),
+    "capacity_used_range": (_SQL_CAPACITY_USED_RANGE, ("2000-01-01", "2000-01-07")),
+    "resources_used_range": (_SQL_RESOURCES_USED_RANGE, ("2000-01-01", "2000-01-07")),
+    "doctors_busy_range": (_SQL_DOCTORS_BUSY_RANGE, ("2000-01-01", "2000-01-07")),
+    # Primeira pagina e seguintes da lista do frontend (date_from=hoje), alem de dia fixo e sem filtro.
+    "bookings_first_page": _bookings_query(date_from="2000-01-01", limit=BOOKINGS_PAGE_SIZE),
+    "bookings_next_page": _bookings_query(
+        date_from="2000-01-01", after_id=1, after_date="2000-01-07", limit=BOOKINGS_PAGE_SIZE
+    ),
+    "bookings_page_by_date": _bookings_query(date_str="2000-01-01", limit=BOOKINGS_PAGE_SIZE),
+    "bookings_next_page_unfiltered": _bookings_query(after_id=1, after_date="2000-01-07", limit=BOOKINGS_PAGE_SIZE),
+}
+
+
+def explain_hot_queries() -> Dict[str, List[str]]:
+    plans: Dict[str, List[str]] = {}
+    with get_conn() as con:
+        for name, (sql, params) in HOT_QUERIES.items():
+            rows = con.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+            plans[name] = [row[-1] for row in rows]
+    return plans
+
+
+def query_plan_regressions() -> Dict[str, List[str]]:
+    """Consultas quentes cujo plano caiu em SCAN (varredura completa) ou ordena em B-tree temporaria."""
+    return {
+        name: steps
+        for name, steps in explain_hot_queries().items()
+        if any(step.startswith("SCAN") or step.startswith("USE TEMP B-TREE") for step in steps)
+    }
+
+
+def _booking_from_row(row: Sequence[Any]) -> Dict[str, Any]:
+    return {
+        "booking_id": row[0],
+        "patient_id": row[1],
+        "date": row[2],
+        "slot": row[3],
+        "doctor_name": row[4],
+        "warnings": json.loads(row[5]) if row[5] else {},
+        "created_at": row[6],
+        "specialty": row[7],
+        "period": row[8],
+        "consultation_type": row[9],
+        "urgency": row[10],
+        "accessibility": mask_to_acc(row[11]),
+    }
+
+
+def list_bookings(
+    date_str: Optional[str] = None,
+    faixa: Optional[str] = None,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    after_date: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    query, params = _bookings_query(date_str, faixa, after_id, date_from, date_to, limit, after_date)
     with get_conn() as con:
         cur = con.cursor()
-        cur.execute(query, tuple(params))
-        rows = cur.fetchall()
-    bookings = []
-    for row in rows:
-        acc_list = [a for a in (row[11] or "").split(",") if a]
-        bookings.append(
-            {
-                "booking_id": row[0],
-                "patient_id": row[1],
-                "date": row[2],
-                "slot": row[3],
-                "doctor_name": row[4],
-                "warnings": json.loads(row[5]) if row[5] else {},
-                "created_at": row[6],
-                "specialty": row[7],
-                "period": row[8],
-                "consultation_type": row[9],
-                "urgency": row[10],
-                "accessibility": acc_list,
-            }
-        )
-    return bookings
+        cur.execute(query, params)
+        return [_booking_from_row(row) for row in cur]
+
+
+def iter_bookings(
+    date_str: Optional[str] = None,
+    faixa: Optional[str] = None,
+    after_id: Optional[int] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    batch_size: int = 200,
+    after_date: Optional[str] = None,
+) -> Iterable[List[Dict[str, Any]]]:
+    """Percorre os agendamentos em lotes, a medida que o SQLite produz as linhas."""
+    query, params = _bookings_query(date_str, faixa, after_id, date_from, date_to, after_date=after_date)
+    ensure_schema()
+    # Conexao propria: o gerador pode ser retomado por threads diferentes do pool.
+    con = _open_conn(DB_PATH)
+    try:
+        cur = con.execute(query, params)
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [_booking_from_row(row) for row in rows]
+    finally:
+        con.close()
+
+
+def _apply_slot_usage(cur: sqlite3.Cursor, date_str: str, faixa: str, accessibility: Iterable[str], delta: int) -> None:
+    cur.execute(_SQL_SLOT_USAGE_ADD, (date_str, faixa, delta))
+    cur.executemany(_SQL_SLOT_RESOURCE_USAGE_ADD, [(date_str, faixa, acc, delta) for acc in accessibility])
+
+
+def verify_slot_counters(repair: bool = False) -> Dict[str, Any]:
+    """Recalcula os contadores de ocupacao a partir de bookings e reporta divergencias."""
+    with get_conn() as con:
+        cur = con.cursor()
+        if repair:
+            cur.execute("BEGIN IMMEDIATE")
+        expected_slots = {(r[0], r[1]): r[2] for r in cur.execute(_SQL_SLOT_USAGE_FROM_BOOKINGS)}
+        expected_resources: Dict[Tuple[str, str, str], int] = {}
+        for row in cur.execute(_SQL_SLOT_RESOURCE_USAGE_FROM_BOOKINGS):
+            for recurso, used in zip(ACC_BITS, row[2:]):
+                if used:
+                    expected_resources[(row[0], row[1], recurso)] = used
+        stored_slots = {(r[0], r[1]): r[2] for r in cur.execute("SELECT data, faixa, used FROM slot_usage")}
+        stored_resources = {
+            (r[0], r[1], r[2]): r[3] for r in cur.execute("SELECT data, faixa, recurso, used FROM slot_resource_usage")
+        }
+        drift: List[Dict[str, Any]] = []
+        for key in sorted(set(expected_slots) | set(stored_slots)):
+            want, have = expected_slots.get(key, 0), stored_slots.get(key, 0)
+            if want != have:
+                drift.append({"date": key[0], "slot": key[1], "resource": None, "expected": want, "stored": have})
+        for key in sorted(set(expected_resources) | set(stored_resources)):
+            want, have = expected_resources.get(key, 0), stored_resources.get(key, 0)
+            if want != have:
+                drift.append({"date": key[0], "slot": key[1], "resource": key[2], "expected": want, "stored": have})
+        if repair:
+            cur.execute("DELETE FROM slot_usage")
+            cur.execute("DELETE FROM slot_resource_usage")
+            cur.executemany(
+                "INSERT INTO slot_usage (data, faixa, used) VALUES (?,?,?)",
+                [(k[0], k[1], v) for k, v in expected_slots.items()],
+            )
+            cur.executemany(
+                "INSERT INTO slot_resource_usage (data, faixa, recurso, used) VALUES (?,?,?,?)",
+                [(k[0], k[1], k[2], v) for k, v in expected_resources.items()],
+            )
+            con.commit()
+            availability_cache.invalidate()
+    return {"drift": drift, "repaired": repair}
 
 
 def bookings_on(date_str: str, faixa: str) -> List[Dict[str, Any]]:
@@ -269,7 +676,7 @@ def cancel_booking(booking_id: int) -> Dict[str, Any]:
         cur = con.cursor()
         cur.execute(
             """
-        SELECT b.id, b.patient_id, b.data, b.faixa, b.doctor_name, p.esp
+        SELECT b.id, b.patient_id, b.data, b.faixa, b.doctor_name, p.esp, b.acc_mask
           FROM bookings b
           JOIN patients p ON p.id = b.patient_id
          WHERE b.id = ?
@@ -280,7 +687,9 @@ def cancel_booking(booking_id: int) -> Dict[str, Any]:
         if not row:
             return {"cancelled": False, "reason": "Agendamento nao encontrado."}
         cur.execute("DELETE FROM bookings WHERE id = ?", (booking_id,))
+        _apply_slot_usage(cur, row[2], row[3], mask_to_acc(row[6]), -1)
         con.commit()
+    availability_cache.invalidate()
     return {
         "cancelled": True,
         "booking_id": row[0],
@@ -293,49 +702,15 @@ def cancel_booking(booking_id: int) -> Dict[str, Any]:
 
 
 def resources_left(date_str: str, faixa: str) -> Dict[str, int]:
-    with get_conn() as con:
-        cur = con.cursor()
-        cur.execute(
-            """
-        SELECT recurso, qtd FROM resources WHERE faixa = ?
-        """,
-            (faixa,),
-        )
-        recursos_base = {row[0]: row[1] for row in cur.fetchall()}
-        cur.execute(
-            """
-        SELECT pa.acc, COUNT(*) as used
-          FROM bookings b
-          JOIN patient_access pa ON pa.patient_id = b.patient_id
-         WHERE b.data = ? AND b.faixa = ?
-         GROUP BY pa.acc
-        """,
-            (date_str, faixa),
-        )
-        usados = {row[0]: row[1] for row in cur.fetchall()}
-    return {k: recursos_base.get(k, 0) - usados.get(k, 0) for k in recursos_base}
+    return dict(_slot_state(date_str, faixa)["resources_left"])
 
 
 def doctor_free_on(doctor_name: str, date_str: str, faixa: str) -> bool:
-    with get_conn() as con:
-        cur = con.cursor()
-        cur.execute(
-            "SELECT COUNT(*) FROM bookings WHERE doctor_name = ? AND data = ? AND faixa = ?",
-            (doctor_name, date_str, faixa),
-        )
-        used = cur.fetchone()[0]
-    return used == 0
+    return doctor_name not in _slot_state(date_str, faixa)["busy_doctors"]
 
 
 def capacity_left_on(date_str: str, faixa: str) -> int:
-    with get_conn() as con:
-        cur = con.cursor()
-        cur.execute("SELECT capacidade FROM capacity WHERE faixa = ?", (faixa,))
-        cap = cur.fetchone()
-        capacidade_total = cap[0] if cap else capacidade.get(faixa, 0)
-        cur.execute("SELECT COUNT(*) FROM bookings WHERE data = ? AND faixa = ?", (date_str, faixa))
-        used = cur.fetchone()[0]
-    return capacidade_total - used
+    return _slot_state(date_str, faixa)["capacity_left"]
 
 
 def available_doctors(esp: str, faixa: str, tipo: str) -> List[Dict[str, Any]]:
@@ -402,64 +777,209 @@ def _rng_from_seed(seed: Optional[int]):
     return random if seed is None else random.Random(seed)
 
 
-def _generate_hill_solution(
-    patients: Sequence[Dict[str, Any]],
-    slots: Sequence[str],
-    doctors: Sequence[Dict[str, Any]],
-    rng,
-) -> List[int]:
+@dataclass(frozen=True)
+class _HillProblem:
+    """Instancia imutavel do otimizador, montada uma vez por execucao e compartilhada pelos reinicios.
+
+    Guarda em indices tudo o que a solucao inicial, os vizinhos e o custo incremental consultam:
+    faixas por periodo, medicos candidatos por (especialidade, faixa), limites e requisitos.
+    """
+
+    patients: Tuple[Dict[str, Any], ...]
+    doctors: Tuple[Dict[str, Any], ...]
+    slots: Tuple[str, ...]
+    patient_slots: Tuple[Tuple[int, ...], ...]  # faixas sorteaveis: as do periodo preferido ou, sem elas, todas
+    patient_candidates: Tuple[Tuple[Tuple[int, ...], ...], ...]  # [paciente][faixa] -> medicos da esp. disponiveis
+    patient_fallback: Tuple[Tuple[int, ...], ...]  # medicos da especialidade (ou todos), para a solucao inicial
+    patient_period_ok: Tuple[FrozenSet[int], ...]
+    patient_esp_ok: Tuple[FrozenSet[int], ...]
+    patient_online: Tuple[bool, ...]
+    patient_acc: Tuple[Tuple[Tuple[str, int], ...], ...]  # requisitos de acessibilidade com multiplicidade
+    doctor_slots: Tuple[FrozenSet[int], ...]
+    doctor_online: Tuple[bool, ...]
+    doctor_key: Tuple[int, ...]  # medicos com o mesmo nome dividem a agenda
+    capacity: Tuple[int, ...]
+    resource_caps: Tuple[Dict[str, int], ...]
+
+    @classmethod
+    def build(
+        cls,
+        patients: Sequence[Dict[str, Any]],
+        doctors: Sequence[Dict[str, Any]],
+        slots: Sequence[str],
+        capacity_limits: Dict[str, int],
+        resource_limits: Dict[str, Dict[str, int]],
+    ) -> "_HillProblem":
+        slots = tuple(slots)
+        all_slots = tuple(range(len(slots)))
+        all_doctors = tuple(range(len(doctors)))
+        period_slots: Dict[Optional[str], Tuple[int, ...]] = {}
+        period_ok: Dict[Optional[str], FrozenSet[int]] = {}
+        for period in {patient["periodo"] for patient in patients}:
+            in_period = tuple(idx for idx, slot in enumerate(slots) if faixa_periodo.get(slot) == period)
+            period_slots[period] = in_period or all_slots
+            period_ok[period] = frozenset(in_period)
+        by_esp: Dict[str, Tuple[Tuple[Tuple[int, ...], ...], Tuple[int, ...], FrozenSet[int]]] = {}
+        for esp in {patient["esp"] for patient in patients}:
+            with_esp = tuple(idx for idx, doc in enumerate(doctors) if esp in doc["esp"])
+            per_slot = tuple(tuple(idx for idx in with_esp if slot in doctors[idx]["disp"]) for slot in slots)
+            by_esp[esp] = (per_slot, with_esp or all_doctors, frozenset(with_esp))
+        first_by_name: Dict[str, int] = {}
+        for idx, doc in enumerate(doctors):
+            first_by_name.setdefault(doc["nome"], idx)
+        acc_counts = []
+        for patient in patients:
+            counts: Dict[str, int] = {}
+            for req in patient.get("acc", []):
+                counts[req] = counts.get(req, 0) + 1
+            acc_counts.append(tuple(counts.items()))
+        return cls(
+            patients=tuple(patients),
+            doctors=tuple(doctors),
+            slots=slots,
+            patient_slots=tuple(period_slots[patient["periodo"]] for patient in patients),
+            patient_candidates=tuple(by_esp[patient["esp"]][0] for patient in patients),
+            patient_fallback=tuple(by_esp[patient["esp"]][1] for patient in patients),
+            patient_period_ok=tuple(period_ok[patient["periodo"]] for patient in patients),
+            patient_esp_ok=tuple(by_esp[patient["esp"]][2] for patient in patients),
+            patient_online=tuple(patient["tipo"] == "online" for patient in patients),
+            patient_acc=tuple(acc_counts),
+            doctor_slots=tuple(frozenset(idx for idx, slot in enumerate(slots) if slot in doc["disp"]) for doc in doctors),
+            doctor_online=tuple(bool(doc["online"]) for doc in doctors),
+            doctor_key=tuple(first_by_name[doc["nome"]] for doc in doctors),
+            capacity=tuple(max(0, capacity_limits.get(slot, capacidade.get(slot, 0))) for slot in slots),
+            resource_caps=tuple(
+                {name: max(0, qty) for name, qty in resource_limits.get(slot, {}).items()} for slot in slots
+            ),
+        )
+
+
+def _generate_hill_solution(problem: _HillProblem, rng) -> List[int]:
     solution: List[int] = []
-    slots_list = list(slots)
-    for patient in patients:
-        period_slots = [slot for slot in slots_list if faixa_periodo.get(slot) == patient["periodo"]]
-        chosen_slot = rng.choice(period_slots or slots_list)
-        slot_idx = slots_list.index(chosen_slot)
-        doctor_indices = [
-            idx for idx, doc in enumerate(doctors) if patient["esp"] in doc["esp"] and chosen_slot in doc["disp"]
-        ]
-        if not doctor_indices:
-            doctor_indices = [idx for idx, doc in enumerate(doctors) if patient["esp"] in doc["esp"]]
-        if not doctor_indices:
-            doctor_indices = list(range(len(doctors)))
-        doctor_idx = rng.choice(doctor_indices)
+    for idx in range(len(problem.patients)):
+        slot_idx = rng.choice(problem.patient_slots[idx])
+        doctor_idx = rng.choice(problem.patient_candidates[idx][slot_idx] or problem.patient_fallback[idx])
         solution.extend([slot_idx, doctor_idx])
     return solution
 
 
-def _generate_hill_neighbor(
-    solution: Sequence[int],
-    patients: Sequence[Dict[str, Any]],
-    doctors: Sequence[Dict[str, Any]],
-    slots: Sequence[str],
-    rng,
-) -> List[int]:
+def _propose_hill_move(solution: Sequence[int], problem: _HillProblem, rng) -> Optional[Tuple[int, int, int]]:
+    """Vizinho como movimento (paciente, faixa, medico), sem copiar a solucao."""
     if not solution:
-        return list(solution)
-    neighbor = list(solution)
+        return None
     index = rng.randrange(len(solution))
     patient_idx = index // 2
-    slots_list = list(slots)
+    slot_idx = solution[2 * patient_idx]
+    doctor_idx = solution[2 * patient_idx + 1]
     if index % 2 == 0:
-        period_slots = [slot for slot in slots_list if faixa_periodo.get(slot) == patients[patient_idx]["periodo"]]
-        new_slot = rng.choice(period_slots or slots_list)
-        neighbor[index] = slots_list.index(new_slot)
-        current_doctor_idx = neighbor[2 * patient_idx + 1]
-        doctor = doctors[current_doctor_idx]
-        if (patients[patient_idx]["esp"] not in doctor["esp"]) or (new_slot not in doctor["disp"]):
-            candidates = [
-                idx for idx, info in enumerate(doctors) if patients[patient_idx]["esp"] in info["esp"] and new_slot in info["disp"]
-            ]
-            if candidates:
-                neighbor[2 * patient_idx + 1] = rng.choice(candidates)
+        slot_idx = rng.choice(problem.patient_slots[patient_idx])
+        candidates = problem.patient_candidates[patient_idx][slot_idx]
+        # O medico atual so e trocado se nao atende a especialidade na nova faixa.
+        if candidates and doctor_idx not in candidates:
+            doctor_idx = rng.choice(candidates)
     else:
-        current_slot = slots_list[neighbor[2 * patient_idx]]
-        candidates = [
-            idx for idx, info in enumerate(doctors)
-            if patients[patient_idx]["esp"] in info["esp"] and current_slot in info["disp"]
-        ]
+        candidates = problem.patient_candidates[patient_idx][slot_idx]
         if candidates:
-            neighbor[index] = rng.choice(candidates)
-    return neighbor
+            doctor_idx = rng.choice(candidates)
+    return patient_idx, slot_idx, doctor_idx
+
+
+class _HillState:
+    """Solucao corrente com os contadores de ocupacao, para avaliar a troca de um gene em O(1).
+
+    O custo e o mesmo de `_calc_hill_cost`: cada penalidade de capacidade, recurso ou conflito de
+    medico depende so da contagem do seu balde, `max(0, contagem - limite)`.
+    """
+
+    __slots__ = ("problem", "solution", "cost", "_slot_usage", "_res_usage", "_doctor_usage")
+
+    def __init__(self, solution: Sequence[int], problem: _HillProblem) -> None:
+        self.problem = problem
+        self.solution = list(solution)
+        slot_count = len(problem.slots)
+        self._slot_usage = [0] * slot_count
+        self._res_usage: List[Dict[str, int]] = [defaultdict(int) for _ in range(slot_count)]
+        self._doctor_usage = [0] * (len(problem.doctors) * slot_count)
+        cost = 0.0
+        for idx, patient in enumerate(problem.patients):
+            slot_idx = self.solution[2 * idx]
+            doctor_idx = self.solution[2 * idx + 1]
+            cost += self._patient_cost(idx, slot_idx, doctor_idx) - patient.get("urg", 1) * (PESO_URGENCIA / 5)
+            cost += self._add(idx, slot_idx, doctor_idx)
+        self.cost = cost
+
+    def _patient_cost(self, idx: int, slot_idx: int, doctor_idx: int) -> float:
+        problem = self.problem
+        cost = 0
+        if doctor_idx not in problem.patient_esp_ok[idx]:
+            cost += PESO_ESP
+        if problem.patient_online[idx] and not problem.doctor_online[doctor_idx]:
+            cost += PESO_ONLINE
+        if slot_idx not in problem.doctor_slots[doctor_idx]:
+            cost += PESO_DISP
+        if slot_idx not in problem.patient_period_ok[idx]:
+            cost += PESO_PERIODO
+        return cost
+
+    def _add(self, idx: int, slot_idx: int, doctor_idx: int) -> float:
+        """Registra o paciente na faixa/medico e devolve o acrescimo de penalidade."""
+        problem = self.problem
+        cost = 0
+        if self._slot_usage[slot_idx] >= problem.capacity[slot_idx]:
+            cost += PESO_OVER
+        self._slot_usage[slot_idx] += 1
+        usage = self._res_usage[slot_idx]
+        limits = problem.resource_caps[slot_idx]
+        for req, count in problem.patient_acc[idx]:
+            limit = limits.get(req, 0)
+            before = usage[req]
+            cost += PESO_RECURSO * (max(0, before + count - limit) - max(0, before - limit))
+            usage[req] = before + count
+        key = problem.doctor_key[doctor_idx] * len(problem.slots) + slot_idx
+        if self._doctor_usage[key] >= 1:
+            cost += PESO_OVER
+        self._doctor_usage[key] += 1
+        return cost
+
+    def _remove(self, idx: int, slot_idx: int, doctor_idx: int) -> float:
+        """Retira o paciente da faixa/medico e devolve a penalidade que deixa de existir."""
+        problem = self.problem
+        cost = 0
+        self._slot_usage[slot_idx] -= 1
+        if self._slot_usage[slot_idx] >= problem.capacity[slot_idx]:
+            cost += PESO_OVER
+        usage = self._res_usage[slot_idx]
+        limits = problem.resource_caps[slot_idx]
+        for req, count in problem.patient_acc[idx]:
+            limit = limits.get(req, 0)
+            before = usage[req]
+            cost += PESO_RECURSO * (max(0, before - limit) - max(0, before - count - limit))
+            usage[req] = before - count
+        key = problem.doctor_key[doctor_idx] * len(problem.slots) + slot_idx
+        self._doctor_usage[key] -= 1
+        if self._doctor_usage[key] >= 1:
+            cost += PESO_OVER
+        return cost
+
+    def delta(self, idx: int, slot_idx: int, doctor_idx: int) -> float:
+        """Variacao de custo ao mover o paciente `idx`; os contadores ficam como estavam."""
+        old_slot = self.solution[2 * idx]
+        old_doctor = self.solution[2 * idx + 1]
+        if old_slot == slot_idx and old_doctor == doctor_idx:
+            return 0.0
+        delta = self._patient_cost(idx, slot_idx, doctor_idx) - self._patient_cost(idx, old_slot, old_doctor)
+        delta -= self._remove(idx, old_slot, old_doctor)
+        delta += self._add(idx, slot_idx, doctor_idx)
+        self._remove(idx, slot_idx, doctor_idx)
+        self._add(idx, old_slot, old_doctor)
+        return delta
+
+    def apply(self, idx: int, slot_idx: int, doctor_idx: int, delta: float) -> None:
+        self._remove(idx, self.solution[2 * idx], self.solution[2 * idx + 1])
+        self._add(idx, slot_idx, doctor_idx)
+        self.solution[2 * idx] = slot_idx
+        self.solution[2 * idx + 1] = doctor_idx
+        self.cost += delta
 
 
 def _calc_hill_cost(
@@ -517,36 +1037,235 @@ def _calc_hill_cost(
     return cost, allocations, resources_state, remaining_capacity
 
 
-def _hill_climb_once(
-    patients: Sequence[Dict[str, Any]],
-    doctors: Sequence[Dict[str, Any]],
-    slots: Sequence[str],
-    capacity_limits: Dict[str, int],
-    resource_limits: Dict[str, Dict[str, int]],
-    max_iter: int = MAX_ITER,
-    seed: Optional[int] = None,
-) -> Tuple[List[int], float, Dict[int, Dict[str, str]], Dict[str, Dict[str, int]], Dict[str, int]]:
-    if not patients:
-        return [], 0.0, {}, {slot: resource_limits.get(slot, {}).copy() for slot in slots}, capacity_limits.copy()
+def _hill_search(problem: _HillProblem, max_iter: int = MAX_ITER, seed: Optional[int] = None) -> _HillState:
     rng = _rng_from_seed(seed)
-    solution = _generate_hill_solution(patients, slots, doctors, rng)
-    best_cost, allocations, resources_state, remaining_capacity = _calc_hill_cost(
-        solution, patients, doctors, slots, capacity_limits, resource_limits
-    )
+    state = _HillState(_generate_hill_solution(problem, rng), problem)
     for _ in range(max(1, max_iter)):
-        neighbor = _generate_hill_neighbor(solution, patients, doctors, slots, rng)
-        neigh_cost, neigh_alloc, neigh_res, neigh_cap = _calc_hill_cost(
-            neighbor, patients, doctors, slots, capacity_limits, resource_limits
-        )
-        if neigh_cost < best_cost:
-            solution, best_cost, allocations, resources_state, remaining_capacity = (
-                neighbor,
-                neigh_cost,
-                neigh_alloc,
-                neigh_res,
-                neigh_cap,
-            )
-    return solution, best_cost, allocations, resources_state, remaining_capacity
+        move = _propose_hill_move(state.solution, problem, rng)
+        if move is None:
+            continue
+        delta = state.delta(*move)
+        if delta < 0:
+            state.apply(*move, delta)
+    return state
+
+
+def _revert(state: _HillState, undo: List[Tuple[int, int, int]]) -> None:
+    """Desfaz, do fim para o inicio, os movimentos registrados como (paciente, faixa, medico) anteriores."""
+    for idx, slot_idx, doctor_idx in reversed(undo):
+        state.apply(idx, slot_idx, doctor_idx, state.delta(idx, slot_idx, doctor_idx))
+    undo.clear()
+
+
+def _hill_restart(
+    problem: _HillProblem,
+    max_iter: int,
+    seed: Optional[int],
+    options: Optional[Dict[str, Any]] = None,
+) -> Tuple[float, List[int]]:
+    """Um reinicio completo; funcao de modulo para poder rodar num processo do pool."""
+    state = _hill_search(problem, max_iter=max_iter, seed=seed)
+    return state.cost, state.solution
+
+
+def _anneal_restart(
+    problem: _HillProblem,
+    max_iter: int,
+    seed: Optional[int],
+    options: Optional[Dict[str, Any]] = None,
+) -> Tuple[float, List[int]]:
+    """Recozimento simulado: aceita piora com probabilidade exp(-delta/T), com T caindo ate `min_temperature`.
+
+    Devolve a melhor solucao visitada, nao a ultima.
+    """
+    options = {**ANNEAL_DEFAULTS, **(options or {})}
+    rng = _rng_from_seed(seed)
+    state = _HillState(_generate_hill_solution(problem, rng), problem)
+    iterations = max(1, max_iter)
+    start = options["temperature"]
+    end = min(options["min_temperature"], start)
+    ratio = (end / start) ** (1 / max(1, iterations - 1))
+    temperature = start
+    best_cost = state.cost
+    undo: List[Tuple[int, int, int]] = []  # movimentos desde o melhor custo, para voltar a ele no fim
+    for step in range(iterations):
+        move = _propose_hill_move(state.solution, problem, rng)
+        if move is None:
+            break
+        delta = state.delta(*move)
+        if delta <= 0 or rng.random() < math.exp(-delta / temperature):
+            idx = move[0]
+            undo.append((idx, state.solution[2 * idx], state.solution[2 * idx + 1]))
+            state.apply(*move, delta)
+            if state.cost < best_cost:
+                best_cost = state.cost
+                undo.clear()
+        if options["cooling"] == "linear":
+            temperature = start + (end - start) * (step + 1) / iterations
+        else:
+            temperature *= ratio
+    _revert(state, undo)
+    return state.cost, state.solution
+
+
+def _tabu_restart(
+    problem: _HillProblem,
+    max_iter: int,
+    seed: Optional[int],
+    options: Optional[Dict[str, Any]] = None,
+) -> Tuple[float, List[int]]:
+    """Busca tabu: a cada iteracao aplica o melhor de `neighborhood` vizinhos sorteados, mesmo que piore.
+
+    Devolver um paciente a alocacao que acabou de deixar fica proibido por `tabu_tenure` iteracoes, salvo
+    quando o movimento supera o melhor custo ja visto (aspiracao).
+    """
+    options = {**TABU_DEFAULTS, **(options or {})}
+    rng = _rng_from_seed(seed)
+    state = _HillState(_generate_hill_solution(problem, rng), problem)
+    tenure = options["tabu_tenure"]
+    tabu: Dict[Tuple[int, int, int], int] = {}  # (paciente, faixa, medico) -> ultima iteracao proibida
+    best_cost = state.cost
+    undo: List[Tuple[int, int, int]] = []
+    for step in range(max(1, max_iter)):
+        chosen: Optional[Tuple[int, int, int]] = None
+        chosen_delta = float("inf")
+        for _ in range(options["neighborhood"]):
+            move = _propose_hill_move(state.solution, problem, rng)
+            if move is None:
+                break
+            idx, slot_idx, doctor_idx = move
+            if slot_idx == state.solution[2 * idx] and doctor_idx == state.solution[2 * idx + 1]:
+                continue
+            delta = state.delta(*move)
+            if tabu.get(move, -1) >= step and state.cost + delta >= best_cost:
+                continue
+            if delta < chosen_delta:
+                chosen, chosen_delta = move, delta
+        if chosen is None:
+            continue
+        idx = chosen[0]
+        previous = (idx, state.solution[2 * idx], state.solution[2 * idx + 1])
+        tabu[previous] = step + tenure
+        undo.append(previous)
+        state.apply(*chosen, chosen_delta)
+        if state.cost < best_cost:
+            best_cost = state.cost
+            undo.clear()
+        if step % max(1, tenure) == 0:
+            tabu = {move: until for move, until in tabu.items() if until >= step}
+    _revert(state, undo)
+    return state.cost, state.solution
+
+
+def _numpy_engine():
+    """Motor vetorizado, importado sob demanda; None se o numpy (extra `optimizer`) nao estiver instalado."""
+    try:
+        from . import hill_numpy
+    except ImportError:
+        return None
+    return hill_numpy
+
+
+def _numpy_prepare(problem: _HillProblem) -> Any:
+    return _numpy_engine().BatchTables.build(problem)
+
+
+def _numpy_restart(
+    tables: Any,
+    max_iter: int,
+    seed: Optional[int],
+    options: Optional[Dict[str, Any]] = None,
+) -> Tuple[float, List[int]]:
+    batch_size = min(max(1, (options or {}).get("batch_size", HILL_BATCH_SIZE)), HILL_MAX_BATCH_SIZE)
+    return _numpy_engine().batch_restart(tables, max_iter, seed, batch_size)
+
+
+class SearchEngine(NamedTuple):
+    """Estrategia de busca do otimizador.
+
+    `prepare` roda uma vez por execucao; `restart(preparado, max_iter, seed, options)` roda por semente,
+    possivelmente em outro processo, e devolve (custo, solucao). `options` lista as opcoes aceitas e
+    seus valores padrao.
+    """
+
+    name: str
+    prepare: Callable[[_HillProblem], Any]
+    restart: Callable[[Any, int, Optional[int], Dict[str, Any]], Tuple[float, List[int]]]
+    options: Dict[str, Any]
+    requires: Optional[str] = None  # modulo opcional necessario
+
+
+def _same_problem(problem: _HillProblem) -> _HillProblem:
+    return problem
+
+
+SEARCH_ENGINES: Dict[str, SearchEngine] = {
+    engine.name: engine
+    for engine in (
+        SearchEngine("python", _same_problem, _hill_restart, {}),
+        SearchEngine("annealing", _same_problem, _anneal_restart, ANNEAL_DEFAULTS),
+        SearchEngine("tabu", _same_problem, _tabu_restart, TABU_DEFAULTS),
+        SearchEngine("numpy", _numpy_prepare, _numpy_restart, {"batch_size": HILL_BATCH_SIZE}, requires="numpy"),
+    )
+}
+
+
+def _engine_available(engine: SearchEngine) -> bool:
+    return engine.requires is None or importlib.util.find_spec(engine.requires) is not None
+
+
+def _engine_options(engine: SearchEngine, payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Opcoes do motor lidas do payload, com o tipo do valor padrao; ausentes ou nao numericas ficam no padrao.
+
+    Levanta ValueError para valores que nao podem ser usados (NaN/infinito, resfriamento ou lote fora da faixa).
+    """
+    options: Dict[str, Any] = {}
+    for name, default in engine.options.items():
+        raw = payload.get(name)
+        if raw is not None and not isinstance(default, str):
+            try:
+                finite = math.isfinite(float(raw))
+            except (TypeError, ValueError):
+                finite = True
+            if not finite:
+                raise ValueError(f"Opcao '{name}' invalida: use um numero finito.")
+        try:
+            value = default if raw is None else type(default)(raw)
+        except (TypeError, ValueError):
+            value = default
+        if isinstance(value, str):
+            value = value.strip().lower()
+        elif value <= 0:
+            value = default
+        options[name] = value
+    if options.get("cooling", COOLING_SCHEDULES[0]) not in COOLING_SCHEDULES:
+        raise ValueError(f"Resfriamento invalido. Use um de: {', '.join(COOLING_SCHEDULES)}.")
+    if options.get("batch_size", HILL_BATCH_SIZE) > HILL_MAX_BATCH_SIZE:
+        raise ValueError(f"batch_size deve estar entre 1 e {HILL_MAX_BATCH_SIZE}.")
+    return options
+
+
+def _parallel_restarts(
+    workers: int,
+    restart: Callable[..., Tuple[float, List[int]]],
+    tasks: Sequence[Tuple[Any, ...]],
+) -> Generator[Tuple[float, List[int]], None, None]:
+    """Resultados na ordem dos reinicios, com no maximo `workers` deles no pool compartilhado por vez.
+
+    Ao encerrar o iterador (alvo atingido), cancela os que ainda estao na janela.
+    """
+    pool = _get_process_pool()
+    queued = iter(tasks)
+    window: Deque[Future] = deque(pool.submit(restart, *task) for task in islice(queued, workers))
+    try:
+        while window:
+            result = window.popleft().result()
+            for task in islice(queued, 1):
+                window.append(pool.submit(restart, *task))
+            yield result
+    finally:
+        for future in window:
+            future.cancel()
 
 
 def _hill_climb_multi(
@@ -558,31 +1277,50 @@ def _hill_climb_multi(
     max_iter: int = MAX_ITER,
     restarts: int = RESTARTS,
     base_seed: Optional[int] = SEED,
-) -> Tuple[List[int], float, Dict[int, Dict[str, str]], Dict[str, Dict[str, int]], Dict[str, int]]:
-    best_solution: List[int] = []
-    best_cost = float("inf")
-    best_alloc: Dict[int, Dict[str, str]] = {}
-    best_resources: Dict[str, Dict[str, int]] = {slot: resource_limits.get(slot, {}).copy() for slot in slots}
-    best_capacity = capacity_limits.copy()
+    workers: int = 1,
+    target_cost: Optional[float] = None,
+    engine: str = "python",
+    engine_options: Optional[Dict[str, Any]] = None,
+) -> Tuple[List[int], float, Dict[int, Dict[str, str]], Dict[str, Dict[str, int]], Dict[str, int], int]:
+    """Reinicios com sementes `base_seed + i`, consumidos na ordem de `i` (mesmo resultado com qualquer `workers`).
+
+    Com `target_cost`, para no primeiro reinicio (em ordem) que atinge o alvo. Devolve tambem quantos rodaram.
+    `engine` escolhe a estrategia em `SEARCH_ENGINES`; `engine_options` vai para cada reinicio.
+    """
+    if not patients:
+        return [], 0.0, {}, {slot: resource_limits.get(slot, {}).copy() for slot in slots}, capacity_limits.copy(), 0
     total_restarts = max(1, restarts)
-    for offset in range(total_restarts):
-        seed = None if base_seed is None else base_seed + offset
-        sol, cost, alloc, resources_state, cap_state = _hill_climb_once(
-            patients,
-            doctors,
-            slots,
-            capacity_limits,
-            resource_limits,
-            max_iter=max_iter,
-            seed=seed,
-        )
-        if cost < best_cost:
-            best_solution = sol
-            best_cost = cost
-            best_alloc = alloc
-            best_resources = {slot: vals.copy() for slot, vals in resources_state.items()}
-            best_capacity = cap_state.copy()
-    return best_solution, best_cost, best_alloc, best_resources, best_capacity
+    problem = _HillProblem.build(patients, doctors, slots, capacity_limits, resource_limits)
+    seeds = [None if base_seed is None else base_seed + offset for offset in range(total_restarts)]
+    search = SEARCH_ENGINES[engine]
+    if not _engine_available(search):
+        raise RuntimeError(f"O motor '{engine}' requer o pacote {search.requires}.")
+    prepared = search.prepare(problem)
+    restart = search.restart
+    tasks = [(prepared, max_iter, seed, engine_options or {}) for seed in seeds]
+    workers = max(1, min(workers, total_restarts, OPTIMIZER_MAX_WORKERS))
+    results: Generator[Tuple[float, List[int]], None, None]
+    if workers > 1:
+        results = _parallel_restarts(workers, restart, tasks)
+    else:
+        results = (restart(*task) for task in tasks)
+    best_cost = float("inf")
+    best_solution: List[int] = []
+    runs = 0
+    try:
+        for cost, solution in results:
+            runs += 1
+            if cost < best_cost:
+                best_cost, best_solution = cost, solution
+            if target_cost is not None and best_cost <= target_cost:
+                break
+    finally:
+        results.close()
+    # Avisos por paciente e sobras de capacidade/recursos so para a solucao vencedora.
+    cost, allocations, resources_state, remaining_capacity = _calc_hill_cost(
+        best_solution, patients, doctors, slots, capacity_limits, resource_limits
+    )
+    return best_solution, cost, allocations, resources_state, remaining_capacity, runs
 
 
 def _prepare_hill_patients(
@@ -717,12 +1455,9 @@ def patient_access_map(patient_id: int) -> Dict[str, Any]:
         cur = con.cursor()
         cur.execute(
             """
-        SELECT p.id, p.data, p.esp, p.periodo, p.tipo, p.urg,
-               COALESCE(GROUP_CONCAT(pa.acc, ','), '') AS acc_csv
+        SELECT p.id, p.data, p.esp, p.periodo, p.tipo, p.urg, p.acc_mask
           FROM patients p
-          LEFT JOIN patient_access pa ON pa.patient_id = p.id
          WHERE p.id = ?
-         GROUP BY p.id
         """,
             (patient_id,),
         )
@@ -736,10 +1471,38 @@ def patient_access_map(patient_id: int) -> Dict[str, Any]:
         "period": row[3],
         "consultation_type": row[4],
         "urgency": row[5],
-        "accessibility": [a for a in (row[6] or "").split(",") if a],
+        "accessibility": mask_to_acc(row[6]),
     }
 
 
+def _booking_conflict(
+    cur: sqlite3.Cursor,
+    slot_date: str,
+    slot: str,
+    accessibility: Sequence[str],
+    doctor_name: str,
+) -> Optional[Dict[str, Any]]:
+    cur.execute(_SQL_CAPACITY_BASE, (slot,))
+    cap = cur.fetchone()
+    capacidade_total = cap[0] if cap else capacidade.get(slot, 0)
+    cur.execute(_SQL_CAPACITY_USED, (slot_date, slot))
+    row = cur.fetchone()
+    if capacidade_total - (row[0] if row else 0) <= 0:
+        return {"conflict": "capacity", "reason": f"Sem vagas em {slot_date} na faixa {slot}."}
+    cur.execute(_SQL_DOCTOR_USED, (doctor_name, slot_date, slot))
+    if cur.fetchone()[0] > 0:
+        return {"conflict": "doctor", "reason": f"{doctor_name} ja possui atendimento em {slot_date} na faixa {slot}."}
+    if accessibility:
+        cur.execute(_SQL_RESOURCES_BASE, (slot,))
+        recursos_base = {r[0]: r[1] for r in cur.fetchall()}
+        cur.execute(_SQL_RESOURCES_USED, (slot_date, slot))
+        usados = {r[0]: r[1] for r in cur.fetchall()}
+        faltantes = [acc for acc in accessibility if recursos_base.get(acc, 0) - usados.get(acc, 0) <= 0]
+        if faltantes:
+            return {"conflict": "resources", "reason": f"Recursos indisponiveis para: {', '.join(faltantes)}"}
+    return None
+
+
 def book_appointment(
     specialty: str,
     slot_date: str,
@@ -750,34 +1513,39 @@ def book_appointment(
     doctor_name: str,
     triage: Optional[Dict[str, Any]] = None,
 ) -> Dict[str, Any]:
+    acc_mask = acc_to_mask(accessibility)
+    accessibility = mask_to_acc(acc_mask)
     patient_payload = {
         "data": slot_date,
         "esp": specialty,
         "periodo": faixa_periodo.get(slot, "manha"),
         "tipo": consultation_type,
         "urg": urgency,
-        "acc": list(accessibility),
+        "acc": accessibility,
     }
-    patient_id = add_patient(patient_payload, tri=triage)
     warnings = {}
     if slot in faixas_pico:
         warnings["slot"] = "Faixa de pico; pode haver tempo de espera adicional."
-    if accessibility:
-        left = resources_left(slot_date, slot)
-        faltantes = [acc for acc in accessibility if left.get(acc, 0) <= 0]
-        if faltantes:
-            warnings["resources"] = f"Recursos limitados para: {', '.join(faltantes)}"
 
     with get_conn() as con:
         cur = con.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        conflict = _booking_conflict(cur, slot_date, slot, accessibility, doctor_name)
+        if conflict:
+            con.rollback()
+            return {"booked": False, "date": slot_date, "slot": slot, "doctor_name": doctor_name, **conflict}
+        patient_id = _insert_patient(cur, patient_payload, triage)
         cur.execute(
-            "INSERT INTO bookings (patient_id, data, faixa, doctor_name, warnings) VALUES (?,?,?,?,?)",
-            (patient_id, slot_date, slot, doctor_name, json.dumps(warnings, ensure_ascii=False)),
+            "INSERT INTO bookings (patient_id, data, faixa, doctor_name, warnings, acc_mask) VALUES (?,?,?,?,?,?)",
+            (patient_id, slot_date, slot, doctor_name, json.dumps(warnings, ensure_ascii=False), acc_mask),
         )
         booking_id = cur.lastrowid
+        _apply_slot_usage(cur, slot_date, slot, accessibility, 1)
         con.commit()
+    availability_cache.invalidate()
 
     return {
+        "booked": True,
         "booking_id": booking_id,
         "patient_id": patient_id,
         "date": slot_date,
@@ -832,30 +1600,171 @@ def resources_status_tool(date_str: str, faixa: str) -> Dict[str, Any]:
     return {"date": date_str, "slot": faixa, "resources": resources_left(date_str, faixa)}
 
 
+def _date_range(start_date: date, days: int) -> List[str]:
+    return [(start_date + timedelta(days=offset)).isoformat() for offset in range(days)]
+
+
+def _availability_window(
+    dates: Sequence[str],
+    faixas: Sequence[str] = faixas_horarios,
+) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    """Carrega capacidade, recursos e medicos ocupados de varias datas em consultas agrupadas."""
+    first, last = min(dates), max(dates)
+    with get_conn() as con:
+        cur = con.cursor()
+        cap_base = {r[0]: r[1] for r in cur.execute("SELECT faixa, capacidade FROM capacity")}
+        res_base: Dict[str, Dict[str, int]] = defaultdict(dict)
+        for faixa, recurso, qtd in cur.execute("SELECT faixa, recurso, qtd FROM resources ORDER BY faixa, recurso"):
+            res_base[faixa][recurso] = qtd
+        slot_used = {(r[0], r[1]): r[2] for r in cur.execute(_SQL_CAPACITY_USED_RANGE, (first, last))}
+        res_used: Dict[Tuple[str, str], Dict[str, int]] = defaultdict(dict)
+        for dia, faixa, recurso, used in cur.execute(_SQL_RESOURCES_USED_RANGE, (first, last)):
+            res_used[(dia, faixa)][recurso] = used
+        busy: Dict[Tuple[str, str], set] = defaultdict(set)
+        for dia, faixa, doctor_name in cur.execute(_SQL_DOCTORS_BUSY_RANGE, (first, last)):
+            busy[(dia, faixa)].add(doctor_name)
+    window: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for dia in dates:
+        for faixa in faixas:
+            key = (dia, faixa)
+            used = res_used.get(key, {})
+            window[key] = {
+                "capacity_left": cap_base.get(faixa, capacidade.get(faixa, 0)) - slot_used.get(key, 0),
+                "resources_left": {k: qtd - used.get(k, 0) for k, qtd in res_base.get(faixa, {}).items()},
+                "busy_doctors": busy.get(key, set()),
+            }
+    return window
+
+
+class AvailabilityCache:
+    """Cache LRU em processo do estado de cada (data, faixa), invalidado por versao de escrita."""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._write_version = 0
+        self._token: Optional[Tuple[int, int]] = None
+        self._watch_conn: Optional[sqlite3.Connection] = None
+        self._watch_path: Optional[str] = None
+
+    def _data_version(self) -> int:
+        # data_version so muda quando *outra* conexao grava; por isso usamos uma conexao
+        # dedicada que nunca escreve e enxerga commits de todas as threads e processos.
+        if self._watch_conn is None or self._watch_path != DB_PATH:
+            if self._watch_conn is not None:
+                self._watch_conn.close()
+            self._watch_conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+            self._watch_path = DB_PATH
+        return self._watch_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _sync(self) -> Tuple[int, int]:
+        token = (self._write_version, self._data_version())
+        if token != self._token:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._token = token
+        return token
+
+    def get_many(
+        self, keys: Iterable[Tuple[str, str]]
+    ) -> Tuple[Tuple[int, int], Dict[Tuple[str, str], Dict[str, Any]]]:
+        found: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        with self._lock:
+            token = self._sync()
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    self.misses += 1
+                    continue
+                self._entries.move_to_end(key)
+                self.hits += 1
+                found[key] = entry
+        return token, found
+
+    def put_many(self, token: Tuple[int, int], entries: Dict[Tuple[str, str], Dict[str, Any]]) -> None:
+        with self._lock:
+            if self._sync() != token:
+                return
+            for key, entry in entries.items():
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._write_version += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "write_version": self._write_version,
+            }
+
+
+availability_cache = AvailabilityCache(AVAILABILITY_CACHE_SIZE)
+
+
+def _slot_states(
+    dates: Sequence[str],
+    faixas: Sequence[str] = faixas_horarios,
+) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    keys = [(dia, faixa) for dia in dates for faixa in faixas]
+    token, found = availability_cache.get_many(keys)
+    missing = sorted({dia for dia, faixa in keys if (dia, faixa) not in found})
+    if missing:
+        loaded = _availability_window(missing, faixas)
+        availability_cache.put_many(token, loaded)
+        found.update(loaded)
+    # Reconstroi na ordem pedida: com o cache parcialmente quente, `found` viria com os acertos primeiro.
+    return {key: found[key] for key in keys}
+
+
+def _slot_state(date_str: str, faixa: str) -> Dict[str, Any]:
+    key = (date_str, faixa)
+    token, found = availability_cache.get_many([key])
+    if key in found:
+        return found[key]
+    loaded = _availability_window([date_str], faixas_horarios if faixa in faixas_horarios else [faixa])
+    availability_cache.put_many(token, loaded)
+    return loaded[key]
+
+
 def slot_insights(date_str: str) -> List[Dict[str, Any]]:
+    window = _slot_states([date_str])
     summary: List[Dict[str, Any]] = []
     for faixa in faixas_horarios:
-        capacity = capacity_left_on(date_str, faixa)
-        recursos = resources_left(date_str, faixa)
+        state = window[(date_str, faixa)]
         doctors_info: List[Dict[str, Any]] = []
         for medico in medicos:
             if faixa not in medico["disp"]:
                 continue
-            available = doctor_free_on(medico["nome"], date_str, faixa)
             doctors_info.append(
                 {
                     "name": medico["nome"],
                     "specialties": sorted(medico["esp"]),
                     "online": medico["online"],
-                    "available": available,
+                    "available": medico["nome"] not in state["busy_doctors"],
                 }
             )
         summary.append(
             {
                 "slot": faixa,
                 "period": faixa_periodo.get(faixa),
-                "capacity_left": capacity,
-                "resources_left": recursos,
+                "capacity_left": state["capacity_left"],
+                "resources_left": dict(state["resources_left"]),
                 "doctors": doctors_info,
             }
         )
@@ -867,8 +1776,31 @@ def triage_score_tool(payload: Dict[str, Any]) -> Dict[str, Any]:
     return {"triage_level": score}
 
 
-def list_bookings_tool(date_str: Optional[str] = None, faixa: Optional[str] = None) -> Dict[str, Any]:
-    return {"bookings": list_bookings(date_str=date_str, faixa=faixa)}
+def list_bookings_tool(
+    date_str: Optional[str] = None,
+    faixa: Optional[str] = None,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    after_date: Optional[str] = None,
+) -> Dict[str, Any]:
+    page_size = max(1, min(int(limit or BOOKINGS_PAGE_SIZE), BOOKINGS_MAX_PAGE_SIZE))
+    bookings = list_bookings(
+        date_str=date_str,
+        faixa=faixa,
+        after_id=after_id,
+        limit=page_size,
+        date_from=date_from,
+        date_to=date_to,
+        after_date=after_date,
+    )
+    last = bookings[-1] if len(bookings) == page_size else None
+    return {
+        "bookings": bookings,
+        "next_after_id": last["booking_id"] if last else None,
+        "next_after_date": last["date"] if last else None,
+    }
 
 
 def patient_requirements_tool(patient_id: int) -> Dict[str, Any]:
@@ -961,13 +1893,36 @@ def optimize_schedule_tool(payload: Dict[str, Any]) -> Dict[str, Any]:
         restarts = max(1, int(payload.get("restarts") or RESTARTS))
     except (TypeError, ValueError):
         restarts = RESTARTS
+    try:
+        workers = max(1, int(payload.get("workers") or 1))
+    except (TypeError, ValueError):
+        workers = 1
+    engine = str(payload.get("engine") or "python").strip().lower()
+    search = SEARCH_ENGINES.get(engine)
+    if search is None:
+        return {"optimized": False, "reason": f"Motor desconhecido: {engine}. Use um de: {', '.join(SEARCH_ENGINES)}."}
+    if not _engine_available(search):
+        return {
+            "optimized": False,
+            "reason": f"O motor '{engine}' requer o pacote {search.requires} (instale o extra 'optimizer').",
+        }
+    try:
+        engine_options = _engine_options(search, payload)
+    except ValueError as exc:
+        return {"optimized": False, "reason": str(exc)}
+    try:
+        target_cost = float(payload["target_cost"]) if payload.get("target_cost") is not None else None
+    except (TypeError, ValueError):
+        target_cost = None
+    if target_cost is not None and not math.isfinite(target_cost):
+        return {"optimized": False, "reason": "Opcao 'target_cost' invalida: use um numero finito."}
     seed_raw = payload.get("seed", SEED)
     base_seed: Optional[int]
     try:
         base_seed = int(seed_raw) if seed_raw is not None else SEED
     except (TypeError, ValueError):
         base_seed = None if seed_raw in (None, "", False) else SEED
-    solution, cost, allocations, resources_state, capacity_state = _hill_climb_multi(
+    solution, cost, allocations, resources_state, capacity_state, restarts_run = _hill_climb_multi(
         patients,
         medicos,
         slots,
@@ -976,6 +1931,10 @@ def optimize_schedule_tool(payload: Dict[str, Any]) -> Dict[str, Any]:
         max_iter=max_iter,
         restarts=restarts,
         base_seed=base_seed,
+        workers=workers,
+        target_cost=target_cost,
+        engine=engine,
+        engine_options=engine_options,
     )
     assignments: List[Dict[str, Any]] = []
     for idx, patient in enumerate(patients):
@@ -1008,32 +1967,137 @@ def optimize_schedule_tool(payload: Dict[str, Any]) -> Dict[str, Any]:
             "date": target_date,
             "max_iter": max_iter,
             "restarts": restarts,
+            "restarts_run": restarts_run,
             "seed": base_seed,
+            "workers": workers,
+            "target_cost": target_cost,
+            "engine": engine,
+            "engine_options": engine_options,
         },
     }
 
 
 def availability_snapshot(days_ahead: int = 7) -> list[dict[str, Any]]:
     days_ahead = max(1, min(days_ahead, 30))
-    today = date.today()
-    summary: list[dict[str, Any]] = []
-    for offset in range(days_ahead):
-        dia = (today + timedelta(days=offset)).isoformat()
-        for faixa in faixas_horarios:
-            summary.append(
-                {
-                    "date": dia,
-                    "slot": faixa,
-                    "capacity_left": capacity_left_on(dia, faixa),
-                    "resources": resources_left(dia, faixa),
-                }
-            )
-    return summary
-
-
-def register():
-    init_db()
-    seed_static_if_empty()
+    window = _slot_states(_date_range(date.today(), days_ahead))
+    return [
+        {
+            "date": dia,
+            "slot": faixa,
+            "capacity_left": state["capacity_left"],
+            "resources": dict(state["resources_left"]),
+        }
+        for (dia, faixa), state in window.items()
+    ]
 
 
-register()
+def _synthetic_requests(count: int, seed: int) -> List[Dict[str, Any]]:
+    """Pacientes ficticios para benchmark, sempre os mesmos para a mesma semente."""
+    rng = random.Random(seed)
+    return [
+        {
+            "patient_id": idx,
+            "specialty": rng.choice(especialidades),
+            "consultation_type": rng.choice(tipo_consulta),
+            "preferred_period": rng.choice(["manha", "tarde", "noite"]),
+            "urgency": rng.randint(1, 5),
+            "accessibility": rng.sample(acessibilidades, rng.randint(0, 2)),
+        }
+        for idx in range(count)
+    ]
+
+
+def run_benchmark(
+    sizes: Sequence[int],
+    engines: Sequence[str],
+    iterations: Sequence[int],
+    restarts: int = 1,
+    seed: int = SEED,
+    workers: int = 1,
+) -> List[Dict[str, Any]]:
+    """Custo x tempo de cada motor nas mesmas instancias sinteticas (uma linha por tamanho/motor/iteracoes)."""
+    rows: List[Dict[str, Any]] = []
+    for size in sizes:
+        requests = _synthetic_requests(size, seed)
+        for engine in engines:
+            for max_iter in iterations:
+                started = time.perf_counter()
+                result = optimize_schedule_tool(
+                    {
+                        "patients": requests,
+                        "engine": engine,
+                        "max_iter": max_iter,
+                        "restarts": restarts,
+                        "seed": seed,
+                        "workers": workers,
+                    }
+                )
+                rows.append(
+                    {
+                        "patients": size,
+                        "engine": engine,
+                        "max_iter": max_iter,
+                        "restarts": restarts,
+                        "seconds": round(time.perf_counter() - started, 4),
+                        "cost": result.get("cost"),
+                        "reason": result.get("reason"),
+                    }
+                )
+    return rows
+
+
+def _int_list(raw: str) -> List[int]:
+    return [int(item) for item in raw.split(",") if item.strip()]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.services.scheduling")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("check-plans", help="Falha se alguma consulta quente cair em SCAN ou sort temporario.")
+    counters = commands.add_parser("rebuild-counters", help="Recalcula slot_usage/slot_resource_usage a partir de bookings.")
+    counters.add_argument("--check", action="store_true", help="Apenas reporta divergencias, sem corrigir.")
+    bench = commands.add_parser("benchmark", help="Compara custo x tempo dos motores de otimizacao.")
+    bench.add_argument("--patients", type=_int_list, default=[50, 500, 5000], help="Tamanhos, ex.: 50,500,5000.")
+    bench.add_argument("--engines", default=",".join(SEARCH_ENGINES), help="Motores, ex.: python,annealing,tabu.")
+    bench.add_argument("--iterations", type=_int_list, default=[200, 2000, 20000], help="Orcamentos de max_iter.")
+    bench.add_argument("--restarts", type=int, default=1)
+    bench.add_argument("--seed", type=int, default=SEED)
+    bench.add_argument("--workers", type=int, default=1)
+    bench.add_argument("--json", action="store_true", help="Uma linha JSON por medicao.")
+    args = parser.parse_args(argv)
+    if args.command == "benchmark":
+        engines = [name.strip() for name in args.engines.split(",") if name.strip()]
+        rows = run_benchmark(args.patients, engines, args.iterations, args.restarts, args.seed, args.workers)
+        if not args.json:
+            print(f"{'pacientes':>9} {'motor':<10} {'max_iter':>8} {'segundos':>9} {'custo':>14}")
+        for row in rows:
+            if args.json:
+                print(json.dumps(row, ensure_ascii=False))
+            elif row["reason"]:
+                print(f"{row['patients']:>9} {row['engine']:<10} {row['max_iter']:>8} {'-':>9} {row['reason']}")
+            else:
+                print(
+                    f"{row['patients']:>9} {row['engine']:<10} {row['max_iter']:>8} "
+                    f"{row['seconds']:>9.3f} {row['cost']:>14.0f}"
+                )
+        return 0
+    ensure_schema()
+    if args.command == "check-plans":
+        for name, steps in explain_hot_queries().items():
+            print(f"{name}: {' | '.join(steps)}")
+        regressions = query_plan_regressions()
+        if regressions:
+            print(f"SCAN ou sort temporario em: {', '.join(sorted(regressions))}", file=sys.stderr)
+            return 1
+    elif args.command == "rebuild-counters":
+        report = verify_slot_counters(repair=not args.check)
+        for item in report["drift"]:
+            print(json.dumps(item, ensure_ascii=False))
+        print(f"{len(report['drift'])} divergencia(s) encontrada(s).")
+        if args.check and report["drift"]:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
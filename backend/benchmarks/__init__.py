@@ -0,0 +1 @@
+"""Benchmarks e testes de carga reproduziveis; rode a partir de backend/ com `python -m benchmarks.<nome>`."""
@@ -0,0 +1,76 @@
+"""Disponibilidade de uma janela de dias: consultas pontuais por faixa/medico x consultas agrupadas da janela.
+
+    python -m benchmarks.availability [--bookings 3000] [--windows 7,30,90] [--json]
+
+O caminho "pontual" repete o que availability_snapshot/slot_insights faziam antes de `_availability_window`:
+capacidade, recursos e ocupacao de cada medico consultados por (data, faixa). Os dois caminhos sao comparados
+em resultado (devem ser identicos) e em tempo, sem o cache de disponibilidade.
+"""
+from __future__ import annotations
+
+import argparse
+from datetime import date
+from typing import Any, Dict, List, Sequence, Tuple
+
+from app.services import scheduling
+
+from .common import per_call, report, seed_bookings, temp_scheduling_db
+
+
+def per_slot_window(dates: Sequence[str]) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    window: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    with scheduling.get_conn() as con:
+        cur = con.cursor()
+        for dia in dates:
+            for faixa in scheduling.faixas_horarios:
+                cap = cur.execute(scheduling._SQL_CAPACITY_BASE, (faixa,)).fetchone()
+                used = cur.execute(scheduling._SQL_CAPACITY_USED, (dia, faixa)).fetchone()
+                base = dict(cur.execute(scheduling._SQL_RESOURCES_BASE, (faixa,)).fetchall())
+                res_used = dict(cur.execute(scheduling._SQL_RESOURCES_USED, (dia, faixa)).fetchall())
+                window[(dia, faixa)] = {
+                    "capacity_left": cap[0] - (used[0] if used else 0),
+                    "resources_left": {k: qtd - res_used.get(k, 0) for k, qtd in base.items()},
+                    "busy_doctors": {
+                        medico["nome"]
+                        for medico in scheduling.medicos
+                        if cur.execute(scheduling._SQL_DOCTOR_USED, (medico["nome"], dia, faixa)).fetchone()[0]
+                    },
+                }
+    return window
+
+
+def run(bookings: int, windows: Sequence[int], repeat: int) -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    with temp_scheduling_db():
+        seed_bookings(bookings, days=max(windows) + 5)
+        for days in windows:
+            dates = scheduling._date_range(date.today(), days)
+            bulk = scheduling._availability_window(dates)
+            if bulk != per_slot_window(dates):
+                raise SystemExit(f"Resultados diferentes na janela de {days} dias.")
+            pontual = per_call(lambda: per_slot_window(dates), repeat)
+            agrupado = per_call(lambda: scheduling._availability_window(dates), repeat)
+            rows.append(
+                {
+                    "days": days,
+                    "per_slot_ms": round(pontual * 1e3, 3),
+                    "window_ms": round(agrupado * 1e3, 3),
+                    "speedup": round(pontual / agrupado, 2),
+                }
+            )
+    return rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.availability")
+    parser.add_argument("--bookings", type=int, default=3000)
+    parser.add_argument("--windows", type=lambda raw: [int(x) for x in raw.split(",") if x.strip()], default=[7, 30, 90])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="Uma linha JSON por medicao.")
+    args = parser.parse_args()
+    report(run(args.bookings, args.windows, args.repeat), args.json)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import httpx
+
+from app.services import scheduling
+
+
+@contextmanager
+def temp_scheduling_db() -> Iterator[str]:
+    """Aponta o modulo de agenda para um banco descartavel durante o bloco."""
+    previous = scheduling.DB_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        scheduling.close_all_conns()
+        scheduling.DB_PATH = os.path.join(tmp, "scheduling.db")
+        scheduling.availability_cache.invalidate()
+        try:
+            scheduling.ensure_schema()
+            yield scheduling.DB_PATH
+        finally:
+            scheduling.close_all_conns()
+            scheduling.DB_PATH = previous
+            scheduling.availability_cache.invalidate()
+
+
+def seed_bookings(count: int, days: int, start: date | None = None, seed: int = 7) -> None:
+    """Grava `count` agendamentos em `days` dias a partir de `start`, mantendo os contadores de ocupacao."""
+    rng = random.Random(seed)
+    start = start or date.today()
+    with scheduling.get_conn() as con:
+        cur = con.cursor()
+        for _ in range(count):
+            medico = rng.choice(scheduling.medicos)
+            faixa = rng.choice(sorted(medico["disp"]))
+            dia = (start + timedelta(days=rng.randrange(days))).isoformat()
+            acc = rng.sample(scheduling.acessibilidades, rng.randint(0, 2))
+            patient_id = scheduling._insert_patient(
+                cur,
+                {
+                    "data": dia,
+                    "esp": next(iter(medico["esp"])),
+                    "periodo": scheduling.faixa_periodo[faixa],
+                    "tipo": "presencial",
+                    "urg": rng.randint(1, 5),
+                    "acc": acc,
+                },
+            )
+            cur.execute(
+                "INSERT INTO bookings (patient_id, data, faixa, doctor_name, warnings, acc_mask) VALUES (?,?,?,?,?,?)",
+                (patient_id, dia, faixa, medico["nome"], "{}", scheduling.acc_to_mask(acc)),
+            )
+            scheduling._apply_slot_usage(cur, dia, faixa, acc, 1)
+    scheduling.availability_cache.invalidate()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextmanager
+def uvicorn_server(env: Dict[str, str], workers: int = 1, timeout: float = 60.0) -> Iterator[str]:
+    """Sobe `app.main:app` num processo uvicorn separado e devolve a URL base; sem chave do LLM (resposta eco)."""
+    port = free_port()
+    # Chaves vazias no ambiente: o load_dotenv nao sobrescreve, entao um .env local nao liga o LLM real.
+    server_env = {**os.environ, "OPENROUTER_API_KEY": "", "OPENROUTER_API_KEYS": "", **env}
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--workers", str(workers),
+         "--log-level", "warning"],
+        env=server_env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                httpx.get(f"{base_url}/metrics", timeout=1.0).raise_for_status()
+                break
+            except httpx.HTTPError:
+                if proc.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("uvicorn nao subiu.")
+                time.sleep(0.2)
+        yield base_url
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def per_call(func: Callable[[], Any], repeat: int = 200, rounds: int = 5) -> float:
+    """Mediana, entre `rounds` rodadas, do tempo medio por chamada (segundos)."""
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        for _ in range(repeat):
+            func()
+        samples.append((time.perf_counter() - started) / repeat)
+    return statistics.median(samples)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def report(rows: List[Dict[str, Any]], as_json: bool) -> None:
+    if as_json:
+        for row in rows:
+            print(json.dumps(row, ensure_ascii=False))
+        return
+    if not rows:
+        return
+    columns = list(rows[0])
+    widths = {col: max(len(col), *(len(_cell(row[col])) for row in rows)) for col in columns}
+    print("  ".join(col.rjust(widths[col]) for col in columns))
+    for row in rows:
+        print("  ".join(_cell(row[col]).rjust(widths[col]) for col in columns))
+
+
+def _cell(value: Any) -> str:
+    if isinstance(value, float):
+        return f"{value:.4g}"
+    return str(value)
@@ -0,0 +1,65 @@
+"""Custo por chamada das consultas de agenda: conexao nova a cada chamada x conexao persistente por thread.
+
+    python -m benchmarks.connections [--bookings 3000] [--json]
+
+O modo "nova conexao" troca `get_conn` por um `sqlite3.connect` simples a cada chamada, como antes do pool.
+O cache de disponibilidade e invalidado antes de cada chamada para que toda medicao va ao banco.
+"""
+from __future__ import annotations
+
+import argparse
+import sqlite3
+from datetime import date, timedelta
+from typing import Any, Dict, List
+from unittest import mock
+
+from app.services import scheduling
+
+from .common import per_call, report, seed_bookings, temp_scheduling_db
+
+
+def _fresh_conn() -> sqlite3.Connection:
+    return sqlite3.connect(scheduling.DB_PATH, check_same_thread=False)
+
+
+def run(bookings: int, repeat: int) -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    with temp_scheduling_db():
+        seed_bookings(bookings, days=30)
+        dia = (date.today() + timedelta(days=3)).isoformat()
+        cache = scheduling.availability_cache
+        calls = {
+            "capacity_left_on": lambda: (cache.invalidate(), scheduling.capacity_left_on(dia, "09-11")),
+            "resources_left": lambda: (cache.invalidate(), scheduling.resources_left(dia, "09-11")),
+            "find_next_slot": lambda: (
+                cache.invalidate(),
+                scheduling.find_next_slot("cardiologia", "presencial", ["libras"], date.today(), "13-15", 7),
+            ),
+        }
+        for name, call in calls.items():
+            with mock.patch.object(scheduling, "get_conn", _fresh_conn):
+                fresh = per_call(call, repeat)
+            pooled = per_call(call, repeat)
+            rows.append(
+                {
+                    "call": name,
+                    "fresh_us": round(fresh * 1e6, 1),
+                    "pooled_us": round(pooled * 1e6, 1),
+                    "speedup": round(fresh / pooled, 2),
+                }
+            )
+    return rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.connections")
+    parser.add_argument("--bookings", type=int, default=3000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--json", action="store_true", help="Uma linha JSON por medicao.")
+    args = parser.parse_args()
+    report(run(args.bookings, args.repeat), args.json)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
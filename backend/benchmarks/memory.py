@@ -0,0 +1,92 @@
+"""Memoria e custo de leitura do historico em memoria com 100k mensagens: colunas compactas x lista de pydantic.
+
+    python -m benchmarks.memory [--messages 100000] [--sessions 1,1000] [--json]
+
+"columns" e o InMemoryMessageStore atual (arrays por sessao, epoch em inteiros, history() como view).
+"pydantic" reproduz o formato anterior: um `Message` com datetime por mensagem e history() copiando a lista.
+A memoria e a alocada pelo store segundo o tracemalloc; history() e _build_messages rodam na sessao mais longa.
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Sequence
+
+from app.main import InMemoryMessageStore, Message, MessageOrigin, orchestrator
+
+from .common import per_call, report
+
+TEXTS = ["Quero marcar uma consulta de cardiologia na terca a tarde, por favor.", "ok", "pode ser"]
+
+
+class PydanticListStore:
+    """Formato anterior do historico em memoria, so com o necessario para add/history."""
+
+    def __init__(self) -> None:
+        self._sessions: Dict[str, List[Message]] = defaultdict(list)
+        self._counter = 1
+
+    def add(self, session_id: str, origin: MessageOrigin, content: str) -> Message:
+        message = Message(id=self._counter, origin=origin, content=content, created_at=datetime.now(timezone.utc))
+        self._counter += 1
+        self._sessions[session_id].append(message)
+        return message
+
+    def history(self, session_id: str) -> List[Message]:
+        return list(self._sessions[session_id])
+
+
+def _content(idx: int) -> str:
+    # Mistura de respostas curtas repetidas e textos livres distintos, como numa conversa real.
+    return TEXTS[idx % 3] if idx % 5 else f"mensagem livre numero {idx} com detalhes do atendimento"
+
+
+def _measure(name: str, factory: Callable[[], Any], messages: int, sessions: int) -> Dict[str, Any]:
+    gc.collect()
+    tracemalloc.start()
+    store = factory()
+    started = time.perf_counter()
+    for idx in range(messages):
+        store.add(f"s{idx % sessions}", "user" if idx % 2 else "bot", _content(idx))
+    add_s = time.perf_counter() - started
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    history = store.history("s0")
+    return {
+        "store": name,
+        "sessions": sessions,
+        "mb": round(allocated / 1e6, 1),
+        "bytes_per_msg": round(allocated / messages),
+        "add_us": round(add_s / messages * 1e6, 2),
+        "history_len": len(history),
+        "history_us": round(per_call(lambda: store.history("s0"), repeat=50) * 1e6, 2),
+        "build_messages_ms": round(
+            per_call(lambda: orchestrator._build_messages(store.history("s0")), repeat=5) * 1e3, 3
+        ),
+    }
+
+
+def run(messages: int, sessions: Sequence[int]) -> List[Dict[str, Any]]:
+    rows = []
+    for count in sessions:
+        rows.append(_measure("columns", lambda: InMemoryMessageStore(max_sessions=max(count, 1)), messages, count))
+        rows.append(_measure("pydantic", PydanticListStore, messages, count))
+    return rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.memory")
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--sessions", type=lambda raw: [int(x) for x in raw.split(",") if x.strip()], default=[1, 1000])
+    parser.add_argument("--json", action="store_true", help="Uma linha JSON por medicao.")
+    args = parser.parse_args()
+    report(run(args.messages, args.sessions), args.json)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
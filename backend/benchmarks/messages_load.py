@@ -0,0 +1,88 @@
+"""Vazao de POST /messages com a conversa em memoria x no SQLite compartilhado, com N workers do uvicorn.
+
+    python -m benchmarks.messages_load [--workers 1,2,4] [--requests 600] [--concurrency 16] [--json]
+
+Sobe o uvicorn num processo separado, sem chave do LLM (resposta eco), para que o custo medido seja o do
+servidor e do store. O store em memoria so roda com 1 worker (o historico se dividiria entre processos); o
+SQLite roda com cada valor de --workers. Ao final confere que /history ve todas as mensagens enviadas,
+independentemente do worker que atendeu cada requisicao.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from typing import Any, Dict, List, Sequence
+
+import httpx
+
+from .common import percentile, report, temp_scheduling_db, uvicorn_server
+
+
+async def _measure(base_url: str, requests: int, concurrency: int, sessions: int) -> Dict[str, Any]:
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        for idx in range(sessions):
+            (await client.post("/messages", json={"content": "oi", "session_id": f"warm{idx}"})).raise_for_status()
+        sem = asyncio.Semaphore(concurrency)
+        latencies: List[float] = []
+
+        async def one(idx: int) -> None:
+            async with sem:
+                started = time.perf_counter()
+                resp = await client.post("/messages", json={"content": f"mensagem {idx}", "session_id": f"s{idx % sessions}"})
+                resp.raise_for_status()
+                latencies.append((time.perf_counter() - started) * 1e3)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(idx) for idx in range(requests)))
+        elapsed = time.perf_counter() - started
+
+        stored = 0
+        for idx in range(sessions):
+            history = (await client.get("/history", params={"session_id": f"s{idx}"})).json()
+            stored += sum(1 for item in history if item["origin"] == "user")
+    if stored != requests:
+        raise SystemExit(f"/history viu {stored} de {requests} mensagens.")
+    return {
+        "req_s": round(requests / elapsed, 1),
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": percentile(latencies, 95),
+    }
+
+
+def run(workers: Sequence[int], requests: int, concurrency: int, sessions: int) -> List[Dict[str, Any]]:
+    scenarios = [("memory", 1)] + [("sqlite", count) for count in workers]
+    rows: List[Dict[str, Any]] = []
+    with temp_scheduling_db() as db_path, tempfile.TemporaryDirectory() as tmp:
+        for idx, (store, count) in enumerate(scenarios):
+            env = {
+                "SCHEDULING_DB_PATH": db_path,
+                "MESSAGE_STORE": store,
+                "MESSAGE_DB_PATH": os.path.join(tmp, f"messages-{idx}.db"),
+                "BACKEND_WORKERS": str(count),
+                # Sessoes em numero fixo: o limite por sessao nao pode descartar mensagens no meio da medicao.
+                "CHAT_MAX_SESSIONS": str(max(1000, sessions * 4)),
+            }
+            with uvicorn_server(env, workers=count) as url:
+                measured = asyncio.run(_measure(url, requests, concurrency, sessions))
+            rows.append({"store": store, "workers": count, **measured})
+    return rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.messages_load")
+    parser.add_argument("--workers", type=lambda raw: [int(x) for x in raw.split(",") if x.strip()], default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="Uma linha JSON por cenario.")
+    args = parser.parse_args()
+    report(run(args.workers, args.requests, args.concurrency, args.sessions), args.json)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,88 @@
+"""Tempo de subida do backend: import a frio, lifespan (migracoes) e primeira requisicao.
+
+    python -m benchmarks.startup [--runs 7] [--json]
+
+Cada medicao roda num interpretador novo, para que o import seja de fato a frio. O banco "novo" e criado do
+zero pelo lifespan (todas as migracoes e o seed estatico); no banco "migrado" o schema ja esta na versao
+atual, e a subida deve pular todo o DDL.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict, List
+
+from .common import report
+
+_CHILD = """
+import json, time
+started = time.perf_counter()
+from app.services import scheduling
+scheduling_imported = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+client = TestClient(app.main.app)
+entering = time.perf_counter()
+with client:
+    ready = time.perf_counter()
+    client.get("/availability", params={"days": 7}).raise_for_status()
+    answered = time.perf_counter()
+print(json.dumps({
+    "import_scheduling_ms": (scheduling_imported - started) * 1e3,
+    "import_main_ms": (imported - started) * 1e3,
+    "lifespan_ms": (ready - entering) * 1e3,
+    "first_request_ms": (answered - ready) * 1e3,
+}))
+"""
+
+_BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _measure(db_path: str) -> Dict[str, float]:
+    env = {
+        **os.environ,
+        "SCHEDULING_DB_PATH": db_path,
+        "MESSAGE_STORE": "memory",
+        "OPENROUTER_API_KEY": "",
+        "OPENROUTER_API_KEYS": "",
+    }
+    out = subprocess.run(
+        [sys.executable, "-c", _CHILD], env=env, cwd=_BACKEND_DIR, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def run(runs: int) -> List[Dict[str, Any]]:
+    samples: Dict[str, List[Dict[str, float]]] = {"novo": [], "migrado": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        migrated = os.path.join(tmp, "migrated.db")
+        _measure(migrated)
+        for idx in range(runs):
+            samples["novo"].append(_measure(os.path.join(tmp, f"fresh-{idx}.db")))
+            samples["migrado"].append(_measure(migrated))
+    rows = []
+    for banco, measured in samples.items():
+        row: Dict[str, Any] = {"db": banco}
+        for key in measured[0]:
+            row[key] = round(statistics.median(sample[key] for sample in measured), 2)
+        rows.append(row)
+    return rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup")
+    parser.add_argument("--runs", type=int, default=7, help="Processos por cenario (mediana).")
+    parser.add_argument("--json", action="store_true", help="Uma linha JSON por cenario.")
+    args = parser.parse_args()
+    report(run(args.runs), args.json)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
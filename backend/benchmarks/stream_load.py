@@ -0,0 +1,82 @@
+"""Latencia de /messages/stream parada x com /availability martelado em paralelo.
+
+    python -m benchmarks.stream_load [--bookings 3000] [--clients 8] [--probes 30] [--json]
+
+Sobe o uvicorn num processo separado, sem chave do LLM (resposta eco) e com o cache de disponibilidade
+desligado, para que cada /availability?days=30 va ao SQLite. Se as consultas rodassem no event loop, a
+latencia do stream subiria junto com a carga.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Any, Dict, List
+
+import httpx
+
+from .common import percentile, report, seed_bookings, temp_scheduling_db, uvicorn_server
+
+
+async def _probe(client: httpx.AsyncClient, count: int) -> List[float]:
+    latencies = []
+    for idx in range(count):
+        started = time.perf_counter()
+        async with client.stream("POST", "/messages/stream", json={"content": "oi", "session_id": f"p{idx}"}) as resp:
+            async for _ in resp.aiter_bytes():
+                pass
+        latencies.append((time.perf_counter() - started) * 1e3)
+    return latencies
+
+
+async def _hammer(client: httpx.AsyncClient, stop: asyncio.Event, counter: List[int]) -> None:
+    while not stop.is_set():
+        (await client.get("/availability", params={"days": 30})).raise_for_status()
+        counter[0] += 1
+
+
+async def _measure(base_url: str, clients: int, probes: int) -> List[Dict[str, Any]]:
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        await _probe(client, 3)
+        idle = await _probe(client, probes)
+        stop = asyncio.Event()
+        counter = [0]
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(_hammer(client, stop, counter)) for _ in range(clients)]
+        await asyncio.sleep(0.5)
+        busy = await _probe(client, probes)
+        stop.set()
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+    return [
+        {"phase": "idle", "p50_ms": statistics.median(idle), "p95_ms": percentile(idle, 95), "availability_rps": 0.0},
+        {
+            "phase": f"{clients} clients",
+            "p50_ms": statistics.median(busy),
+            "p95_ms": percentile(busy, 95),
+            "availability_rps": counter[0] / elapsed,
+        },
+    ]
+
+
+def run(bookings: int, clients: int, probes: int) -> List[Dict[str, Any]]:
+    with temp_scheduling_db() as db_path:
+        seed_bookings(bookings, days=35)
+        with uvicorn_server({"SCHEDULING_DB_PATH": db_path, "SCHEDULING_CACHE_SIZE": "0", "MESSAGE_STORE": "memory"}) as url:
+            return asyncio.run(_measure(url, clients, probes))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.stream_load")
+    parser.add_argument("--bookings", type=int, default=3000)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--probes", type=int, default=30)
+    parser.add_argument("--json", action="store_true", help="Uma linha JSON por fase.")
+    args = parser.parse_args()
+    report(run(args.bookings, args.clients, args.probes), args.json)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
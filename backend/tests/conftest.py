@@ -0,0 +1,14 @@
+import pytest
+
+from app.services import scheduling
+
+
+@pytest.fixture
+def scheduling_db(tmp_path, monkeypatch):
+    """Aponta o modulo de agenda para um banco temporario e fecha as conexoes ao final."""
+    path = str(tmp_path / "scheduling.db")
+    monkeypatch.setattr(scheduling, "DB_PATH", path)
+    scheduling.availability_cache.invalidate()
+    yield path
+    scheduling.close_all_conns()
+    scheduling.availability_cache.invalidate()
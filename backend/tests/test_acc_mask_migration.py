@@ -0,0 +1,130 @@
+import random
+import sqlite3
+
+from app.services import scheduling
+
+DATES = ["2030-02-04", "2030-02-05", "2030-02-06"]
+LEGACY_VERSION = 3
+ORPHAN_PATIENT_ID = 10_000
+
+
+def _build_legacy_db(path):
+    """Banco no schema v3: acessibilidade so em patient_access, contadores montados pela migracao 3."""
+    con = sqlite3.connect(path)
+    cur = con.cursor()
+    rng = random.Random(9)
+    for script in scheduling._SCHEMA_MIGRATIONS[:LEGACY_VERSION - 1]:
+        for stmt in scheduling._sql_statements(script):
+            cur.execute(stmt)
+    scheduling.seed_static_if_empty(cur)
+    for i in range(60):
+        medico = rng.choice(scheduling.medicos)
+        faixa = rng.choice(sorted(medico["disp"]))
+        dia = rng.choice(DATES)
+        cur.execute(
+            "INSERT INTO patients (data, esp, periodo, tipo, urg) VALUES (?,?,?,?,?)",
+            (dia, next(iter(medico["esp"])), scheduling.faixa_periodo[faixa], "presencial", rng.randint(1, 5)),
+        )
+        pid = cur.lastrowid
+        acc = rng.sample(scheduling.acessibilidades, rng.randint(0, 3))
+        cur.executemany("INSERT INTO patient_access (patient_id, acc) VALUES (?,?)", [(pid, a) for a in acc])
+        cur.execute(
+            "INSERT INTO bookings (patient_id, data, faixa, doctor_name, warnings) VALUES (?,?,?,?,?)",
+            (pid, dia, faixa, f"{medico['nome']} {i}", "{}"),
+        )
+    # Agendamento orfao (paciente apagado com foreign_keys desligado): a migracao nao pode quebrar nele.
+    cur.execute(
+        "INSERT INTO bookings (patient_id, data, faixa, doctor_name, warnings) VALUES (?,?,?,?,?)",
+        (ORPHAN_PATIENT_ID, DATES[0], scheduling.faixas_horarios[0], "Orfao", "{}"),
+    )
+    for stmt in scheduling._sql_statements(scheduling._SCHEMA_MIGRATIONS[LEGACY_VERSION - 1]):
+        cur.execute(stmt)
+    cur.execute(f"PRAGMA user_version = {LEGACY_VERSION}")
+    con.commit()
+    return con
+
+
+def _legacy_access(con):
+    return {
+        pid: set(csv.split(","))
+        for pid, csv in con.execute("SELECT patient_id, GROUP_CONCAT(acc, ',') FROM patient_access GROUP BY patient_id")
+    }
+
+
+def _legacy_bookings(con):
+    access = _legacy_access(con)
+    rows = con.execute(
+        """
+        SELECT b.id, b.patient_id, b.data, b.faixa, b.doctor_name, b.warnings, b.created_at,
+               p.esp, p.periodo, p.tipo, p.urg
+          FROM bookings b
+          JOIN patients p ON p.id = b.patient_id
+        """
+    )
+    bookings = {}
+    for row in rows:
+        booking = scheduling._booking_from_row((*row, 0))
+        booking["accessibility"] = access.get(row[1], set())
+        bookings[row[0]] = booking
+    return bookings
+
+
+def _legacy_patients(con):
+    access = _legacy_access(con)
+    return {
+        row[0]: {
+            "id": row[0],
+            "date": row[1],
+            "specialty": row[2],
+            "period": row[3],
+            "consultation_type": row[4],
+            "urgency": row[5],
+            "accessibility": access.get(row[0], set()),
+        }
+        for row in con.execute("SELECT id, data, esp, periodo, tipo, urg FROM patients")
+    }
+
+
+def _legacy_resources_left(con):
+    used = {(r[0], r[1], r[2]): r[3] for r in con.execute("SELECT data, faixa, recurso, used FROM slot_resource_usage")}
+    left = {}
+    for dia in DATES:
+        for faixa in scheduling.faixas_horarios:
+            left[(dia, faixa)] = {
+                recurso: qtd - used.get((dia, faixa, recurso), 0)
+                for recurso, qtd in con.execute("SELECT recurso, qtd FROM resources WHERE faixa = ?", (faixa,))
+            }
+    return left
+
+
+def test_acc_mask_migration_preserves_outputs(scheduling_db):
+    con = _build_legacy_db(scheduling_db)
+    bookings = _legacy_bookings(con)
+    patients = _legacy_patients(con)
+    resources = _legacy_resources_left(con)
+    access = _legacy_access(con)
+    con.close()
+
+    scheduling.ensure_schema()
+
+    migrated = {b["booking_id"]: {**b, "accessibility": set(b["accessibility"])} for b in scheduling.list_bookings()}
+    assert migrated == bookings
+    for pid, expected in patients.items():
+        patient = scheduling.patient_access_map(pid)
+        assert {**patient, "accessibility": set(patient["accessibility"])} == expected
+    for (dia, faixa), expected in resources.items():
+        assert scheduling.resources_left(dia, faixa) == expected
+
+    with scheduling.get_conn() as con:
+        assert con.execute("PRAGMA user_version").fetchone()[0] == scheduling.SCHEMA_VERSION
+        patient_masks = dict(con.execute("SELECT id, acc_mask FROM patients"))
+        booking_masks = dict(con.execute("SELECT patient_id, acc_mask FROM bookings"))
+        legacy_tables = con.execute(
+            "SELECT name FROM sqlite_master WHERE name IN ('patient_access', 'idx_patient_access_patient')"
+        ).fetchall()
+    assert booking_masks.pop(ORPHAN_PATIENT_ID) == 0
+    assert legacy_tables == []
+    for pid, mask in patient_masks.items():
+        assert set(scheduling.mask_to_acc(mask)) == access.get(pid, set())
+        assert booking_masks[pid] == mask
+    assert scheduling.verify_slot_counters()["drift"] == []
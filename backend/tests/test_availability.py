@@ -0,0 +1,98 @@
+import random
+import sqlite3
+from datetime import date, timedelta
+
+from app.services import scheduling
+
+START = date(2030, 3, 4)
+DAYS = [(START + timedelta(days=offset)).isoformat() for offset in range(5)]
+
+
+def _seed(count=150, seed=5):
+    rng = random.Random(seed)
+    for _ in range(count):
+        medico = rng.choice(scheduling.medicos)
+        scheduling.book_appointment(
+            next(iter(medico["esp"])),
+            rng.choice(DAYS),
+            rng.choice(sorted(medico["disp"])),
+            "presencial",
+            rng.randint(1, 5),
+            rng.sample(scheduling.acessibilidades, rng.randint(0, 2)),
+            medico["nome"],
+        )
+
+
+def _per_slot_state(cur, dia, faixa):
+    """Estado de uma (data, faixa) com as consultas pontuais, sem janela nem cache."""
+    cap = cur.execute(scheduling._SQL_CAPACITY_BASE, (faixa,)).fetchone()
+    used = cur.execute(scheduling._SQL_CAPACITY_USED, (dia, faixa)).fetchone()
+    base = dict(cur.execute(scheduling._SQL_RESOURCES_BASE, (faixa,)).fetchall())
+    res_used = dict(cur.execute(scheduling._SQL_RESOURCES_USED, (dia, faixa)).fetchall())
+    busy = {
+        medico["nome"]
+        for medico in scheduling.medicos
+        if cur.execute(scheduling._SQL_DOCTOR_USED, (medico["nome"], dia, faixa)).fetchone()[0]
+    }
+    return {
+        "capacity_left": cap[0] - (used[0] if used else 0),
+        "resources_left": {recurso: qtd - res_used.get(recurso, 0) for recurso, qtd in base.items()},
+        "busy_doctors": busy,
+    }
+
+
+def test_availability_window_matches_per_slot_queries(scheduling_db):
+    _seed()
+    window = scheduling._availability_window(DAYS + ["2030-04-01"])
+    with scheduling.get_conn() as con:
+        cur = con.cursor()
+        expected = {
+            (dia, faixa): _per_slot_state(cur, dia, faixa)
+            for dia in DAYS + ["2030-04-01"]
+            for faixa in scheduling.faixas_horarios
+        }
+    assert window == expected
+    assert any(state["busy_doctors"] for state in window.values())
+
+
+def test_slot_insights_uses_window_state(scheduling_db):
+    _seed()
+    with scheduling.get_conn() as con:
+        cur = con.cursor()
+        for item in scheduling.slot_insights(DAYS[0]):
+            state = _per_slot_state(cur, DAYS[0], item["slot"])
+            assert item["capacity_left"] == state["capacity_left"]
+            assert item["resources_left"] == state["resources_left"]
+            for doctor in item["doctors"]:
+                assert doctor["available"] == (doctor["name"] not in state["busy_doctors"])
+
+
+def test_availability_cache_invalidated_by_book_and_cancel(scheduling_db):
+    dia, faixa = DAYS[0], "09-11"
+    scheduling.ensure_schema()
+    free = scheduling.capacity_left_on(dia, faixa)
+    hits = scheduling.availability_cache.hits
+    assert scheduling.capacity_left_on(dia, faixa) == free
+    assert scheduling.availability_cache.hits == hits + 1
+
+    booked = scheduling.book_appointment("cardiologia", dia, faixa, "presencial", 3, ["libras"], "Dra. Carla")
+    assert booked["booked"]
+    assert scheduling.capacity_left_on(dia, faixa) == free - 1
+    assert scheduling.resources_left(dia, faixa)["libras"] == scheduling.recursos_qtd[faixa]["libras"] - 1
+    assert not scheduling.doctor_free_on("Dra. Carla", dia, faixa)
+
+    scheduling.cancel_booking(booked["booking_id"])
+    assert scheduling.capacity_left_on(dia, faixa) == free
+    assert scheduling.resources_left(dia, faixa)["libras"] == scheduling.recursos_qtd[faixa]["libras"]
+    assert scheduling.doctor_free_on("Dra. Carla", dia, faixa)
+
+
+def test_availability_cache_sees_writes_from_other_connections(scheduling_db):
+    dia, faixa = DAYS[1], "13-15"
+    free = scheduling.capacity_left_on(dia, faixa)
+    # Outra conexao (outro worker, a CLI) grava sem passar por invalidate(): so o data_version denuncia.
+    other = sqlite3.connect(scheduling_db)
+    with other:
+        other.execute("INSERT INTO slot_usage (data, faixa, used) VALUES (?, ?, 2)", (dia, faixa))
+    other.close()
+    assert scheduling.capacity_left_on(dia, faixa) == free - 2
@@ -0,0 +1,66 @@
+import threading
+
+from app.services import scheduling
+
+SLOT_DATE = "2030-01-07"
+THREADS = 12
+
+
+def _book_concurrently(slot, doctors, accessibility=()):
+    barrier = threading.Barrier(len(doctors))
+    results = []
+    lock = threading.Lock()
+
+    def worker(doctor_name):
+        barrier.wait()
+        result = scheduling.book_appointment(
+            "psiquiatria", SLOT_DATE, slot, "presencial", 3, list(accessibility), doctor_name
+        )
+        with lock:
+            results.append(result)
+
+    threads = [threading.Thread(target=worker, args=(name,)) for name in doctors]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def _booked_in_slot(slot):
+    return len(scheduling.list_bookings(date_str=SLOT_DATE, faixa=slot))
+
+
+def test_concurrent_bookings_never_exceed_capacity(scheduling_db):
+    slot = "07-09"
+    capacity = scheduling.capacidade[slot]
+    results = _book_concurrently(slot, [f"Dr. Teste {i}" for i in range(THREADS)])
+
+    booked = [r for r in results if r["booked"]]
+    rejected = [r for r in results if not r["booked"]]
+    assert len(booked) == capacity
+    assert len(rejected) == THREADS - capacity
+    assert all(r["conflict"] == "capacity" for r in rejected)
+    assert _booked_in_slot(slot) == capacity
+    assert scheduling.verify_slot_counters()["drift"] == []
+
+
+def test_concurrent_bookings_same_doctor_book_once(scheduling_db):
+    slot = "09-11"
+    results = _book_concurrently(slot, ["Dra. Ana"] * THREADS)
+
+    assert sum(r["booked"] for r in results) == 1
+    assert all(r["conflict"] == "doctor" for r in results if not r["booked"])
+    assert _booked_in_slot(slot) == 1
+    assert scheduling.verify_slot_counters()["drift"] == []
+
+
+def test_concurrent_bookings_respect_accessibility_resources(scheduling_db):
+    slot = "11-13"
+    libras = scheduling.recursos_qtd[slot]["libras"]
+    results = _book_concurrently(slot, [f"Dr. Teste {i}" for i in range(THREADS)], ["libras"])
+
+    assert sum(r["booked"] for r in results) == libras
+    assert all(r["conflict"] == "resources" for r in results if not r["booked"])
+    assert scheduling.resources_left(SLOT_DATE, slot)["libras"] == 0
+    assert scheduling.verify_slot_counters()["drift"] == []
@@ -0,0 +1,90 @@
+import json
+import random
+from datetime import date, timedelta
+
+from fastapi.testclient import TestClient
+
+from app.services import scheduling
+
+START = date(2030, 3, 4)
+DAYS = [(START + timedelta(days=offset)).isoformat() for offset in range(6)]
+
+
+def _seed(count=120, seed=11):
+    """Agenda em datas embaralhadas, para que a ordem dos ids nao coincida com a das datas."""
+    rng = random.Random(seed)
+    booked = {}
+    for _ in range(count):
+        medico = rng.choice(scheduling.medicos)
+        result = scheduling.book_appointment(
+            next(iter(medico["esp"])),
+            rng.choice(DAYS),
+            rng.choice(sorted(medico["disp"])),
+            "presencial",
+            rng.randint(1, 5),
+            [],
+            medico["nome"],
+        )
+        if result["booked"]:
+            booked[result["booking_id"]] = result["date"]
+    return booked
+
+
+def _walk(limit, **filters):
+    """Segue next_after_id/next_after_date ate o fim e devolve todas as linhas vistas."""
+    rows = []
+    cursor = {}
+    while True:
+        page = scheduling.list_bookings_tool(limit=limit, **filters, **cursor)
+        rows.extend(page["bookings"])
+        if page["next_after_id"] is None:
+            return rows
+        cursor = {"after_id": page["next_after_id"], "after_date": page["next_after_date"]}
+
+
+def test_keyset_pages_cover_every_booking_once(scheduling_db):
+    booked = _seed()
+    assert len(booked) > 40
+
+    rows = _walk(limit=7)
+    ids = [row["booking_id"] for row in rows]
+    assert sorted(ids) == sorted(booked)
+    assert len(ids) == len(set(ids))
+    assert [(row["date"], row["booking_id"]) for row in rows] == sorted(
+        ((dia, booking_id) for booking_id, dia in booked.items()), reverse=True
+    )
+
+    # Mesmo encadeamento com o filtro de datas da primeira pagina real.
+    recent = _walk(limit=5, date_from=DAYS[2])
+    assert [row["booking_id"] for row in recent] == [
+        row["booking_id"] for row in rows if row["date"] >= DAYS[2]
+    ]
+
+
+def test_cursor_without_after_date_uses_booking_date(scheduling_db):
+    _seed(count=60)
+    first = scheduling.list_bookings_tool(limit=9)
+    by_id = scheduling.list_bookings_tool(limit=9, after_id=first["next_after_id"])
+    by_pair = scheduling.list_bookings_tool(
+        limit=9, after_id=first["next_after_id"], after_date=first["next_after_date"]
+    )
+    assert by_id["bookings"] == by_pair["bookings"]
+
+
+def test_ndjson_stream_matches_list_bookings(scheduling_db):
+    from app import main
+
+    _seed()
+    client = TestClient(main.app)
+    for filters in ({}, {"date_from": DAYS[1], "date_to": DAYS[4]}, {"date": DAYS[3]}):
+        response = client.post("/tools/bookings", json={**filters, "stream": True})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        streamed = [json.loads(line) for line in response.text.splitlines()]
+        expected = scheduling.list_bookings(
+            date_str=filters.get("date"),
+            date_from=filters.get("date_from"),
+            date_to=filters.get("date_to"),
+        )
+        assert streamed == expected
+        assert streamed
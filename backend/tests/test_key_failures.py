@@ -0,0 +1,42 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+
+from app import main
+
+REQUEST = httpx.Request("POST", "https://openrouter.ai/api/v1/chat/completions")
+
+
+def _status_error(status):
+    return openai.APIStatusError("erro", response=httpx.Response(status, request=REQUEST), body=None)
+
+
+@pytest.mark.parametrize(
+    "exc, expected",
+    [
+        (httpx.ConnectError("recusada", request=REQUEST), True),
+        (httpx.ReadTimeout("lento", request=REQUEST), True),
+        (openai.APIConnectionError(request=REQUEST), True),
+        (openai.APITimeoutError(request=REQUEST), True),
+        (_status_error(401), True),
+        (_status_error(429), True),
+        (_status_error(503), True),
+        (_status_error(400), False),
+        (_status_error(404), False),
+        (asyncio.TimeoutError(), False),
+        (TypeError("bug"), False),
+        (KeyError("choices"), False),
+        (ValueError("json"), False),
+    ],
+)
+def test_is_key_failure(exc, expected):
+    assert main._is_key_failure(exc) is expected
+
+
+def test_programming_errors_are_not_provider_errors():
+    assert not isinstance(TypeError("bug"), main._PROVIDER_ERRORS)
+    assert not isinstance(KeyError("choices"), main._PROVIDER_ERRORS)
+    assert isinstance(openai.APITimeoutError(request=REQUEST), main._PROVIDER_ERRORS)
+    assert isinstance(httpx.ConnectError("recusada", request=REQUEST), main._PROVIDER_ERRORS)
@@ -0,0 +1,78 @@
+import time
+
+import pytest
+
+from app import main
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    """Fabrica do store parametrizada pelos dois backends; fecha o que abriu ao final."""
+    opened = []
+
+    def factory(**limits):
+        if request.param == "memory":
+            store = main.InMemoryMessageStore(**limits)
+        else:
+            store = main.SQLiteMessageStore(str(tmp_path / "messages.db"), **limits)
+        opened.append(store)
+        return store
+
+    yield factory
+    for store in opened:
+        store.close()
+
+
+def _idle(store, session_id, seconds):
+    """Recua o ultimo acesso da sessao em `seconds`, sem esperar o relogio."""
+    if isinstance(store, main.InMemoryMessageStore):
+        store._sessions[session_id].last_seen = time.monotonic() - seconds
+    else:
+        with store._conn() as con:
+            con.execute(
+                "UPDATE sessions SET last_seen = ? WHERE conversation_id = ?", (time.time() - seconds, session_id)
+            )
+
+
+def _contents(store, session_id):
+    return [message.content for message in store.history(session_id)]
+
+
+def test_lru_evicts_least_recently_used_session(make_store):
+    store = make_store(max_sessions=3, ttl_seconds=3600)
+    for session_id in ("a", "b", "c", "a"):
+        store.add(session_id, "user", f"oi {session_id}")
+    _idle(store, "b", 30)
+    _idle(store, "c", 20)
+    _idle(store, "a", 10)
+
+    store.add("d", "user", "oi d")
+
+    stats = store.stats()
+    assert stats["sessions"] == 3
+    assert stats["evicted_lru"] == 1
+    assert stats["evicted_ttl"] == 0
+    assert _contents(store, "a") == [main.DEFAULT_GREETING, "oi a", "oi a"]
+    assert _contents(store, "c")[-1] == "oi c"
+    assert _contents(store, "d")[-1] == "oi d"
+
+
+def test_ttl_drops_idle_sessions(make_store):
+    store = make_store(max_sessions=10, ttl_seconds=60)
+    store.add("a", "user", "oi a")
+    store.add("b", "user", "oi b")
+    _idle(store, "a", 120)
+
+    # Abrir uma sessao nova varre as expiradas.
+    store.add("c", "user", "oi c")
+    stats = store.stats()
+    assert stats["evicted_ttl"] == 1
+    assert stats["sessions"] == 2
+    assert _contents(store, "b") == [main.DEFAULT_GREETING, "oi b"]
+
+    # Uma sessao expirada acessada direto recomeca so com a saudacao.
+    _idle(store, "b", 120)
+    assert _contents(store, "b") == [main.DEFAULT_GREETING]
+    stats = store.stats()
+    assert stats["evicted_ttl"] == 2
+    assert stats["evicted_lru"] == 0
@@ -0,0 +1,68 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def client(request, tmp_path, monkeypatch):
+    """Cliente da API com um store novo de cada backend e resposta do bot fixa (sem LLM)."""
+    if request.param == "memory":
+        store = main.InMemoryMessageStore()
+    else:
+        store = main.SQLiteMessageStore(str(tmp_path / "messages.db"))
+
+    async def fake_reply(history, profile_data, session_id):
+        return f"resposta {len(history)}"
+
+    monkeypatch.setattr(main, "store", store)
+    monkeypatch.setattr(main.orchestrator, "generate_reply", fake_reply)
+    monkeypatch.setattr(main, "MESSAGES_FULL_HISTORY", False)
+    yield TestClient(main.app)
+    store.close()
+
+
+def _send(client, content, **params):
+    resp = client.post("/messages", params=params, json={"content": content, "session_id": "delta"})
+    assert resp.status_code == 200
+    return resp.json()
+
+
+def _history(client, since_id=None):
+    params = {"session_id": "delta"}
+    if since_id is not None:
+        params["since_id"] = since_id
+    resp = client.get("/history", params=params)
+    assert resp.status_code == 200
+    return resp.json()
+
+
+def test_post_message_returns_only_the_new_turn(client):
+    greeting = _history(client)
+    assert [m["origin"] for m in greeting] == ["bot"]
+
+    turn = _send(client, "oi")
+    assert [(m["origin"], m["content"]) for m in turn] == [("user", "oi"), ("bot", "resposta 2")]
+    assert greeting[-1]["id"] < turn[0]["id"] < turn[1]["id"]
+
+    full = _send(client, "tudo", full_history="true")
+    assert full == _history(client)
+    assert [m["content"] for m in full] == [main.DEFAULT_GREETING, "oi", "resposta 2", "tudo", "resposta 4"]
+
+
+def test_history_since_id_returns_deltas(client):
+    seen = _history(client)
+    for content in ("um", "dois", "tres"):
+        _send(client, content)
+        delta = _history(client, since_id=seen[-1]["id"])
+        assert [m["content"] for m in delta] == [content, f"resposta {len(seen) + 1}"]
+        seen.extend(delta)
+    assert seen == _history(client)
+    assert _history(client, since_id=seen[-1]["id"]) == []
+    assert _history(client, since_id=0) == seen
+
+
+def test_full_history_flag_keeps_old_clients_working(client, monkeypatch):
+    monkeypatch.setattr(main, "MESSAGES_FULL_HISTORY", True)
+    assert _send(client, "oi") == _history(client)
+    assert len(_send(client, "so o turno", full_history="false")) == 2
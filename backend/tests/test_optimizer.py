@@ -0,0 +1,126 @@
+import hashlib
+import json
+import random
+
+import pytest
+
+from app.services import scheduling
+
+DATE = "2030-05-06"
+# sha256 de custo + alocacoes para _requests() com seed=42, restarts=4, max_iter=300 num banco vazio,
+# medido no otimizador original (antes dos contadores incrementais); o motor python deve reproduzi-lo.
+BASELINE_HASH = "7c3f059400ae2dec5bd8dbb7dce388364165d1927d9655db213f61d195648dcc"
+BASELINE_COST = 17540.0
+
+
+def _requests(count=40, seed=3):
+    rng = random.Random(seed)
+    return [
+        {
+            "patient_id": idx,
+            "specialty": rng.choice(scheduling.especialidades),
+            "consultation_type": rng.choice(scheduling.tipo_consulta),
+            "preferred_period": rng.choice(["manha", "tarde", "noite"]),
+            "urgency": rng.randint(1, 5),
+            "accessibility": rng.sample(scheduling.acessibilidades, rng.randint(0, 2)),
+        }
+        for idx in range(count)
+    ]
+
+
+def _optimize(**payload):
+    return scheduling.optimize_schedule_tool(
+        {"patients": _requests(), "seed": 42, "restarts": 4, "max_iter": 300, "date": DATE, **payload}
+    )
+
+
+def test_python_engine_matches_baseline(scheduling_db):
+    result = _optimize()
+    blob = json.dumps({"cost": result["cost"], "assignments": result["assignments"]}, sort_keys=True).encode()
+    assert result["cost"] == BASELINE_COST
+    assert hashlib.sha256(blob).hexdigest() == BASELINE_HASH
+
+
+def test_workers_do_not_change_the_result(scheduling_db, monkeypatch):
+    monkeypatch.setattr(scheduling, "OPTIMIZER_MAX_WORKERS", 2)
+    pooled = []
+    parallel_restarts = scheduling._parallel_restarts
+
+    def spy(workers, restart, tasks):
+        pooled.append(workers)
+        return parallel_restarts(workers, restart, tasks)
+
+    monkeypatch.setattr(scheduling, "_parallel_restarts", spy)
+    try:
+        sequential = _optimize(workers=1, restarts=6)
+        parallel = _optimize(workers=2, restarts=6)
+    finally:
+        scheduling.shutdown_executor()
+    assert pooled == [2]
+    assert parallel["parameters"].pop("workers") == 2
+    assert sequential["parameters"].pop("workers") == 1
+    assert parallel == sequential
+
+
+def test_target_cost_stops_at_first_restart_reaching_it(scheduling_db):
+    first = _optimize(restarts=1)
+    early = _optimize(restarts=8, target_cost=first["cost"])
+    assert early["parameters"]["restarts_run"] == 1
+    assert early["cost"] == first["cost"]
+    assert early["assignments"] == first["assignments"]
+
+    unreachable = _optimize(restarts=8, target_cost=-1e9)
+    assert unreachable["parameters"]["restarts_run"] == 8
+    assert unreachable["cost"] <= first["cost"]
+
+
+def test_non_finite_target_cost_is_rejected(scheduling_db):
+    for raw in ("nan", "inf", float("-inf")):
+        result = _optimize(target_cost=raw)
+        assert result["optimized"] is False
+        assert "target_cost" in result["reason"]
+
+
+@pytest.mark.parametrize("engine", ["python", "annealing", "tabu", "numpy"])
+def test_engine_cost_matches_full_evaluation(scheduling_db, engine):
+    search = scheduling.SEARCH_ENGINES[engine]
+    if search.requires:
+        pytest.importorskip(search.requires)
+    patients, _, slots = scheduling._prepare_hill_patients(_requests())
+    capacity = scheduling._baseline_capacity_limits(DATE, slots)
+    resources = scheduling._baseline_resource_limits(DATE, slots)
+    problem = scheduling._HillProblem.build(patients, scheduling.medicos, slots, capacity, resources)
+    prepared = search.prepare(problem)
+    for seed in range(3):
+        cost, solution = search.restart(prepared, 300, seed, dict(search.options))
+        expected = scheduling._calc_hill_cost(solution, patients, scheduling.medicos, slots, capacity, resources)[0]
+        assert cost == pytest.approx(expected)
+
+
+@pytest.mark.parametrize(
+    "engine, options",
+    [
+        ("annealing", {"temperature": float("nan")}),
+        ("annealing", {"min_temperature": "inf"}),
+        ("annealing", {"cooling": "exponencial"}),
+        ("tabu", {"tabu_tenure": float("inf")}),
+        ("tabu", {"neighborhood": "-inf"}),
+        ("numpy", {"batch_size": float("nan")}),
+        ("numpy", {"batch_size": scheduling.HILL_MAX_BATCH_SIZE + 1}),
+    ],
+)
+def test_engine_options_reject_unusable_values(scheduling_db, engine, options):
+    with pytest.raises(ValueError):
+        scheduling._engine_options(scheduling.SEARCH_ENGINES[engine], options)
+    result = _optimize(engine=engine, **options)
+    assert result["optimized"] is False
+    assert result["reason"]
+
+
+def test_engine_options_fall_back_to_defaults(scheduling_db):
+    options = scheduling._engine_options(
+        scheduling.SEARCH_ENGINES["annealing"], {"temperature": "quente", "min_temperature": -1, "cooling": " Linear "}
+    )
+    assert options == {**scheduling.ANNEAL_DEFAULTS, "cooling": "linear"}
+    batch = scheduling._engine_options(scheduling.SEARCH_ENGINES["numpy"], {"batch_size": scheduling.HILL_MAX_BATCH_SIZE})
+    assert batch == {"batch_size": scheduling.HILL_MAX_BATCH_SIZE}
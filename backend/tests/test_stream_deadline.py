@@ -0,0 +1,65 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from app import main
+from app.services.key_pool import KeyPool
+
+
+def _chunk(content):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content, tool_calls=None))])
+
+
+class StallingStream:
+    """Stream do provedor que entrega um pedaco e depois para de responder."""
+
+    def __init__(self):
+        self.sent = False
+        self.closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.closed = True
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.sent:
+            self.sent = True
+            return _chunk("Oi")
+        await asyncio.sleep(30)
+        raise StopAsyncIteration
+
+
+def test_stalled_stream_is_cut_at_the_request_deadline():
+    stream = StallingStream()
+
+    async def create(**kwargs):
+        return stream
+
+    orchestrator = main.LLMOrchestrator(
+        keys=KeyPool(["chave-teste"]),
+        model="modelo",
+        site_url="http://localhost",
+        app_name="teste",
+        max_retries=0,
+        request_deadline=0.3,
+    )
+    orchestrator._clients = [SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))]
+
+    async def consume():
+        return [token async for token in orchestrator._stream_with_tools([{"role": "user", "content": "oi"}])]
+
+    started = time.monotonic()
+    tokens = asyncio.run(asyncio.wait_for(consume(), timeout=5))
+    elapsed = time.monotonic() - started
+
+    assert elapsed < 2
+    assert tokens[0] == "Oi"
+    assert tokens[-1].startswith("Desculpe")
+    assert stream.closed
+    # Estourar o nosso prazo nao e culpa da chave.
+    assert orchestrator.keys.stats()[0]["failures"] == 0
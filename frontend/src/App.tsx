@@ -1,4 +1,4 @@
-import { useCallback, useEffect, useMemo, useState } from "react";
+import { useCallback, useEffect, useMemo, useRef, useState } from "react";
 import { cancelBooking, fetchAvailability, fetchBookings, fetchHistory, streamMessage, transcribeAudioFile } from "./api";
 import { AudioRecorderButton, type RecordedAudio } from "./components/AudioRecorderButton";
 import { AvailabilityBoard } from "./components/AvailabilityBoard";
@@ -10,6 +10,15 @@ import { VLibrasWidget } from "./components/VLibrasWidget";
 import type { AvailabilitySlot, Booking, Message, UserProfile } from "./types";
 import "./App.css";
 
+const BOOKINGS_PAGE_SIZE = 50;
+
+function todayIso() {
+  const now = new Date();
+  const month = String(now.getMonth() + 1).padStart(2, "0");
+  const day = String(now.getDate()).padStart(2, "0");
+  return `${now.getFullYear()}-${month}-${day}`;
+}
+
 function App() {
   const [renderedMessages, setRenderedMessages] = useState<Message[]>([]);
   const [loading, setLoading] = useState(true);
@@ -25,9 +34,12 @@ function App() {
   const [bookingsVisible, setBookingsVisible] = useState(false);
   const [bookings, setBookings] = useState<Booking[]>([]);
   const [bookingsLoading, setBookingsLoading] = useState(false);
+  const [bookingsCursor, setBookingsCursor] = useState<{ afterId: number; afterDate: string | null } | null>(null);
+  const [bookingsLoadingMore, setBookingsLoadingMore] = useState(false);
   const [cancellingBookingId, setCancellingBookingId] = useState<number | null>(null);
   const [profile, setProfile] = useState<UserProfile | null>(null);
   const [showProfileModal, setShowProfileModal] = useState(false);
+  const lastMessageIdRef = useRef<number | null>(null);
 
   const createLocalMessage = useCallback(
     (origin: Message["origin"], content: string): Message => ({
@@ -43,6 +55,7 @@ function App() {
     fetchHistory()
       .then((data) => {
         setRenderedMessages(data);
+        lastMessageIdRef.current = data.length ? data[data.length - 1].id : null;
       })
       .catch(() => setError("Nao foi possivel carregar o historico."))
       .finally(() => setLoading(false));
@@ -95,8 +108,9 @@ function App() {
   const loadBookings = useCallback(async () => {
     setBookingsLoading(true);
     try {
-      const snapshot = await fetchBookings();
-      setBookings(snapshot);
+      const page = await fetchBookings({ dateFrom: todayIso(), limit: BOOKINGS_PAGE_SIZE });
+      setBookings(page.bookings);
+      setBookingsCursor(page.nextAfterId === null ? null : { afterId: page.nextAfterId, afterDate: page.nextAfterDate });
     } catch (err) {
       console.error(err);
       setError("Nao foi possivel carregar os agendamentos ativos.");
@@ -105,6 +119,21 @@ function App() {
     }
   }, []);
 
+  const loadMoreBookings = useCallback(async () => {
+    if (bookingsCursor === null) return;
+    setBookingsLoadingMore(true);
+    try {
+      const page = await fetchBookings({ dateFrom: todayIso(), ...bookingsCursor, limit: BOOKINGS_PAGE_SIZE });
+      setBookings((prev) => [...prev, ...page.bookings]);
+      setBookingsCursor(page.nextAfterId === null ? null : { afterId: page.nextAfterId, afterDate: page.nextAfterDate });
+    } catch (err) {
+      console.error(err);
+      setError("Nao foi possivel carregar mais agendamentos.");
+    } finally {
+      setBookingsLoadingMore(false);
+    }
+  }, [bookingsCursor]);
+
   const handleSubmit = useCallback(
     async (content: string) => {
       const sanitized = content.trim();
@@ -131,7 +160,14 @@ function App() {
           },
           profile,
         );
-        setHistoryVersion((value) => value + 1);
+        const delta = await fetchHistory(lastMessageIdRef.current);
+        if (delta.length) {
+          lastMessageIdRef.current = delta[delta.length - 1].id;
+          setRenderedMessages((prev) => [
+            ...prev.filter((message) => message.id !== userMessage.id && message.id !== botMessage.id),
+            ...delta,
+          ]);
+        }
       } catch {
         setError("Falha ao enviar mensagem.");
         setRenderedMessages((prev) => prev.filter((message) => message.id !== botMessage.id));
@@ -384,6 +420,9 @@ function App() {
               onRefresh={loadBookings}
               onCancel={handleCancelBooking}
               cancellingId={cancellingBookingId}
+              hasMore={bookingsCursor !== null}
+              loadingMore={bookingsLoadingMore}
+              onLoadMore={loadMoreBookings}
             />
           </div>
         </div>
@@ -1,6 +1,20 @@
-import type { AvailabilitySlot, Booking, Message, UserProfile } from "./types";
+import type { AvailabilitySlot, Booking, BookingsFilter, BookingsPage, Message, UserProfile } from "./types";
 
 const BASE_URL = import.meta.env.VITE_API_URL ?? "http://localhost:8000";
+const SESSION_STORAGE_KEY = "aurora-session";
+
+function getSessionId(): string {
+  const stored = window.localStorage.getItem(SESSION_STORAGE_KEY);
+  if (stored) {
+    return stored;
+  }
+  const sessionId =
+    typeof crypto !== "undefined" && "randomUUID" in crypto
+      ? crypto.randomUUID()
+      : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+  window.localStorage.setItem(SESSION_STORAGE_KEY, sessionId);
+  return sessionId;
+}
 
 function serializeProfile(profile?: UserProfile | null) {
   if (!profile) {
@@ -35,18 +49,23 @@ async function handleTranscriptResponse(response: Response) {
   return payload.transcript;
 }
 
-export async function fetchHistory(): Promise<Message[]> {
-  const response = await fetch(`${BASE_URL}/history`);
+export async function fetchHistory(sinceId?: number | null): Promise<Message[]> {
+  const params = new URLSearchParams({ session_id: getSessionId() });
+  if (sinceId != null) {
+    params.set("since_id", String(sinceId));
+  }
+  const response = await fetch(`${BASE_URL}/history?${params.toString()}`);
   return handleResponse(response);
 }
 
+/** Retorna apenas as mensagens criadas neste turno (usuario e resposta da Aurora). */
 export async function sendMessage(content: string, profile?: UserProfile | null): Promise<Message[]> {
   const response = await fetch(`${BASE_URL}/messages`, {
     method: "POST",
     headers: {
       "Content-Type": "application/json",
     },
-    body: JSON.stringify({ content, profile: serializeProfile(profile) }),
+    body: JSON.stringify({ content, profile: serializeProfile(profile), session_id: getSessionId() }),
   });
   return handleResponse(response);
 }
@@ -61,7 +80,7 @@ export async function streamMessage(
     headers: {
       "Content-Type": "application/json",
     },
-    body: JSON.stringify({ content, profile: serializeProfile(profile) }),
+    body: JSON.stringify({ content, profile: serializeProfile(profile), session_id: getSessionId() }),
   });
 
   if (!response.ok || !response.body) {
@@ -105,20 +124,36 @@ export async function fetchAvailability(days = 7): Promise<AvailabilitySlot[]> {
   return (await response.json()) as AvailabilitySlot[];
 }
 
-export async function fetchBookings(filter?: { date?: string; slot?: string }): Promise<Booking[]> {
+export async function fetchBookings(filter?: BookingsFilter): Promise<BookingsPage> {
     const response = await fetch(`${BASE_URL}/tools/bookings`, {
         method: "POST",
         headers: {
             "Content-Type": "application/json",
         },
-        body: JSON.stringify(filter ?? {}),
+        body: JSON.stringify({
+            date: filter?.date,
+            slot: filter?.slot,
+            date_from: filter?.dateFrom,
+            date_to: filter?.dateTo,
+            after_id: filter?.afterId ?? undefined,
+            after_date: filter?.afterDate ?? undefined,
+            limit: filter?.limit,
+        }),
     });
     if (!response.ok) {
         const text = await response.text();
         throw new Error(text || "Erro ao listar agendamentos.");
     }
-    const payload = (await response.json()) as { bookings: Booking[] };
-    return payload.bookings ?? [];
+    const payload = (await response.json()) as {
+        bookings: Booking[];
+        next_after_id?: number | null;
+        next_after_date?: string | null;
+    };
+    return {
+        bookings: payload.bookings ?? [],
+        nextAfterId: payload.next_after_id ?? null,
+        nextAfterDate: payload.next_after_date ?? null,
+    };
 }
 
 export async function cancelBooking(bookingId: number): Promise<void> {
@@ -7,6 +7,9 @@ type Props = {
   onRefresh: () => void;
   onCancel?: (bookingId: number) => void;
   cancellingId?: number | null;
+  hasMore?: boolean;
+  loadingMore?: boolean;
+  onLoadMore?: () => void;
 };
 
 type BookingGroup = {
@@ -15,7 +18,16 @@ type BookingGroup = {
   items: Booking[];
 };
 
-export function BookingsBoard({ bookings, loading = false, onRefresh, onCancel, cancellingId }: Props) {
+export function BookingsBoard({
+  bookings,
+  loading = false,
+  onRefresh,
+  onCancel,
+  cancellingId,
+  hasMore = false,
+  loadingMore = false,
+  onLoadMore,
+}: Props) {
   const grouped = useMemo<BookingGroup[]>(() => {
     const map = new Map<string, Booking[]>();
     bookings.forEach((booking) => {
@@ -107,6 +119,11 @@ export function BookingsBoard({ bookings, loading = false, onRefresh, onCancel,
           </section>
         ))
       )}
+      {!loading && hasMore && onLoadMore && (
+        <button type="button" className="pill-button secondary" onClick={onLoadMore} disabled={loadingMore}>
+          {loadingMore ? "Carregando..." : "Carregar mais"}
+        </button>
+      )}
     </div>
   );
 }
@@ -39,3 +39,19 @@ export type Booking = {
   urgency: number;
   accessibility: string[];
 };
+
+export type BookingsFilter = {
+  date?: string;
+  slot?: string;
+  dateFrom?: string;
+  dateTo?: string;
+  afterId?: number | null;
+  afterDate?: string | null;
+  limit?: number;
+};
+
+export type BookingsPage = {
+  bookings: Booking[];
+  nextAfterId: number | null;
+  nextAfterDate: string | null;
+};
@@ -22,6 +22,18 @@ NPM_BIN="${NPM_BIN:-$(command -v npm || true)}"
 NODE_BIN="${NODE_BIN:-$(command -v node || true)}"
 SERVICE_USER="${SERVICE_USER:-$USER}"
 SERVICE_GROUP="${SERVICE_GROUP:-$SERVICE_USER}"
+BACKEND_WORKERS="${BACKEND_WORKERS:-1}"
+
+# With more than one worker, the chat history must live in the shared SQLite store.
+if (( BACKEND_WORKERS > 1 )); then
+  MESSAGE_STORE="${MESSAGE_STORE:-sqlite}"
+  if [[ "$MESSAGE_STORE" == "memory" ]]; then
+    echo "MESSAGE_STORE=memory does not work with BACKEND_WORKERS=$BACKEND_WORKERS; use sqlite." >&2
+    exit 1
+  fi
+else
+  MESSAGE_STORE="${MESSAGE_STORE:-memory}"
+fi
 
 if [[ -z "$PYTHON_BIN" ]]; then
   echo "python3 not found. Install Python 3 before running this script." >&2
@@ -59,7 +71,8 @@ Group=$SERVICE_GROUP
 WorkingDirectory=$BACKEND_DIR
 Environment=PYTHONUNBUFFERED=1
 EnvironmentFile=-/etc/chatbot-inclusivo/backend.env
-ExecStart=$PYTHON_BIN -m uvicorn app.main:app --host 0.0.0.0 --port 8000
+# Set on the command line: EnvironmentFile= would override Environment= and could mismatch the worker count.
+ExecStart=/usr/bin/env MESSAGE_STORE=$MESSAGE_STORE BACKEND_WORKERS=$BACKEND_WORKERS $PYTHON_BIN -m uvicorn app.main:app --host 0.0.0.0 --port 8000 --workers $BACKEND_WORKERS
 Restart=on-failure
 RestartSec=5
 